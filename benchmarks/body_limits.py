@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List
+
+import httpx
+from fastapi import Depends, FastAPI, Response
+
+from indiecourier.app import parse_micropub_request
+from benchmarks.loadtest import REPO_ROOT, free_port, percentile, wait_until_ready
+
+# Throughput of well-formed Micropub bodies while other clients flood the server with oversized ones. Each
+# phase runs against a fresh server process: first with the default limits, then (--compare) with limits
+# raised so high that every oversized body is read and parsed in full.
+#
+#   python -m benchmarks.body_limits --duration 5 --flooders 8 --flood-size 20 --compare
+
+NOTE = {"type": ["h-entry"], "properties": {"content": ["Hello world!"], "category": ["indieweb", "micropub"]}}
+
+parse_app = FastAPI()
+
+
+@parse_app.get("/readyz")
+async def readyz():
+    return {"status": "ready"}
+
+
+@parse_app.post("/parse")
+async def parse(micropub_request=Depends(parse_micropub_request)):
+    return Response(status_code=204)
+
+
+async def oversized_body(size: int, chunk: int = 64 * 1024):
+    yield b'{"type": ["h-entry"], "properties": {"content": ["'
+    for _ in range(size // chunk):
+        yield b"x" * chunk
+    yield b'"]}}'
+
+
+async def run_phase(url: str, duration: float, clients: int, flooders: int, flood_size: int) -> Dict:
+    latencies: List[float] = []
+    rejected: Dict[str, int] = {}
+    deadline = monotonic() + duration
+
+    async def client(http: httpx.AsyncClient) -> None:
+        while monotonic() < deadline:
+            start = monotonic()
+            response = await http.post("/parse", json=NOTE)
+            if response.status_code == 204:
+                latencies.append(monotonic() - start)
+
+    async def flooder(http: httpx.AsyncClient, n: int) -> None:
+        declared = json.dumps({"type": ["h-entry"], "properties": {"content": ["x" * flood_size]}}).encode()
+        while monotonic() < deadline:
+            try:
+                # Alternate between an honest Content-Length and a chunked body with no length
+                content = declared if n % 2 else oversized_body(flood_size)
+                response = await http.post("/parse", content=content, headers={"Content-Type": "application/json"})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            rejected[status] = rejected.get(status, 0) + 1
+            n += 1
+
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as http:
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as flood:
+            await asyncio.gather(*(client(http) for _ in range(clients)), *(flooder(flood, n) for n in range(flooders)))
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "oversized": rejected,
+    }
+
+
+def run_server(args: argparse.Namespace, env: Dict[str, str]) -> Dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "uvicorn", "benchmarks.body_limits:parse_app", "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env={**os.environ, **env})
+    try:
+        wait_until_ready(url, process, timeout=30)
+        flood_size = args.flood_size * 1024 * 1024
+        return {
+            "baseline": asyncio.run(run_phase(url, args.duration, args.clients, 0, flood_size)),
+            "flood": asyncio.run(run_phase(url, args.duration, args.clients, args.flooders, flood_size)),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv: List[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Measure Micropub parsing throughput under a flood of oversized bodies")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per phase")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients sending well-formed notes")
+    parser.add_argument("--flooders", type=int, default=8, help="Concurrent clients sending oversized bodies")
+    parser.add_argument("--flood-size", type=int, default=20, help="Size of each oversized body in MiB")
+    parser.add_argument("--compare", action="store_true", help="Also run with limits raised out of the way")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"settings": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}}
+    report["limited"] = run_server(args, {})
+    if args.compare:
+        unlimited = str(1024 ** 4)
+        report["unlimited"] = run_server(args, {"INDIECOURIER_MAX_JSON_BODY": unlimited})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List
+
+import mf2py
+
+from benchmarks.loadtest import percentile
+from indiecourier.entries import EntryExtractor
+from indiecourier.utils import get_datetime, is_note
+
+# Time to classify a published post (note or article, and its published date): a full mf2py parse of the
+# page against the streaming h-entry extractor, fed in network-sized chunks. Pages are built like a typical
+# note permalink (navigation, author h-card, the post, a long comment thread of h-cites, footer); saved
+# copies of real pages can be passed with --page.
+#
+#   python -m benchmarks.entry_bench --comments 0 200 1000 --iterations 20
+#   python -m benchmarks.entry_bench --page saved-post.html
+
+CHUNK = 64 * 1024
+
+
+def comment(i: int) -> str:
+    return f"""
+      <li class="p-comment h-cite">
+        <div class="p-author h-card">
+          <img class="u-photo" src="https://avatars.example/{i}.jpg" alt="Commenter {i}">
+          <a class="p-name u-url" href="https://commenter{i}.example/">Commenter {i}</a>
+        </div>
+        <a class="u-url" href="https://commenter{i}.example/replies/{i}"><time class="dt-published" datetime="2024-06-02T10:{i % 60:02d}:00+00:00">June 2</time></a>
+        <div class="e-content"><p>Reply number {i}, with <a href="https://example.org/{i}">a link</a> and some words to read through.</p></div>
+      </li>"""
+
+
+def blog_page(comments: int, name: str | None = None) -> str:
+    navigation = "".join(f'<li><a href="/tag/{i}">Tag {i}</a></li>' for i in range(50))
+    title = f'<h1 class="p-name">{name}</h1>' if name else ""
+    paragraphs = "".join(f"<p>Paragraph {i} of the post, long enough to look like prose.</p>" for i in range(40))
+    return f"""<!doctype html>
+<html><head><title>Post</title><link rel="stylesheet" href="/style.css"><script>var config = {{"a": 1}};</script></head>
+<body>
+  <header class="h-card"><img class="u-photo" src="/me.jpg" alt=""><a class="p-name u-url" href="/">Site Owner</a></header>
+  <nav><ul>{navigation}</ul></nav>
+  <main>
+    <article class="h-entry">
+      {title}
+      <a class="p-author h-card" href="/">Site Owner</a>
+      <time class="dt-published" datetime="2024-06-01T12:00:00+00:00">June 1, 2024</time>
+      <div class="e-content">{paragraphs}</div>
+      <section class="comments"><ol>{"".join(comment(i) for i in range(comments))}</ol></section>
+    </article>
+  </main>
+  <footer><p>&copy; Site Owner</p></footer>
+</body></html>"""
+
+
+def full_parse(page: str):
+    mf2 = mf2py.parse(doc=page, url="https://example.com/notes/1")
+    return is_note(mf2), get_datetime(mf2)
+
+
+def extracted(page: str):
+    extractor = EntryExtractor()
+    for start in range(0, len(page), CHUNK):
+        if extractor.feed(page[start : start + CHUNK]):
+            break
+    else:
+        extractor.close()
+    mf2 = extractor.result()
+    return is_note(mf2), get_datetime(mf2)
+
+
+def measure(func: Callable[[], object], iterations: int) -> Dict:
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    timings.sort()
+    return {
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def main(argv: List[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Compare full mf2 parsing with the streaming h-entry extractor")
+    parser.add_argument("--comments", type=int, nargs="+", default=[0, 100, 500, 2000], help="Comment thread lengths")
+    parser.add_argument("--page", type=Path, action="append", default=[], help="Also time this saved HTML page")
+    parser.add_argument("--iterations", type=int, default=20, help="Parses per approach and page")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    pages = {f"{n} comments": blog_page(n) for n in args.comments}
+    pages.update({str(path): path.read_text() for path in args.page})
+    report = {"iterations": args.iterations, "pages": {}}
+    for label, page in pages.items():
+        full, fast = full_parse(page), extracted(page)
+        report["pages"][label] = {
+            "bytes": len(page.encode()),
+            # The full parse takes the site owner's h-card name for the post's; the extractor does not
+            "full_parse_is_note": full[0],
+            "extractor_is_note": fast[0],
+            "full_parse": measure(lambda: full_parse(page), args.iterations),
+            "extractor": measure(lambda: extracted(page), args.iterations),
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import asyncio
+import base64
+import hashlib
+import json
+import random
+from itertools import count
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+# Local stand-ins for the services IndieCourier talks to: the IndieAuth token endpoint, the GitHub REST API and
+# the published site that update/delete URLs are resolved against. Each one can add latency and fail a share of
+# its requests, so the load test can show how the app behaves when a backend is slow or flaky.
+
+
+class Faults:
+    # ASGI middleware: delay every request by latency ± jitter seconds and answer error_rate of them with error_status
+    def __init__(self, app, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 502):
+        self.app = app
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.injected_errors = 0
+        self._random = random.Random()
+
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "injected_errors": self.injected_errors}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.requests += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            response = JSONResponse(status_code=self.error_status, content={"message": "Injected failure"})
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+def token_app(me: str, scope: str = "create update delete media") -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/token")
+    async def token(request: Request):
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"error": "unauthorized"})
+        return {"me": me, "client_id": "https://loadtest.example/", "scope": scope, "issued_at": 0}
+
+    return app
+
+
+NOTE_PAGE = '<html><body><div class="h-entry"><span class="e-content">A note</span></div></body></html>'
+ARTICLE_PAGE = '<html><body><div class="h-entry"><p class="p-name">An article</p><span class="e-content">Text</span></div></body></html>'
+
+
+def site_app(article_prefix: str = "/posts/") -> FastAPI:
+    # Any URL is a post: articles (with a p-name) under article_prefix, notes everywhere else
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    async def page(path: str):
+        return HTMLResponse(ARTICLE_PAGE if f"/{path}".startswith(article_prefix) else NOTE_PAGE)
+
+    return app
+
+
+def git_sha(kind: str, content: bytes) -> str:
+    return hashlib.sha1(f"{kind} {len(content)}\0".encode() + content).hexdigest()
+
+
+class FakeRepository:
+    # Just enough of git's object model for the contents and git data endpoints IndieCourier uses
+    def __init__(self, owner: str, name: str, branch: str = "main"):
+        self.owner = owner
+        self.name = name
+        self.branch = branch
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict] = {}
+        self._serial = count()
+        self.head = self.commit({}, [], "Initial commit")
+
+    @property
+    def files(self) -> Dict[str, str]:
+        return self.trees[self.commits[self.head]["tree"]]
+
+    def blob(self, content: bytes) -> str:
+        sha = git_sha("blob", content)
+        self.blobs[sha] = content
+        return sha
+
+    def tree(self, entries: Dict[str, str]) -> str:
+        sha = git_sha("tree", json.dumps(entries, sort_keys=True).encode())
+        self.trees[sha] = entries
+        return sha
+
+    def commit(self, entries: Dict[str, str], parents: List[str], message: str) -> str:
+        tree = self.tree(entries)
+        sha = git_sha("commit", f"{tree} {parents} {message} {next(self._serial)}".encode())
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message}
+        return sha
+
+    def resolve_tree(self, ref: str) -> str | None:
+        # A tree sha, or the tree of a commit sha or of the branch
+        if ref == self.branch:
+            ref = self.head
+        if ref in self.commits:
+            return self.commits[ref]["tree"]
+        return ref if ref in self.trees else None
+
+    def listing(self, tree: str, recursive: bool) -> List[Dict]:
+        # Trees are stored flat (path -> blob sha); without recursive=1, git lists one level with subtrees
+        entries = self.trees[tree]
+        if recursive:
+            return [{"path": path, "mode": "100644", "type": "blob", "sha": sha} for path, sha in entries.items()]
+        children: Dict[str, Dict[str, str]] = {}
+        listing = []
+        for path, sha in entries.items():
+            directory, slash, rest = path.partition("/")
+            if slash:
+                children.setdefault(directory, {})[rest] = sha
+            else:
+                listing.append({"path": path, "mode": "100644", "type": "blob", "sha": sha})
+        for directory, subtree in children.items():
+            listing.append({"path": directory, "mode": "040000", "type": "tree", "sha": self.tree(subtree)})
+        return listing
+
+    def is_ancestor(self, ancestor: str, sha: str) -> bool:
+        while sha != ancestor:
+            parents = self.commits[sha]["parents"]
+            if not parents:
+                return False
+            sha = parents[0]
+        return True
+
+    def advance(self, sha: str, force: bool = False) -> bool:
+        if not force and self.commits[sha]["parents"][:1] != [self.head]:
+            return False
+        self.head = sha
+        return True
+
+
+def github_app(owner: str = "loadtest", repository: str = "site") -> FastAPI:
+    app = FastAPI()
+    repo = FakeRepository(owner, repository)
+    app.state.repo = repo
+
+    def repo_url(request: Request) -> str:
+        return f"{str(request.base_url).rstrip('/')}/repos/{owner}/{repository}"
+
+    def error(status: int, message: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"message": message})
+
+    def commit_json(request: Request, sha: str) -> Dict:
+        commit = repo.commits[sha]
+        url = repo_url(request)
+        return {
+            "sha": sha,
+            "url": f"{url}/git/commits/{sha}",
+            "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": f"{url}/git/trees/{commit['tree']}"},
+            "parents": [{"sha": parent, "url": f"{url}/git/commits/{parent}"} for parent in commit["parents"]],
+        }
+
+    def content_json(request: Request, path: str) -> Dict:
+        sha = repo.files[path]
+        return {
+            "type": "file",
+            "encoding": "base64",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": sha,
+            "size": len(repo.blobs[sha]),
+            "content": base64.b64encode(repo.blobs[sha]).decode("ascii"),
+            "url": f"{repo_url(request)}/contents/{path}",
+        }
+
+    def ref_json(request: Request) -> Dict:
+        url = repo_url(request)
+        return {
+            "ref": f"refs/heads/{repo.branch}",
+            "url": f"{url}/git/refs/heads/{repo.branch}",
+            "object": {"sha": repo.head, "type": "commit", "url": f"{url}/git/commits/{repo.head}"},
+        }
+
+    @app.get("/user")
+    async def user(request: Request):
+        return {"login": owner, "url": f"{str(request.base_url).rstrip('/')}/users/{owner}"}
+
+    @app.get("/repos/{o}/{r}")
+    async def get_repo(request: Request, o: str, r: str):
+        if (o, r) != (owner, repository):
+            return error(404, "Not Found")
+        return {
+            "name": repository,
+            "full_name": f"{owner}/{repository}",
+            "default_branch": repo.branch,
+            "owner": {"login": owner},
+            "url": repo_url(request),
+        }
+
+    @app.get("/repos/{o}/{r}/contents/{path:path}")
+    async def get_contents(request: Request, o: str, r: str, path: str):
+        if path not in repo.files:
+            return error(404, "Not Found")
+        return content_json(request, path)
+
+    @app.put("/repos/{o}/{r}/contents/{path:path}")
+    async def put_contents(request: Request, o: str, r: str, path: str):
+        data = await request.json()
+        current = repo.files.get(path)
+        if current is not None and "sha" not in data:
+            return error(422, 'Invalid request.\n\n"sha" wasn\'t supplied.')
+        if current is not None and data["sha"] != current:
+            return error(409, f"{path} does not match {data['sha']}")
+        if current is None and "sha" in data:
+            return error(404, "Not Found")
+        entries = {**repo.files, path: repo.blob(base64.b64decode(data["content"]))}
+        repo.advance(repo.commit(entries, [repo.head], data["message"]))
+        return JSONResponse(
+            status_code=200 if current else 201,
+            content={"content": content_json(request, path), "commit": commit_json(request, repo.head)},
+        )
+
+    @app.get("/repos/{o}/{r}/git/trees/{ref}")
+    async def get_tree(request: Request, o: str, r: str, ref: str):
+        tree = repo.resolve_tree(ref)
+        if tree is None:
+            return error(404, "Not Found")
+        entries = repo.listing(tree, recursive=request.query_params.get("recursive") not in (None, "", "0", "false"))
+        return {"sha": tree, "url": f"{repo_url(request)}/git/trees/{tree}", "truncated": False, "tree": entries}
+
+    @app.get("/repos/{o}/{r}/compare/{basehead}")
+    async def compare(request: Request, o: str, r: str, basehead: str):
+        base, _, head = basehead.partition("...")
+        head = repo.head if head == repo.branch else head
+        if base not in repo.commits or head not in repo.commits:
+            return error(404, "Not Found")
+        if base == head:
+            status = "identical"
+        elif repo.is_ancestor(base, head):
+            status = "ahead"
+        else:
+            status = "behind" if repo.is_ancestor(head, base) else "diverged"
+        before, after = repo.trees[repo.commits[base]["tree"]], repo.trees[repo.commits[head]["tree"]]
+        files = []
+        for path in sorted(before.keys() | after.keys()):
+            if before.get(path) == after.get(path):
+                continue
+            change = "added" if path not in before else "removed" if path not in after else "modified"
+            files.append({"filename": path, "status": change, "sha": after.get(path) or before[path]})
+        return {
+            "url": f"{repo_url(request)}/compare/{basehead}",
+            "status": status,
+            "base_commit": commit_json(request, base),
+            "merge_base_commit": commit_json(request, base),
+            "files": files,
+        }
+
+    @app.post("/repos/{o}/{r}/git/blobs", status_code=201)
+    async def create_blob(request: Request, o: str, r: str):
+        data = await request.json()
+        content = base64.b64decode(data["content"]) if data.get("encoding") == "base64" else data["content"].encode()
+        sha = repo.blob(content)
+        return {"sha": sha, "url": f"{repo_url(request)}/git/blobs/{sha}"}
+
+    @app.get("/repos/{o}/{r}/git/blobs/{sha}")
+    async def get_blob(request: Request, o: str, r: str, sha: str):
+        if sha not in repo.blobs:
+            return error(404, "Not Found")
+        content = repo.blobs[sha]
+        return {"sha": sha, "size": len(content), "encoding": "base64", "content": base64.b64encode(content).decode("ascii")}
+
+    @app.post("/repos/{o}/{r}/git/trees", status_code=201)
+    async def create_tree(request: Request, o: str, r: str):
+        data = await request.json()
+        entries = dict(repo.trees.get(data.get("base_tree"), {}))
+        for element in data["tree"]:
+            entries[element["path"]] = element["sha"] if element.get("sha") else repo.blob(element["content"].encode())
+        sha = repo.tree(entries)
+        return {"sha": sha, "url": f"{repo_url(request)}/git/trees/{sha}", "tree": []}
+
+    @app.post("/repos/{o}/{r}/git/commits", status_code=201)
+    async def create_commit(request: Request, o: str, r: str):
+        data = await request.json()
+        sha = repo.commit(repo.trees[data["tree"]], data["parents"], data["message"])
+        return commit_json(request, sha)
+
+    @app.get("/repos/{o}/{r}/git/commits/{sha}")
+    async def get_commit(request: Request, o: str, r: str, sha: str):
+        if sha not in repo.commits:
+            return error(404, "Not Found")
+        return commit_json(request, sha)
+
+    @app.get("/repos/{o}/{r}/git/ref/heads/{branch}")
+    @app.get("/repos/{o}/{r}/git/refs/heads/{branch}")
+    async def get_ref(request: Request, o: str, r: str, branch: str):
+        return ref_json(request)
+
+    @app.patch("/repos/{o}/{r}/git/refs/heads/{branch}")
+    async def update_ref(request: Request, o: str, r: str, branch: str):
+        data = await request.json()
+        if not repo.advance(data["sha"], data.get("force", False)):
+            return error(422, "Update is not a fast forward")
+        return ref_json(request)
+
+    return app
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Dict, Iterator, List, NamedTuple
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import Faults, github_app, site_app, token_app
+
+# End-to-end load test: runs the app under uvicorn against local stand-ins for the token endpoint, GitHub and the
+# published site, replays a traffic mix at a fixed request rate and writes a JSON report.
+#
+#   python -m benchmarks.loadtest --rps 20 --duration 30 --output report.json
+#   python -m benchmarks.loadtest --github-latency 0.3 --github-error-rate 0.05
+#   python -m benchmarks.loadtest --replay traffic.jsonl
+#
+# A --replay file has one request per line, either a synthetic operation ({"op": "update"}) or a literal request
+# ({"name": "create", "method": "POST", "path": "/micropub", "json": {...}}). Lines are replayed in order, cycling.
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MIX = "create=30,update=20,delete=5,undelete=5,media=10,config=20,syndicate-to=10"
+OPERATIONS = ("create", "update", "delete", "undelete", "media", "config", "syndicate-to")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BackgroundServer:
+    # Serves an ASGI app from a thread with its own event loop
+    def __init__(self, app, port: int):
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> "BackgroundServer":
+        self.thread.start()
+        while not self.server.started:
+            sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Result(NamedTuple):
+    name: str
+    status: int
+    latency: float
+    error: str | None
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}', expected one of {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest rank on sorted values
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class Traffic:
+    # Builds requests for each operation. Updates and deletes target posts created earlier in the run.
+    def __init__(self, site_url: str, seed: int | None = None):
+        self.site_url = site_url.rstrip("/")
+        self.random = random.Random(seed)
+        self.created: List[str] = []
+        self.deleted: List[str] = []
+        self._serial = 0
+
+    def request(self, op: str) -> Dict:
+        self._serial += 1
+        if op == "update" and self.created:
+            url = self.random.choice(self.created)
+            body = {"action": "update", "url": url, "replace": {"content": [f"Updated {self._serial}"]}}
+            return {"name": "update", "method": "POST", "path": "/micropub", "json": body}
+        # A post being deleted or undeleted is out of both pools until the response says where it belongs
+        if op == "delete" and self.created:
+            url = self.created.pop(self.random.randrange(len(self.created)))
+            return {"name": "delete", "method": "POST", "path": "/micropub", "json": {"action": "delete", "url": url}}
+        if op == "undelete" and self.deleted:
+            url = self.deleted.pop(self.random.randrange(len(self.deleted)))
+            return {"name": "undelete", "method": "POST", "path": "/micropub", "json": {"action": "undelete", "url": url}}
+        if op == "media":
+            files = {"file": (f"photo-{self._serial}.jpg", os.urandom(16 * 1024), "image/jpeg")}
+            return {"name": "media", "method": "POST", "path": "/media", "files": files}
+        if op in ("config", "syndicate-to"):
+            return {"name": f"q={op}", "method": "GET", "path": "/micropub", "params": {"q": op}}
+        # Creates, and updates/deletes with nothing to act on yet. Half are articles, half notes.
+        properties = {"content": [f"Load test post {self._serial}"]}
+        if self.random.random() < 0.5:
+            properties["name"] = [f"Load test article {self._serial}"]
+        return {"name": "create", "method": "POST", "path": "/micropub", "json": {"type": ["h-entry"], "properties": properties}}
+
+    def synthetic(self, weights: Dict[str, float]) -> Iterator[Dict]:
+        ops, odds = list(weights), list(weights.values())
+        while True:
+            yield self.request(self.random.choices(ops, odds)[0])
+
+    def replay(self, path: Path) -> Iterator[Dict]:
+        lines = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+        if not lines:
+            raise ValueError(f"{path} has no requests")
+        while True:
+            for line in lines:
+                yield self.request(line["op"]) if "op" in line else {"name": f"{line['method']} {line['path']}", **line}
+
+    def record(self, request: Dict, response: httpx.Response) -> None:
+        if request["name"] == "create" and response.status_code == 202 and "Location" in response.headers:
+            self.created.append(response.headers["Location"])
+        elif request["name"] in ("delete", "undelete"):
+            deleted = (request["name"] == "delete") == response.is_success
+            (self.deleted if deleted else self.created).append(request["json"]["url"])
+
+
+async def send(client: httpx.AsyncClient, traffic: Traffic, request: Dict, scheduled: float) -> Result:
+    # Latency is measured from the scheduled start, so a backed-up client does not hide server slowness
+    kwargs = {key: request[key] for key in ("json", "data", "files", "params", "headers") if key in request}
+    try:
+        response = await client.request(request["method"], request["path"], **kwargs)
+    except httpx.HTTPError as e:
+        return Result(request["name"], 0, monotonic() - scheduled, type(e).__name__)
+    traffic.record(request, response)
+    error = None if response.status_code < 400 else response.text[:200]
+    return Result(request["name"], response.status_code, monotonic() - scheduled, error)
+
+
+async def run_load(base_url: str, token: str, requests: Iterator[Dict], traffic: Traffic, rps: float, duration: float, timeout: float) -> tuple[List[Result], float]:
+    total = int(rps * duration)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=httpx.Limits(max_connections=None)) as client:
+        start = monotonic()
+        tasks = []
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, traffic, next(requests), scheduled)))
+        results = await asyncio.gather(*tasks)
+        return results, monotonic() - start
+
+
+def summarize(results: List[Result], elapsed: float) -> Dict:
+    latencies = sorted(result.latency for result in results)
+    errors = [result for result in results if result.status == 0 or result.status >= 400]
+    status = defaultdict(int)
+    for result in results:
+        status[str(result.status)] += 1
+    return {
+        "requests": len(results),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+        "status": dict(sorted(status.items())),
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50": round(1000 * percentile(latencies, 50), 2),
+            "p95": round(1000 * percentile(latencies, 95), 2),
+            "p99": round(1000 * percentile(latencies, 99), 2),
+            "max": round(1000 * latencies[-1], 2) if latencies else 0.0,
+        },
+        "sample_errors": sorted({result.error for result in errors if result.error})[:5],
+    }
+
+
+def build_report(results: List[Result], elapsed: float, settings: Dict, backends: Dict[str, Faults]) -> Dict:
+    by_name = defaultdict(list)
+    for result in results:
+        by_name[result.name].append(result)
+    return {
+        "settings": settings,
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": summarize(results, elapsed),
+        "endpoints": {name: summarize(group, elapsed) for name, group in sorted(by_name.items())},
+        "backends": {name: faults.stats() for name, faults in backends.items()},
+    }
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited with status {process.returncode} during startup")
+        try:
+            if httpx.get(f"{url}/readyz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        sleep(0.1)
+    raise RuntimeError(f"The app was not ready after {timeout:.0f}s")
+
+
+def main(argv: List[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Replay a traffic mix against IndieCourier with fake backends")
+    parser.add_argument("--rps", type=float, default=10.0, help="Requests started per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of traffic to send")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--replay", type=Path, help="JSONL file of requests to replay instead of the synthetic mix")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request")
+    parser.add_argument("--seed", type=int, help="Random seed for the traffic mix")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    for backend, latency in (("github", 0.08), ("token", 0.03), ("site", 0.02)):
+        parser.add_argument(f"--{backend}-latency", type=float, default=latency, help=f"Seconds added to each {backend} request")
+        parser.add_argument(f"--{backend}-jitter", type=float, default=latency / 4, help=f"± random seconds on top of --{backend}-latency")
+        parser.add_argument(f"--{backend}-error-rate", type=float, default=0.0, help=f"Share of {backend} requests answered with a 5xx")
+    args = parser.parse_args(argv)
+    weights = parse_mix(args.mix)
+
+    site_port, token_port, github_port, app_port = (free_port() for _ in range(4))
+    site_url = f"http://127.0.0.1:{site_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    backends = {
+        "site": Faults(site_app(), args.site_latency, args.site_jitter, args.site_error_rate),
+        "token": Faults(token_app(me=site_url), args.token_latency, args.token_jitter, args.token_error_rate),
+        "github": Faults(github_app(), args.github_latency, args.github_jitter, args.github_error_rate),
+    }
+    servers = [
+        BackgroundServer(backends[name], port).start()
+        for name, port in (("site", site_port), ("token", token_port), ("github", github_port))
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="indiecourier-loadtest-") as tmp:
+        sites_file = Path(tmp) / "sites.json"
+        site = {
+            "me": site_url,
+            "token-endpoint": f"http://127.0.0.1:{token_port}/token",
+            "site-url": site_url,
+            "github_repo": "site",
+            "github_token": "loadtest",
+            "github_user": "loadtest",
+            "github_api_url": f"http://127.0.0.1:{github_port}",
+            "media_dir": "assets/media",
+            "media_endpoint": f"{app_url}/media",
+            "state_dir": str(Path(tmp) / "state"),
+            # Every simulated client shares one token; measure the server, not its per-token rate limits
+            "read_rate_limit": 0,
+            "write_rate_limit": 0,
+        }
+        sites_file.write_text(json.dumps({"sites": [site]}))
+        env = {**os.environ, "INDIECOURIER_SITES_FILE": str(sites_file), "INDIECOURIER_CONFIG_POLL_INTERVAL": "0"}
+        command = [sys.executable, "-m", "uvicorn", "indiecourier.app:app", "--host", "127.0.0.1", "--port", str(app_port),
+                   "--workers", str(args.workers), "--log-level", "warning"]
+        process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+        try:
+            wait_until_ready(app_url, process, timeout=30)
+            traffic = Traffic(site_url, seed=args.seed)
+            requests = traffic.replay(args.replay) if args.replay else traffic.synthetic(weights)
+            results, elapsed = asyncio.run(
+                run_load(app_url, "loadtest", requests, traffic, args.rps, args.duration, args.timeout)
+            )
+        finally:
+            process.terminate()
+            process.wait()
+            for server in servers:
+                server.stop()
+
+    settings = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    report = build_report(results, elapsed, settings, backends)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List
+
+import mf2py
+from parse import parse
+
+from benchmarks.loadtest import percentile
+from indiecourier.routing import PostRouter
+from indiecourier.schemas import Config
+from indiecourier.utils import is_note
+
+# Time to turn a post URL into its file path: the page-based approach (parse the published page's mf2, look
+# for a name, then match the template uncompiled), template matching alone without compiling, and the
+# compiled router. The page is read from disk, so the network is left out of the mf2 timing.
+#
+#   python -m benchmarks.router_bench --iterations 2000
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CONFIG = Config.model_construct(site_url="https://example.com/")
+NOTE_URL = "https://example.com/notes/2024/06/01/1772160815"
+ARTICLE_URL = "https://example.com/posts/2024/06/01/test-post"
+
+
+def mf2_resolve(url: str, page: str) -> str:
+    mf2 = mf2py.parse(doc=page, url=url)
+    if is_note(mf2):
+        parsed = parse(CONFIG.note_url_template, url)
+        return CONFIG.note_filepath_template.format(site_url="", date=parsed["date"], slug=parsed["slug"])
+    parsed = parse(CONFIG.article_url_template, url)
+    return CONFIG.article_filepath_template.format(site_url="", date=parsed["date"], slug=parsed["slug"])
+
+
+def template_resolve(url: str) -> str:
+    # The templates alone, but compiled again for every URL
+    for url_template, filepath_template in (
+        (CONFIG.note_url_template, CONFIG.note_filepath_template),
+        (CONFIG.article_url_template, CONFIG.article_filepath_template),
+    ):
+        parsed = parse(url_template.replace("{site_url}", "https://example.com"), url)
+        if parsed is not None:
+            return filepath_template.format(site_url="", date=parsed["date"], slug=parsed["slug"])
+
+
+def measure(func: Callable[[], str], iterations: int) -> Dict:
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    timings.sort()
+    return {
+        "mean_us": round(sum(timings) / len(timings) * 1e6, 2),
+        "p50_us": round(percentile(timings, 50) * 1e6, 2),
+        "p99_us": round(percentile(timings, 99) * 1e6, 2),
+    }
+
+
+def main(argv: List[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Compare post URL resolution approaches")
+    parser.add_argument("--iterations", type=int, default=1000, help="Resolutions per approach and URL")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    pages = {
+        NOTE_URL: (REPO_ROOT / "tests" / "test_note.html").read_text(),
+        ARTICLE_URL: (REPO_ROOT / "tests" / "test_article.html").read_text(),
+    }
+    router = PostRouter(CONFIG)
+    report = {"iterations": args.iterations}
+    for url, page in pages.items():
+        expected = mf2_resolve(url, page)
+        assert template_resolve(url) == expected and router.match(url)[0].path == expected
+        report[url] = {
+            "mf2": measure(lambda: mf2_resolve(url, page), args.iterations),
+            "template": measure(lambda: template_resolve(url), args.iterations),
+            "router": measure(lambda: router.match(url)[0].path, args.iterations),
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import multiprocessing
+import tempfile
+import uuid
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+
+from benchmarks.loadtest import percentile
+from indiecourier.state import SharedCache, SharedState
+
+# Latency of the shared SQLite state as several worker processes contend for it: token cache lookups and writes,
+# and acquiring plus releasing a post lock. Every process works on the same database file.
+#
+#   python -m benchmarks.state_bench --processes 4 --operations 2000
+
+
+def worker(path: str, operations: int, keys: int, queue: multiprocessing.Queue) -> None:
+    state = SharedState(Path(path))
+    cache = SharedCache(state, "tokens", ttl=300, maxsize=keys)
+    owner = uuid.uuid4().hex
+    timings: Dict[str, List[float]] = {"get": [], "set": [], "lock": []}
+    for i in range(operations):
+        key = f"token-{i % keys}"
+
+        start = perf_counter()
+        cache.get(key)
+        timings["get"].append(perf_counter() - start)
+
+        start = perf_counter()
+        cache.set(key, {"me": "https://example.com/", "scope": "create update"})
+        timings["set"].append(perf_counter() - start)
+
+        # A lease that is already held elsewhere counts as a miss; the app would back off and retry
+        start = perf_counter()
+        if state.acquire(f"path:_notes/{i % keys}.md", owner, lease=30):
+            state.release(f"path:_notes/{i % keys}.md", owner)
+        timings["lock"].append(perf_counter() - start)
+    queue.put(timings)
+
+
+def summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        **{f"p{q}_ms": round(percentile(values, q) * 1000, 3) for q in (50, 95, 99)},
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def main(argv: List[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Measure shared state latency under multi-process contention")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes sharing the database")
+    parser.add_argument("--operations", type=int, default=1000, help="Lookups, writes and lock cycles per process")
+    parser.add_argument("--keys", type=int, default=64, help="Distinct cache keys and post paths")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    timings: Dict[str, List[float]] = {"get": [], "set": [], "lock": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "shared.sqlite3")
+        queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(path, args.operations, args.keys, queue))
+            for _ in range(args.processes)
+        ]
+        start = perf_counter()
+        for process in processes:
+            process.start()
+        for _ in processes:
+            for op, values in queue.get().items():
+                timings[op].extend(values)
+        for process in processes:
+            process.join()
+        elapsed = perf_counter() - start
+
+    report = {
+        "settings": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "elapsed": round(elapsed, 3),
+        "operations": {op: summarize(values) for op, values in timings.items()},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import Deque, Dict, Literal
+
+from fastapi import HTTPException
+
+from .metrics import Counter, Gauge, Histogram
+
+Priority = Literal["read", "write"]
+
+ADMISSION_ACTIVE = Gauge("indiecourier_admission_active", "Backend operations currently running", ["site"])
+ADMISSION_QUEUED = Gauge("indiecourier_admission_queue_depth", "Backend operations waiting for a slot", ["site", "priority"])
+ADMISSION_WAIT = Histogram("indiecourier_admission_wait_seconds", "Time spent waiting for a backend slot", ["site", "priority"])
+ADMISSION_REJECTED = Counter("indiecourier_admission_rejected_total", "Requests shed with 503", ["site", "priority", "reason"])
+
+
+def overloaded(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={"error": "temporarily_unavailable", "error_description": "The server is busy, please retry later"},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class AdmissionController:
+    # Bounds concurrent GitHub-bound operations per site. Excess requests wait in a bounded queue where
+    # reads are served before writes; when the queue is full they are refused at once with 503 + Retry-After.
+    def __init__(self, site: str, limit: int, queue_size: int, queue_timeout: float):
+        self.site = site
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {"read": deque(), "write": deque()}
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold_time = 1.0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._hold_time * (self.queued + 1) / max(self.limit, 1)))
+
+    def _publish(self) -> None:
+        ADMISSION_ACTIVE.set(self.active, site=self.site)
+        for priority, queue in self._queues.items():
+            ADMISSION_QUEUED.set(len(queue), site=self.site, priority=priority)
+
+    async def acquire(self, priority: Priority = "write") -> None:
+        start = monotonic()
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            self._publish()
+            ADMISSION_WAIT.observe(0.0, site=self.site, priority=priority)
+            return
+        if self.queued >= self.queue_size:
+            ADMISSION_REJECTED.inc(site=self.site, priority=priority, reason="queue_full")
+            raise overloaded(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[priority]
+        queue.append(future)
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+                if future in queue:
+                    queue.remove(future)
+            self._publish()
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTED.inc(site=self.site, priority=priority, reason="timeout")
+                raise overloaded(self.retry_after())
+            raise
+        ADMISSION_WAIT.observe(monotonic() - start, site=self.site, priority=priority)
+
+    def _wake_next(self) -> bool:
+        for queue in (self._queues["read"], self._queues["write"]):
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return True
+        return False
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiter, reads first, so nobody can jump the queue
+        if not self._wake_next():
+            self.active -= 1
+        self._publish()
+
+    def resize(self, limit: int, queue_size: int, queue_timeout: float) -> None:
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        # A raised limit admits waiters now rather than on the next release
+        while self.active < self.limit and self._wake_next():
+            self.active += 1
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = "write"):
+        await self.acquire(priority)
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * (monotonic() - start)
+            self.release()
@@ -0,0 +1,964 @@
+import asyncio
+import base64
+import hashlib
+import mimetypes
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack, asynccontextmanager
+from copy import deepcopy
+from datetime import datetime
+from importlib import resources
+from pathlib import Path
+from time import time
+from typing import Callable, Dict, List, Literal, NamedTuple, Tuple
+from urllib.parse import urljoin
+
+import markdown
+import yaml
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, Query, Request, UploadFile, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from github import Github, GithubException
+from github.ContentFile import ContentFile
+from pydantic import ValidationError
+from slugify import slugify
+from starlette.datastructures import FormData, UploadFile as StarletteUploadFile
+
+from .auth import verify_auth_token
+from .commits import CommitConflict, blob_element, blob_sha, commit_files, path_exists, text_element
+from .idempotency import idempotency_key, token_identity
+from .indexes import MediaItem, post_tags
+from .limits import check_form_fields, limit_body, load_request_limits, parse_json
+from .metrics import REGISTRY
+from .profiling import ProfilingMiddleware, stage, stop_continuous_profiler
+from .rehost import RemoteMedia, discard, fetch_all, remote_urls, rewrite_urls
+from .reloader import CONFIG_POLL_INTERVAL, ConfigWatcher
+from .routing import PostRouter
+from .schemas import (
+    Attachment,
+    Config,
+    GithubFileResponse,
+    MicropubActionRequest,
+    MicropubBatchRequest,
+    MicropubConfigResponse,
+    MicropubRequest,
+    RequestLimits,
+    UploadSessionRequest,
+)
+from .sites import SitePrefixMiddleware, registry, shared
+from .slugs import note_slug
+from .utils import get_datetime, is_note, load_config, mf2_to_jekyll, apply_patch, replace_keys
+from .warmup import Warmer, WarmupState
+
+
+class PostMedia(NamedTuple):
+    # A media file uploaded as a blob, waiting to be committed with its post
+    property: str
+    path: str
+    url: str
+    sha: str
+    size: int
+    content_type: str | None
+
+
+warmup_state = WarmupState()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /healthz answers while /readyz waits for the caches, and again for the
+    # sites a config reload adds
+    warmer = Warmer(registry, warmup_state)
+    warmer.start()
+    tasks = []
+    if CONFIG_POLL_INTERVAL > 0:
+        tasks.append(asyncio.create_task(ConfigWatcher(registry, on_reload=warmer.start).run()))
+    yield
+    warmer.stop()
+    for task in tasks:
+        task.cancel()
+    await shared.aclose()
+    stop_continuous_profiler()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(SitePrefixMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+
+def config_response(config: Config) -> MicropubConfigResponse:
+    return MicropubConfigResponse(
+        me=config.me,
+        token_endpoint=config.token_endpoint,
+        media_endpoint=config.media_endpoint,
+        syndicate_to=[endpoint.model_dump() for endpoint in config.syndicate_to] if config.syndicate_to else None,
+    )
+
+
+async def github_login(config: Config = Depends(load_config)):
+    try:
+        return registry.for_config(config).github()
+    except Exception:
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "github_login_failed", "error_description": "Failed to authenticate with GitHub"},
+        )
+
+
+@app.get("/micropub", response_model_exclude_none=True)
+async def micropub_query(
+    q: Literal["config", "syndicate-to", "media-endpoint", "source", "category"] = Query(
+        ..., description="The type of query to perform"
+    ),
+    search: str | None = Query(None, description="Only return categories starting with this"),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+    github: Github = Depends(github_login),
+) -> MicropubConfigResponse:
+    site = registry.for_config(config)
+    if q == "config":
+        return site.derived("q=config", config, config_response)
+    elif q == "syndicate-to":
+        return site.derived(
+            "q=syndicate-to",
+            config,
+            lambda config: MicropubConfigResponse(syndicate_to=config_response(config).syndicate_to),
+        )
+    elif q == "media-endpoint":
+        return MicropubConfigResponse(media_endpoint=config.media_endpoint)
+    elif q == "category":
+        if not site.tags.loaded:
+            # Once per process; afterwards categories are answered from memory
+            async with site.github_slot("read", token_data):
+                repo = await shared.run(site.repo, github)
+                await site.run_github(site.tags.ensure_loaded, repo, config)
+        return MicropubConfigResponse(categories=site.tags.categories(search))
+    elif q == "source":
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "unsupported_query", "error_description": f"Query '{q}' is not yet supported"},
+        )
+
+
+def allocate_media_path(repo, config: Config, original_filename: str) -> str:
+    # Filename should be timestamp + truncated UUID
+    timestamp = int(time())
+    uuid_str = str(uuid.uuid4())[:8]
+    filetype = Path(original_filename).suffix
+    slugs = registry.for_config(config).slugs
+    _, path = slugs.allocate(repo, f"{timestamp}_{uuid_str}", lambda slug: f"{config.media_dir}/{slug}{filetype}")
+    return path
+
+
+def media_url(config: Config, path: str) -> str:
+    return urljoin(str(config.site_url), f"/{path}")
+
+
+def store_media(github: Github, config: Config, original_filename: str, contents: bytes, content_type: str | None = None) -> str:
+    site = registry.for_config(config)
+    repo = site.repo(github)
+    path = allocate_media_path(repo, config, original_filename)
+    try:
+        with stage("github"):
+            github_response_dict = repo.create_file(
+                path=path,
+                message=f"Upload {path}",
+                content=contents,
+            )
+        github_response = GithubFileResponse.model_validate(github_response_dict, from_attributes=True)
+        site.paths.add(path)
+        site.media.add(MediaItem(path, len(contents), content_type or mimetypes.guess_type(path)[0], time(), blob_sha(contents)))
+    except (ValidationError, GithubException) as e:
+        site.slugs.release(path)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "github_error",
+                "error_description": f"GitHub API error: {e}",
+            },
+        )
+
+    return media_url(config, github_response.content.path)
+
+
+def media_response(url: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=201,
+        content={"url": url},
+        headers={"Location": url},
+    )
+
+
+@app.post("/media", response_model_exclude_none=True, status_code=201)
+async def media_endpoint(
+    github: Github = Depends(github_login),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+    file: UploadFile = File(..., description="Media file to upload"),
+):
+    contents = await file.read()
+    site = registry.for_config(config)
+    async with site.github_slot("write", token_data):
+        github_media_url = await site.run_github(store_media, github, config, file.filename, contents, file.content_type)
+    return media_response(github_media_url)
+
+
+def media_item_json(item: MediaItem, config: Config) -> Dict:
+    entry = {"url": media_url(config, item.path), "mime_type": item.content_type, "size": item.size}
+    if item.uploaded:
+        entry["published"] = datetime.fromtimestamp(item.uploaded, tz=config.timezone).isoformat()
+    return {key: value for key, value in entry.items() if value is not None}
+
+
+@app.get("/media")
+async def media_query(
+    q: Literal["last", "source"] = Query(..., description="The type of query to perform"),
+    limit: int = Query(10, ge=1, le=100, description="Items per page for q=source"),
+    offset: int = Query(0, ge=0),
+    before: str | None = Query(None, description="Continue after this path (from paging.before)"),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+    github: Github = Depends(github_login),
+):
+    # Listed from the local media index rather than the GitHub contents API
+    site = registry.for_config(config)
+    if not site.media.loaded:
+        async with site.github_slot("read", token_data):
+            repo = await shared.run(site.repo, github)
+            await site.run_github(site.media.ensure_loaded, repo, config)
+    await shared.run(site.media.refresh)
+
+    if q == "last":
+        item = site.media.last()
+        return {"url": media_url(config, item.path)} if item else {}
+
+    if before is not None and before not in site.media:
+        raise HTTPException(
+            status_code=400, detail={"error": "invalid_request", "error_description": f"Unknown paging cursor '{before}'"}
+        )
+    items, more = site.media.page(limit, offset, before)
+    response = {"items": [media_item_json(item, config) for item in items]}
+    if more and items:
+        response["paging"] = {"before": items[-1].path}
+    return response
+
+
+# Resumable uploads: create a session, PATCH chunks at Upload-Offset, then finalize into the media directory
+@app.post("/media/uploads", status_code=201)
+async def create_upload(
+    request: Request,
+    upload_request: UploadSessionRequest,
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+):
+    uploads = registry.for_config(config).uploads
+    session = await shared.run(uploads.create, token_identity(token_data), upload_request.filename, upload_request.size)
+    location = str(request.url_for("upload_status", upload_id=session.id))
+    return JSONResponse(
+        status_code=201,
+        content={"id": session.id, "offset": 0, "expires": session.expires},
+        headers={"Location": location, "Upload-Offset": "0"},
+    )
+
+
+@app.get("/media/uploads/{upload_id}", name="upload_status")
+@app.head("/media/uploads/{upload_id}")
+async def upload_status(
+    upload_id: str,
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+):
+    session = registry.for_config(config).uploads.get(upload_id, token_identity(token_data))
+    return JSONResponse(
+        content={"id": session.id, "offset": session.offset, "size": session.length, "expires": session.expires},
+        headers={"Upload-Offset": str(session.offset), "Cache-Control": "no-store"},
+    )
+
+
+@app.patch("/media/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+):
+    uploads = registry.for_config(config).uploads
+    session = uploads.get(upload_id, token_identity(token_data))
+    session = await uploads.append(session, upload_offset, request.stream())
+    return Response(status_code=204, headers={"Upload-Offset": str(session.offset)})
+
+
+@app.post("/media/uploads/{upload_id}/finalize", status_code=201)
+async def finalize_upload(
+    upload_id: str,
+    github: Github = Depends(github_login),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+):
+    site = registry.for_config(config)
+    session = site.uploads.get(upload_id, token_identity(token_data))
+    site.uploads.claim(session)
+    try:
+        contents = await shared.run(site.uploads.read, session)
+        async with site.github_slot("write", token_data):
+            github_media_url = await site.run_github(store_media, github, config, session.filename, contents)
+    except BaseException:
+        site.uploads.unclaim(session)
+        raise
+    site.uploads.delete(session.id)
+    return media_response(github_media_url)
+
+
+@app.delete("/media/uploads/{upload_id}", status_code=204)
+async def abort_upload(
+    upload_id: str,
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+):
+    uploads = registry.for_config(config).uploads
+    session = uploads.get(upload_id, token_identity(token_data))
+    uploads.delete(session.id)
+    return Response(status_code=204)
+
+
+def mf2_form_to_json(form: Form) -> Dict:
+    grouped = defaultdict(list)
+    mf2_type = "entry"
+    for key, value in form.multi_items():
+        if key == "h":
+            mf2_type = value
+        else:
+            grouped[key].append(value)
+
+    response = {
+        "type": [f"h-{mf2_type}"],
+        "properties": dict(grouped),
+    }
+    return response
+
+
+async def parse_micropub_request(
+    request: Request,
+    limits: RequestLimits = Depends(load_request_limits),
+) -> MicropubRequest | MicropubActionRequest | MicropubBatchRequest:
+    with stage("parse"):
+        return await _parse_micropub_request(request, limits)
+
+
+async def _parse_micropub_request(
+    request: Request, limits: RequestLimits
+) -> MicropubRequest | MicropubActionRequest | MicropubBatchRequest:
+    # Size limits apply while the body streams in, so oversized requests are refused before they are buffered
+    if request.headers.get("Content-Type", "").startswith("application/json"):
+        limit_body(request, limits.max_json_body)
+        response_json = parse_json(await request.body(), limits)
+        if response_json.get("action") == "batch":
+            # Only JSON can carry a list of operations
+            return MicropubBatchRequest.model_validate(response_json)
+        if "action" in response_json:
+            return MicropubActionRequest.model_validate(response_json)
+        else:
+            return MicropubRequest.model_validate(response_json)
+    elif request.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+        limit_body(request, limits.max_form_body)
+        check_form_fields(await request.body(), limits)
+        form = await request.form()
+        if "action" in form:
+            return MicropubActionRequest.model_validate(form)
+        else:
+            response_json = mf2_form_to_json(form)
+            return MicropubRequest.model_validate(response_json)
+    elif request.headers.get("Content-Type", "").startswith("multipart/form-data"):
+        limit_body(request, limits.max_multipart_body)
+        form = await request.form(max_files=limits.max_files, max_fields=limits.max_fields)
+        if "action" in form:
+            return MicropubActionRequest.model_validate(form)
+        fields = FormData([(key, value) for key, value in form.multi_items() if not isinstance(value, StarletteUploadFile)])
+        attachments = []
+        for key, value in form.multi_items():
+            if isinstance(value, StarletteUploadFile):
+                if key.removesuffix("[]") not in ("photo", "video", "audio"):
+                    raise HTTPException(
+                        status_code=400,
+                        detail={"error": "invalid_request", "error_description": f"Files are not accepted for '{key}'"},
+                    )
+                contents = await value.read()
+                attachments.append(
+                    Attachment(
+                        property=key.removesuffix("[]"),
+                        filename=value.filename or "",
+                        content_type=value.content_type,
+                        sha256=hashlib.sha256(contents).hexdigest(),
+                        content=contents,
+                    )
+                )
+        response_json = mf2_form_to_json(fields)
+        response_json["attachments"] = attachments
+        return MicropubRequest.model_validate(response_json)
+    else:
+        raise HTTPException(
+            status_code=400, detail={"error": "invalid_content_type", "error_description": "Unsupported Content-Type"}
+        )
+    
+async def upload_attachments(github: Github, micropub_request: MicropubRequest, config: Config) -> List[PostMedia]:
+    # Upload attached files as blobs concurrently; they are committed together with the post
+    site = registry.for_config(config)
+    repo = await shared.run(site.repo, github)
+
+    async def upload(attachment: Attachment) -> PostMedia:
+        path = await site.run_github(allocate_media_path, repo, config, attachment.filename)
+        encoded = base64.b64encode(attachment.content).decode("ascii")
+        try:
+            with stage("github"):
+                blob = await site.run_github(repo.create_git_blob, encoded, "base64")
+        except GithubException as e:
+            site.slugs.release(path)
+            raise HTTPException(status_code=500, detail={"error": "github_error", "error_description": f"GitHub API error: {e}"})
+        return PostMedia(
+            attachment.property, path, media_url(config, path), blob.sha, len(attachment.content), attachment.content_type
+        )
+
+    return list(await asyncio.gather(*(upload(attachment) for attachment in micropub_request.attachments)))
+
+
+async def fetch_remote_media(micropub_request: MicropubRequest, config: Config) -> List[RemoteMedia]:
+    urls = remote_urls(micropub_request.properties, str(config.site_url))
+    if not urls:
+        return []
+    directory = registry.for_config(config).state_path / "rehost"
+    return await fetch_all(shared.http_client(), urls, directory, config.rehost_max_size, config.rehost_timeout, shared.run)
+
+
+async def rehost_media(github: Github, micropub_request: MicropubRequest, config: Config, fetched: List[RemoteMedia]) -> List[PostMedia]:
+    # Upload fetched remote files as blobs and point the post at them. Files we already have, in the repo or
+    # earlier in this request, are not uploaded again.
+    site = registry.for_config(config)
+    repo = await shared.run(site.repo, github)
+    await site.run_github(site.media.ensure_loaded, repo, config)
+    rewritten: Dict[str, str] = {}
+    unique: Dict[str, RemoteMedia] = {}
+    for item in fetched:
+        existing = site.media.find(item.sha)
+        if existing:
+            rewritten[item.url] = media_url(config, existing.path)
+        else:
+            unique.setdefault(item.sha, item)
+
+    async def upload(item: RemoteMedia) -> PostMedia:
+        path = await site.run_github(allocate_media_path, repo, config, item.filename)
+        encoded = base64.b64encode(await shared.run(item.file.read_bytes)).decode("ascii")
+        try:
+            with stage("github"):
+                blob = await site.run_github(repo.create_git_blob, encoded, "base64")
+        except GithubException as e:
+            site.slugs.release(path)
+            raise HTTPException(status_code=500, detail={"error": "github_error", "error_description": f"GitHub API error: {e}"})
+        return PostMedia(item.property, path, media_url(config, path), blob.sha, item.size, item.content_type)
+
+    media = list(await asyncio.gather(*(upload(item) for item in unique.values())))
+    by_sha = dict(zip(unique, media))
+    for item in fetched:
+        if item.sha in by_sha:
+            rewritten[item.url] = by_sha[item.sha].url
+    rewrite_urls(micropub_request.properties, rewritten)
+    return media
+
+
+def create_post(
+    github: Github, micropub_request: MicropubRequest, config: Config, media: List[PostMedia] = (), rehosted: List[PostMedia] = ()
+) -> str:
+    # Uploaded media is referenced from the post like any other photo/video/audio URL; rehosted media already
+    # replaced the remote URLs it came from
+    for item in media:
+        micropub_request.properties.setdefault(item.property, []).append(item.url)
+
+    # Convert mf2 to frontmatter and mp commands
+    micropub_request_dict = micropub_request.model_dump()
+    frontmatter, content = mf2_to_jekyll(micropub_request_dict, config.mf2_to_replace)
+    with stage("yaml"):
+        frontmatter_yaml = yaml.dump(frontmatter, default_flow_style=False, sort_keys=False)
+
+    # Determine filename based on timestamp and slugified title or URL
+    now = time()
+    dt = datetime.fromtimestamp(now, tz=config.timezone)
+    site_url = str(config.site_url).rstrip("/")
+    if frontmatter.get("title"):
+        base_slug = slugify(frontmatter["title"])
+        filepath_template, url_template = config.article_filepath_template, config.article_url_template
+        always_suffix = False
+    else:
+        base_slug = slugify(note_slug(now, dt, config.note_slug_scheme))
+        filepath_template, url_template = config.note_filepath_template, config.note_url_template
+        always_suffix = config.note_slug_scheme == "sequence"
+
+    # Write to GitHub
+    filecontent = f"---\n{frontmatter_yaml}---\n{content}"
+    site = registry.for_config(config)
+    repo = site.repo(github)
+    for attempt in range(3):
+        slug, filename = site.slugs.allocate(
+            repo,
+            base_slug,
+            lambda slug: filepath_template.format(site_url=site_url, date=dt, slug=slug),
+            always_suffix=always_suffix,
+        )
+        try:
+            with stage("github"):
+                if media or rehosted:
+                    elements = [text_element(filename, filecontent)]
+                    elements += [blob_element(item.path, item.sha) for item in [*media, *rehosted]]
+                    commit_files(repo, elements, f"Create {filename}", expected={filename: None})
+                else:
+                    github_response_dict = repo.create_file(
+                        path=filename,
+                        message=f"Create {filename}",
+                        content=filecontent,
+                    )
+                    github_response = GithubFileResponse.model_validate(github_response_dict, from_attributes=True)
+            break
+        except (GithubException, CommitConflict) as e:
+            # create_file answers 422 when the path exists; with media the tree commit checks it first
+            exists = isinstance(e, CommitConflict) or (not media and not rehosted and path_exists(e))
+            if exists and attempt < 2:
+                # The path exists but our index had not seen it (e.g. a commit made outside IndieCourier)
+                site.paths.add(filename)
+                continue
+            site.slugs.release(filename)
+            for item in [*media, *rehosted]:
+                site.slugs.release(item.path)
+            raise HTTPException(status_code=500, detail={"error": "github_error", "error_description": f"GitHub API error: {e}"})
+        except ValidationError as e:
+            raise HTTPException(status_code=500, detail={"error": "github_error", "error_description": f"GitHub API error: {e}"})
+    site.paths.add(filename)
+    site.tags.set(filename, post_tags(frontmatter, config))
+    for item in [*media, *rehosted]:
+        site.paths.add(item.path)
+        site.media.add(MediaItem(item.path, item.size, item.content_type or mimetypes.guess_type(item.path)[0], now, item.sha))
+
+    return url_template.format(site_url=site_url, date=dt, slug=slug)
+
+async def resolve_post_path(url: str, config: Config) -> str:
+    url = str(url).rstrip("/")
+    site_url = str(config.site_url).rstrip("/")
+    if not url.startswith(site_url):
+        raise HTTPException(status_code=400, detail={"error": "invalid_url", "error_description": "URL does not belong to this site"})
+
+    site = registry.for_config(config)
+    matches = site.derived("router", config, PostRouter).match(url)
+    if not matches:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_url", "error_description": "URL does not match the note or article URL template"},
+        )
+    if len(matches) == 1:
+        return matches[0].path
+
+    # Both templates fit this URL: only the published page can tell a note from an article
+    with stage("mf2"):
+        mf2_parser = await site.pages.parse(url)
+    kind = "note" if is_note(mf2_parser) else "article"
+    return next(match.path for match in matches if match.kind == kind)
+
+
+def read_post(repo, path: str) -> Tuple[ContentFile, Dict, str]:
+    with stage("github"):
+        contents = repo.get_contents(path)
+    with stage("yaml"):
+        file_content = contents.decoded_content.decode("utf-8")
+        if "---" in file_content:
+            frontmatter_raw, body = file_content.split("---", 2)[1:]
+            frontmatter = yaml.safe_load(frontmatter_raw)
+        else:
+            frontmatter = {}
+            body = file_content
+    return contents, frontmatter, body
+
+
+def render_post(frontmatter: Dict, body: str) -> str:
+    with stage("yaml"):
+        new_frontmatter_raw = yaml.dump(frontmatter, default_flow_style=False, sort_keys=False)
+    return f"---\n{new_frontmatter_raw}---\n{body}"
+
+
+def write_post(repo, path: str, frontmatter: Dict, body: str, sha: str, message: str) -> None:
+    new_file_content = render_post(frontmatter, body)
+    with stage("github"):
+        repo.update_file(path=path, message=message, content=new_file_content, sha=sha)
+
+
+def github_error(e: GithubException) -> HTTPException:
+    if e.status == 404:
+        return HTTPException(status_code=404, detail={"error": "post_not_found", "error_description": "Could not find a post matching the provided URL"})
+    return HTTPException(status_code=500, detail={"error": "github_error", "error_description": f"GitHub API error: {e}"})
+
+
+def mark_deleted(frontmatter: Dict) -> None:
+    if "published" in frontmatter and frontmatter["published"] == False:
+        raise HTTPException(status_code=400, detail={"error": "already_deleted", "error_description": "Post is already marked as deleted"})
+    frontmatter["published"] = False
+
+
+def mark_undeleted(frontmatter: Dict) -> None:
+    if "published" not in frontmatter or frontmatter["published"] != False:
+        raise HTTPException(status_code=400, detail={"error": "not_deleted", "error_description": "Post is not currently marked as deleted"})
+    del frontmatter["published"]
+
+
+def delete_post(github: Github, path: str, config: Config) -> Response:
+    # Add published: false to frontmatter
+    site = registry.for_config(config)
+    repo = site.repo(github)
+    try:
+        # Held from read to write so concurrent edits of this post apply one after the other
+        with site.locks.hold(path):
+            contents, frontmatter, body = read_post(repo, path)
+            mark_deleted(frontmatter)
+            write_post(repo, path, frontmatter, body, contents.sha, f"Update {path} to delete")
+            site.tags.set(path, post_tags(frontmatter, config))
+    except GithubException as e:
+        raise github_error(e)
+
+    return Response(status_code=204)
+
+def undelete_post(github: Github, path: str, config: Config) -> Response:
+    # Remove published: false from frontmatter if it exists
+    site = registry.for_config(config)
+    repo = site.repo(github)
+    try:
+        with site.locks.hold(path):
+            contents, frontmatter, body = read_post(repo, path)
+            mark_undeleted(frontmatter)
+            write_post(repo, path, frontmatter, body, contents.sha, f"Update {path} to undelete")
+            site.tags.set(path, post_tags(frontmatter, config))
+    except GithubException as e:
+        raise github_error(e)
+
+    return Response(status_code=204)
+
+
+def replace_update_keys(update_data: dict, config: Config) -> None:
+    # Replace keys
+    if "add" in update_data and isinstance(update_data["add"], dict):
+        update_data["add"] = replace_keys(update_data["add"], config.mf2_to_replace)
+    if "replace" in update_data and isinstance(update_data["replace"], dict):
+        update_data["replace"] = replace_keys(update_data["replace"], config.mf2_to_replace)
+    if "delete" in update_data and isinstance(update_data["delete"], dict):
+        update_data["delete"] = replace_keys(update_data["delete"], config.mf2_to_replace)
+
+
+def update_post(github: Github, path: str, update_data: dict, config: Config) -> Response:
+    replace_update_keys(update_data, config)
+    site = registry.for_config(config)
+    repo = site.repo(github)
+    try:
+        with site.locks.hold(path):
+            contents, frontmatter, body = read_post(repo, path)
+            frontmatter, body = apply_update(frontmatter, body, update_data)
+            write_post(repo, path, frontmatter, body, contents.sha, f"Update {path}")
+            site.tags.set(path, post_tags(frontmatter, config))
+    except GithubException as e:
+        raise github_error(e)
+
+    return Response(status_code=204)
+
+
+def apply_update(frontmatter: Dict, body: str, update_data: dict) -> Tuple[Dict, str]:
+    # First, check if content is in the update
+    if "add" in update_data:
+        if isinstance(update_data["add"], dict) and "content" in update_data["add"]:
+            # Check for HTML
+            if isinstance(update_data["add"]["content"], dict) and "html" in update_data["add"]["content"]:
+                body = update_data["add"]["content"]["html"]
+            else:
+                body = update_data["add"]["content"]
+
+            update_data["add"].pop("content")
+
+    if "replace" in update_data:
+        if isinstance(update_data["replace"], dict) and "content" in update_data["replace"]:
+            # Check for HTML
+            if isinstance(update_data["replace"]["content"], dict) and "html" in update_data["replace"]["content"]:
+                body = update_data["replace"]["content"]["html"]
+            else:
+                body = update_data["replace"]["content"]
+
+            update_data["replace"].pop("content")
+
+    if "delete" in update_data:
+        if isinstance(update_data["delete"], dict) and "content" in update_data["delete"]:
+            body = ""
+            update_data["delete"].pop("content")
+
+    frontmatter = apply_patch(frontmatter, update_data.get("replace"), update_data.get("add"), update_data.get("delete"))
+    return frontmatter, body
+
+def apply_action(frontmatter: Dict, body: str, update_data: dict, config: Config) -> Tuple[Dict, str]:
+    # One operation of a batch, on a copy so that a failed operation leaves the post as it was
+    frontmatter = deepcopy(frontmatter)
+    if update_data["action"] == "delete":
+        mark_deleted(frontmatter)
+    elif update_data["action"] == "undelete":
+        mark_undeleted(frontmatter)
+    else:
+        replace_update_keys(update_data, config)
+        frontmatter, body = apply_update(frontmatter, body, update_data)
+    return frontmatter, body
+
+
+def batch_status(url: str, error: HTTPException | None = None) -> Dict:
+    if error is None:
+        return {"url": url, "status": 204}
+    detail = error.detail if isinstance(error.detail, dict) else {"error_description": str(error.detail)}
+    return {"url": url, "status": error.status_code, **detail}
+
+
+def batch_conflict(path: str) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail={"error": "conflict", "error_description": f"{path} changed while the batch was applied, please retry"},
+    )
+
+
+def lock_paths(site, held: ExitStack, by_path: Dict[str, List[int]], fail: Callable) -> List[str]:
+    # Sorted, so two batches never wait on each other's locks
+    paths = []
+    for path in sorted(by_path):
+        try:
+            held.enter_context(site.locks.hold(path))
+            paths.append(path)
+        except HTTPException as e:
+            fail(by_path[path], e)
+    return paths
+
+
+def commit_batch(
+    repo, posts: Dict[str, Tuple[ContentFile, Dict, str]], by_path: Dict[str, List[int]], operations, config: Config, fail: Callable
+) -> Dict[str, Tuple[Dict, List[int]]]:
+    # Applies each post's operations in order and writes every changed post in one commit. A post whose file
+    # changed since it was read fails with 409, the rest are committed. Returns path -> (frontmatter, applied).
+    elements, changed = {}, {}
+    for path, (_, frontmatter, body) in posts.items():
+        applied = []
+        for i in by_path[path]:
+            try:
+                frontmatter, body = apply_action(frontmatter, body, operations[i][0], config)
+                applied.append(i)
+            except HTTPException as e:
+                fail([i], e)
+        if applied:
+            elements[path] = text_element(path, render_post(frontmatter, body))
+            changed[path] = (frontmatter, applied)
+
+    while changed:
+        if len(changed) == 1:
+            message = f"Update {next(iter(changed))}"
+        else:
+            message = f"Update {len(changed)} posts\n\n" + "\n".join(changed)
+        try:
+            with stage("github"):
+                expected = {path: posts[path][0].sha for path in changed}
+                commit_files(repo, [elements[path] for path in changed], message, expected=expected)
+            break
+        except CommitConflict as e:
+            for path in e.paths:
+                fail(changed.pop(path)[1], batch_conflict(path))
+        except GithubException as e:
+            for _, applied in changed.values():
+                fail(applied, github_error(e))
+            changed = {}
+    return changed
+
+
+async def apply_batch(github: Github, operations: List[Tuple[Dict, str | HTTPException]], config: Config) -> List[Dict]:
+    # operations: (action, its post's path or why it has none). Each post is read once, all of them
+    # concurrently; its operations are applied in order and every changed post is written in one commit.
+    site = registry.for_config(config)
+    repo = await shared.run(site.repo, github)
+    results: List[Dict | None] = [None] * len(operations)
+    by_path: Dict[str, List[int]] = defaultdict(list)
+    for i, (update_data, path) in enumerate(operations):
+        if isinstance(path, HTTPException):
+            results[i] = batch_status(update_data["url"], path)
+        else:
+            by_path[path].append(i)
+
+    def fail(indexes: List[int], error: HTTPException) -> None:
+        for i in indexes:
+            results[i] = batch_status(operations[i][0]["url"], error)
+
+    def read(path: str) -> Tuple[ContentFile, Dict, str] | HTTPException:
+        try:
+            return read_post(repo, path)
+        except GithubException as e:
+            return github_error(e)
+
+    # Each read takes its own admission slot, and at most max_concurrent_writes of them are queued at once,
+    # so a large batch takes turns with other requests instead of holding one slot throughout
+    reading = asyncio.Semaphore(max(1, config.max_concurrent_writes))
+
+    async def read_in_slot(path: str) -> Tuple[ContentFile, Dict, str] | HTTPException:
+        async with reading:
+            try:
+                async with site.github_slot("write"):
+                    return await site.run_github(read, path)
+            except HTTPException as e:
+                return e
+
+    held = ExitStack()
+    try:
+        paths = await shared.run(lock_paths, site, held, by_path, fail)
+        posts = {}
+        for path, post in zip(paths, await asyncio.gather(*(read_in_slot(path) for path in paths))):
+            if isinstance(post, HTTPException):
+                fail(by_path[path], post)
+            else:
+                posts[path] = post
+        async with site.github_slot("write"):
+            changed = await site.run_github(commit_batch, repo, posts, by_path, operations, config, fail)
+    finally:
+        await shared.run(held.close)
+
+    for path, (frontmatter, applied) in changed.items():
+        site.tags.set(path, post_tags(frontmatter, config))
+        for i in applied:
+            results[i] = batch_status(operations[i][0]["url"])
+    return results
+
+
+async def batch_actions(github: Github, batch: MicropubBatchRequest, config: Config) -> Dict:
+    if len(batch.operations) > config.max_batch_operations:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_request", "error_description": f"At most {config.max_batch_operations} operations per batch"},
+        )
+
+    async def resolve(url) -> str | HTTPException:
+        try:
+            return await resolve_post_path(url, config)
+        except HTTPException as e:
+            return e
+
+    paths = await asyncio.gather(*(resolve(operation.url) for operation in batch.operations))
+    operations = [(operation.model_dump(mode="json", exclude_none=True), path) for operation, path in zip(batch.operations, paths)]
+    site = registry.for_config(config)
+    try:
+        results = await apply_batch(github, operations, config)
+    finally:
+        for operation in batch.operations:
+            site.pages.invalidate(str(operation.url).rstrip("/"))
+    return {"status_code": 200, "results": results}
+
+
+def micropub_response(result: Dict, replayed: bool = False) -> Response:
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    if "results" in result:
+        return JSONResponse(status_code=result["status_code"], content={"results": result["results"]}, headers=headers)
+    if "url" in result:
+        return JSONResponse(
+            status_code=result["status_code"],
+            content={"url": result["url"]},
+            headers={**headers, "Location": result["url"]},
+        )
+    return Response(status_code=result["status_code"], headers=headers)
+
+
+@app.post("/micropub", response_model_exclude_none=True, status_code=202)
+async def micropub_endpoint(
+    request: Request,
+    github: Github = Depends(github_login),
+    token_data: Dict = Depends(verify_auth_token),
+    config: Config = Depends(load_config),
+    micropub_request: MicropubRequest | MicropubActionRequest | MicropubBatchRequest = Depends(parse_micropub_request),
+):
+    site = registry.for_config(config)
+
+    async def dispatch() -> Dict:
+        # The rate limit comes first: a client over it must not make us fetch or upload anything. Remote media
+        # is then fetched before taking a GitHub slot, so slow remote hosts do not hold one up.
+        batch = isinstance(micropub_request, MicropubBatchRequest)
+        site.check_rate("write", token_data, len(micropub_request.operations) if batch else 1)
+        fetched = []
+        if config.rehost_media and isinstance(micropub_request, MicropubRequest):
+            fetched = await fetch_remote_media(micropub_request, config)
+        try:
+            return await write(fetched)
+        finally:
+            await shared.run(discard, fetched)
+
+    async def write(fetched: List[RemoteMedia]) -> Dict:
+        # Admission slots are held for the GitHub round-trips only: not while a post's URL is resolved from its
+        # published page, and a batch takes one per post read and one for its commit (see apply_batch)
+        if isinstance(micropub_request, MicropubBatchRequest):
+            return await batch_actions(github, micropub_request, config)
+        elif isinstance(micropub_request, MicropubActionRequest):
+            if micropub_request.action not in ("delete", "undelete", "update"):
+                raise HTTPException(
+                    status_code=400,
+                    detail={"error": "unsupported_action", "error_description": f"Action '{micropub_request.action}' is not yet supported"},
+                )
+            path = await resolve_post_path(micropub_request.url, config)
+            try:
+                async with site.github_slot("write"):
+                    if micropub_request.action == "delete":
+                        response = await site.run_github(delete_post, github, path, config)
+                    elif micropub_request.action == "undelete":
+                        response = await site.run_github(undelete_post, github, path, config)
+                    else:
+                        response = await site.run_github(update_post, github, path, micropub_request.model_dump(), config)
+            finally:
+                # The published page is rebuilt from the new file, so our parse of it is stale
+                site.pages.invalidate(str(micropub_request.url).rstrip("/"))
+            return {"status_code": response.status_code}
+        else:
+            async with site.github_slot("write"):
+                media = await upload_attachments(github, micropub_request, config) if micropub_request.attachments else []
+                rehosted = await rehost_media(github, micropub_request, config, fetched) if fetched else []
+                post_url = await site.run_github(create_post, github, micropub_request, config, media, rehosted)
+            return {"status_code": 202, "url": post_url}
+
+    # Client retries get the first result back. Creates are matched on Idempotency-Key or, failing that, on
+    # the body; actions only on Idempotency-Key, since delete/undelete legitimately repeat a body.
+    header_key = request.headers.get("Idempotency-Key")
+    if config.idempotency_window > 0 and (header_key or isinstance(micropub_request, MicropubRequest)):
+        key = idempotency_key(token_identity(token_data), header_key, micropub_request.model_dump(mode="json"))
+        result, replayed = await site.idempotency.run(key, dispatch)
+    else:
+        result, replayed = await dispatch(), False
+    return micropub_response(result, replayed)
+
+
+# Shipped as package data, so the server works from any working directory and from an installed wheel
+PACKAGE_FILES = resources.files(__package__)
+templates = Jinja2Templates(directory=PACKAGE_FILES / "templates")
+md = (PACKAGE_FILES / "README.md").read_text()
+html_content = markdown.markdown(md, extensions=["fenced_code"])
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(status_code=200 if warmup_state.ready else 503, content=warmup_state.report())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/")
+async def home(request: Request):
+    response = templates.TemplateResponse(
+        request,
+        "index.html",
+        {"content": html_content},
+    )
+    return response
+
+
+app.mount("/static", StaticFiles(directory=PACKAGE_FILES / "static"), name="static")
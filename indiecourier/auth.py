@@ -0,0 +1,95 @@
+from typing import Dict
+
+import httpx
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import HttpUrl
+
+from .breakers import CircuitOpen, unavailable
+from .profiling import stage
+from .utils import is_url_equal, load_config
+from .schemas import Config
+from .sites import registry, shared, token_key
+from .tokens import KeysUnavailable, looks_like_jwt, token_expiry, verification_enabled
+
+security = HTTPBearer(auto_error=False)
+
+
+class TokenEndpointUnavailable(Exception):
+    # The token endpoint could not be reached or failed (5xx), so the token is neither valid nor invalid
+    pass
+
+
+async def introspect_token(token: str, token_endpoint: HttpUrl, me: HttpUrl) -> Dict | None:
+    client = shared.http_client()
+    try:
+        response = await client.get(
+            str(token_endpoint), headers={"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        )
+    except httpx.HTTPError as e:
+        raise TokenEndpointUnavailable(f"{type(e).__name__}: {e}")
+    if response.status_code >= 500:
+        raise TokenEndpointUnavailable(f"Token endpoint answered {response.status_code}")
+    try:
+        response.raise_for_status()
+        data = response.json()
+        if is_url_equal(data.get("me"), str(me)):
+            return data
+    except (httpx.HTTPError, ValueError):
+        return None
+        
+async def verify_jwt(token: str, config: Config) -> Dict | None:
+    claims = await registry.for_config(config).keys.decode(token, config)
+    if claims is None:
+        return None
+    scope = " ".join(claims["scope"]) if isinstance(claims["scope"], list) else claims["scope"]
+    if isinstance(scope, str) and scope.strip() and is_url_equal(str(claims["me"]), str(config.me)):
+        return {**claims, "scope": scope}
+
+
+async def check_token(token: str, config: Config) -> Dict | None:
+    # Signed tokens are verified locally when a key is configured; anything else goes to the token endpoint
+    if verification_enabled(config) and looks_like_jwt(token):
+        try:
+            return await verify_jwt(token, config)
+        except KeysUnavailable:
+            pass
+    breaker = registry.for_config(config).token_breaker
+    with breaker.call(lambda e: isinstance(e, TokenEndpointUnavailable) or None):
+        return await introspect_token(token, config.token_endpoint, config.me)
+
+
+async def verify_auth_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    config: Config = Depends(load_config),
+) -> Dict:
+    if not credentials:
+        raise HTTPException(
+            status_code=401, detail={"error": "unauthorized", "error_description": "Missing authorization token"}
+        )
+
+    # Only successful introspections are cached, so a revoked token is rechecked after token_cache_ttl
+    site = registry.for_config(config)
+    cache_key = token_key(credentials.credentials)
+    token_data = await site.run_state(site.token_cache.get, cache_key)
+    if token_data is None:
+        try:
+            with stage("auth"):
+                token_data = await check_token(credentials.credentials, config)
+        except (CircuitOpen, TokenEndpointUnavailable) as e:
+            # The token endpoint is down: tokens it accepted within token_stale_ttl are still let in
+            token_data = await site.run_state(site.stale_tokens.get, cache_key)
+            expires_in = None if token_data is None else token_expiry(token_data)
+            if token_data is None or (expires_in is not None and expires_in <= 0):
+                raise unavailable(e if isinstance(e, CircuitOpen) else CircuitOpen("token_endpoint", 1))
+            return token_data
+        if not token_data:
+            raise HTTPException(
+                status_code=403, detail={"error": "forbidden", "error_description": "Invalid authorization token"}
+            )
+        # Never cache a token past its expiry
+        expires_in = token_expiry(token_data)
+        await site.run_state(site.token_cache.set, cache_key, token_data, ttl=None if expires_in is None else min(expires_in, config.token_cache_ttl))
+        await site.run_state(site.stale_tokens.set, cache_key, token_data, ttl=None if expires_in is None else min(expires_in, config.token_stale_ttl))
+    
+    return token_data
\ No newline at end of file
@@ -0,0 +1,158 @@
+import math
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from typing import Callable, Deque, Literal
+
+import requests
+from fastapi import HTTPException
+from github import GithubException
+
+from .metrics import Counter, Gauge
+
+State = Literal["closed", "open", "half_open"]
+STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+BREAKER_STATE = Gauge("indiecourier_breaker_state", "0 closed, 1 half-open, 2 open", ["site", "dependency"])
+BREAKER_REJECTED = Counter("indiecourier_breaker_rejected_total", "Calls refused while the breaker was open", ["site", "dependency"])
+
+
+class CircuitOpen(Exception):
+    def __init__(self, dependency: str, retry_after: int):
+        super().__init__(f"{dependency} is unavailable")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+DEPENDENCY_NAMES = {"github": "GitHub", "token_endpoint": "The token endpoint"}
+
+
+def unavailable(e: CircuitOpen) -> HTTPException:
+    name = DEPENDENCY_NAMES.get(e.dependency, e.dependency)
+    return HTTPException(
+        status_code=503,
+        detail={"error": "temporarily_unavailable", "error_description": f"{name} is unavailable, please retry later"},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def github_failure(e: BaseException) -> bool | None:
+    # GitHub-side trouble counts against the breaker; GitHub answering 404/409/422 shows it is working; anything
+    # unrelated to GitHub (a bad request, an unreachable site page) says nothing about it either way
+    while e is not None:
+        if isinstance(e, GithubException):
+            return e.status >= 500 or e.status == 429
+        if isinstance(e, requests.RequestException):
+            return True
+        e = e.__cause__ or e.__context__
+    return None
+
+
+class CircuitBreaker:
+    # Closed: calls go through and their outcomes are kept for the last `window` calls. Once at least
+    # `min_calls` are recorded and `failure_rate` of them failed or took longer than `slow_call` seconds, the
+    # breaker opens and calls fail at once for `open_seconds`. Then it is half-open: one trial call goes
+    # through; success closes the breaker, failure opens it again for twice as long (up to 8x).
+    def __init__(
+        self,
+        site: str,
+        dependency: str,
+        failure_rate: float = 0.5,
+        slow_call: float = 10.0,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+    ):
+        self.site = site
+        self.dependency = dependency
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state: State = "closed"
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._open_for = open_seconds
+        self._trial = False
+        self._lock = Lock()
+        self._publish()
+
+    @property
+    def window(self) -> int:
+        return self._outcomes.maxlen
+
+    def configure(self, failure_rate: float, slow_call: float, window: int, min_calls: int, open_seconds: float) -> None:
+        with self._lock:
+            self.failure_rate, self.slow_call, self.min_calls, self.open_seconds = failure_rate, slow_call, min_calls, open_seconds
+            if window != self._outcomes.maxlen:
+                self._outcomes = deque(self._outcomes, maxlen=window)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._opened_at + self._open_for - monotonic()))
+
+    def _publish(self) -> None:
+        BREAKER_STATE.set(STATES[self.state], site=self.site, dependency=self.dependency)
+
+    def allow(self) -> None:
+        # Raises CircuitOpen unless a call may go ahead now
+        with self._lock:
+            if self.state == "open" and monotonic() >= self._opened_at + self._open_for:
+                self.state = "half_open"
+                self._publish()
+            if self.state == "closed" or (self.state == "half_open" and not self._trial):
+                self._trial = self.state == "half_open"
+                return
+            retry_after = self.retry_after() if self.state == "open" else 1
+        BREAKER_REJECTED.inc(site=self.site, dependency=self.dependency)
+        raise CircuitOpen(self.dependency, retry_after)
+
+    def reject_if_open(self) -> None:
+        # Raises CircuitOpen while open, without taking the half-open trial: lets a request fail fast before it
+        # queues for work whose calls then go through allow() one by one
+        with self._lock:
+            if self.state != "open" or monotonic() >= self._opened_at + self._open_for:
+                return
+            retry_after = self.retry_after()
+        BREAKER_REJECTED.inc(site=self.site, dependency=self.dependency)
+        raise CircuitOpen(self.dependency, retry_after)
+
+    def record(self, failed: bool | None, duration: float) -> None:
+        with self._lock:
+            if failed is None:
+                self._trial = False
+                return
+            failed = failed or duration > self.slow_call
+            if self.state == "half_open":
+                self._trial = False
+                if failed:
+                    self._open(min(self._open_for * 2, self.open_seconds * 8))
+                else:
+                    self.state, self._open_for = "closed", self.open_seconds
+                    self._outcomes.clear()
+                    self._publish()
+                return
+            self._outcomes.append(failed)
+            if (
+                self.state == "closed"
+                and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) >= self.failure_rate * len(self._outcomes)
+            ):
+                self._open(self.open_seconds)
+
+    def _open(self, seconds: float) -> None:
+        self.state, self._opened_at, self._open_for = "open", monotonic(), seconds
+        self._outcomes.clear()
+        self._publish()
+
+    @contextmanager
+    def call(self, is_failure: Callable[[BaseException], bool | None]):
+        # Wraps one call (or one operation) against the dependency; is_failure classifies what it raised
+        self.allow()
+        start = monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.record(is_failure(e), monotonic() - start)
+            raise
+        self.record(False, monotonic() - start)
@@ -0,0 +1,61 @@
+import argparse
+import os
+from typing import List
+
+import uvicorn
+
+
+def serve(args: argparse.Namespace) -> None:
+    # On SIGTERM uvicorn stops accepting connections and waits up to graceful_timeout for in-flight requests.
+    # The app's shutdown then waits for GitHub writes already handed to worker threads, so none is cut short.
+    uvicorn.run(
+        "indiecourier.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        limit_max_requests=args.max_requests,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=args.proxy_headers,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        root_path=args.root_path,
+        log_level=args.log_level,
+    )
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="indiecourier", description="IndieCourier Micropub server")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    server = commands.add_parser("serve", help="Run the server (reads .env, syndicate-to.json and sites.json from the current directory)")
+    server.add_argument("--host", default=os.environ.get("INDIECOURIER_HOST", "127.0.0.1"))
+    server.add_argument("--port", type=int, default=int(os.environ.get("INDIECOURIER_PORT", 8000)))
+    server.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        help="Worker processes (default $WEB_CONCURRENCY or 1)",
+    )
+    server.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], default="auto", help="Event loop; auto uses uvloop when installed")
+    server.add_argument("--http", choices=["auto", "h11", "httptools"], default="auto", help="HTTP parser; auto uses httptools when installed")
+    server.add_argument("--keep-alive", type=int, default=5, help="Seconds to hold idle keep-alive connections")
+    server.add_argument("--limit-concurrency", type=int, help="Answer 503 beyond this many connections and tasks per worker")
+    server.add_argument("--max-requests", type=int, help="Restart a worker after this many requests")
+    server.add_argument("--backlog", type=int, default=2048, help="Pending connections the socket accepts")
+    server.add_argument("--graceful-timeout", type=int, default=30, help="Seconds to let in-flight requests finish on shutdown")
+    server.add_argument("--proxy-headers", action=argparse.BooleanOptionalAction, default=True, help="Trust X-Forwarded-* headers")
+    server.add_argument("--forwarded-allow-ips", help="Proxies whose X-Forwarded-* headers are trusted (default 127.0.0.1)")
+    server.add_argument("--root-path", default="", help="Path prefix when served behind a proxy under a subpath")
+    server.add_argument("--log-level", choices=["critical", "error", "warning", "info", "debug", "trace"], default="info")
+    server.set_defaults(handler=serve)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+from github import GithubException
+from github.GitCommit import GitCommit
+from github.InputGitTreeElement import InputGitTreeElement
+
+
+class CommitConflict(Exception):
+    # Files changed on the branch since they were read (or a new file's path is taken)
+    def __init__(self, paths: List[str]):
+        super().__init__(f"Changed since they were read: {', '.join(paths)}")
+        self.paths = paths
+
+
+def path_exists(e: GithubException) -> bool:
+    # The contents API refuses to create a file over an existing one with a 422 asking for its sha ("sha"
+    # wasn't supplied); its other 422s are validation errors that another path would not fix
+    message = e.data.get("message", "") if isinstance(e.data, dict) else str(e.data or "")
+    return e.status == 422 and (("sha" in message and "supplied" in message) or "already exists" in message)
+
+
+def blob_sha(content: bytes) -> str:
+    # The sha git (and GitHub) gives a file with this content
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def text_element(path: str, content: str) -> InputGitTreeElement:
+    return InputGitTreeElement(path, "100644", "blob", content=content)
+
+
+def blob_element(path: str, sha: str) -> InputGitTreeElement:
+    return InputGitTreeElement(path, "100644", "blob", sha=sha)
+
+
+def blobs_at(repo, tree_sha: str, paths: Iterable[str]) -> Dict[str, str | None]:
+    # The blob sha of each path in a tree, None where there is none. Lists only the directories on the way to
+    # the paths, each once, rather than the whole tree.
+    listings: Dict[str, Dict[str, Tuple[str, str]]] = {}
+
+    def listing(directory: str) -> Dict[str, Tuple[str, str]]:
+        if directory not in listings:
+            if directory:
+                parent, _, name = directory.rpartition("/")
+                entry = listing(parent).get(name)
+                if entry is None or entry[0] != "tree":
+                    listings[directory] = {}
+                    return listings[directory]
+                sha = entry[1]
+            else:
+                sha = tree_sha
+            listings[directory] = {item.path: (item.type, item.sha) for item in repo.get_git_tree(sha).tree}
+        return listings[directory]
+
+    found = {}
+    for path in paths:
+        directory, _, name = path.rpartition("/")
+        entry = listing(directory).get(name)
+        found[path] = entry[1] if entry is not None and entry[0] == "blob" else None
+    return found
+
+
+def commit_files(
+    repo, elements: List[InputGitTreeElement], message: str, attempts: int = 3, expected: Dict[str, str | None] | None = None
+) -> GitCommit:
+    # Write several files as a single commit on the default branch (one Pages build instead of one per file).
+    # expected: path -> the blob sha it was read at, or None for a file that must not exist yet. Checked against
+    # every tree we build on, retries included, so a change made in between is never overwritten.
+    branch = repo.default_branch
+    for attempt in range(attempts):
+        ref = repo.get_git_ref(f"heads/{branch}")
+        parent = repo.get_git_commit(ref.object.sha)
+        if expected:
+            current = blobs_at(repo, parent.tree.sha, expected)
+            conflicts = [path for path, sha in expected.items() if current[path] != sha]
+            if conflicts:
+                raise CommitConflict(conflicts)
+        tree = repo.create_git_tree(elements, base_tree=parent.tree)
+        commit = repo.create_git_commit(message, tree, [parent])
+        try:
+            ref.edit(commit.sha)
+            return commit
+        except GithubException as e:
+            # The branch moved under us (not a fast-forward): rebuild on the new head
+            if e.status != 422 or attempt == attempts - 1:
+                raise
@@ -0,0 +1,138 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+
+# Elements that never have an end tag, so are never on the open-element stack
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+}
+
+
+def classes(attrs: Dict[str, str | None]) -> List[str]:
+    return (attrs.get("class") or "").split()
+
+
+def is_root(names: List[str]) -> bool:
+    return any(name.startswith("h-") for name in names)
+
+
+def blocks_implied_name(names: List[str]) -> bool:
+    # mf2 implies a name only for an entry with no p-* or e-* properties other than the name (u-* and dt-* do
+    # not count) and no nested microformats
+    return is_root(names) or any(name.startswith(("p-", "e-")) and name != "p-name" for name in names)
+
+
+def published_value(tag: str, attrs: Dict[str, str | None]) -> str | None:
+    # dt-* values come from an attribute on these elements, otherwise from the text
+    attr = {"time": "datetime", "ins": "datetime", "del": "datetime", "abbr": "title", "data": "value", "input": "value"}.get(tag)
+    return attrs.get(attr) if attr else None
+
+
+class EntryExtractor(HTMLParser):
+    # Reads a page as it arrives, looking only for the first h-entry that is not part of another microformat
+    # (an h-feed aside), and only for its own name and published properties: nested h-cards, h-cites and
+    # comments are skipped. Stops as soon as that h-entry ends; `done` tells the caller to stop reading.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.found = False
+        self.names: List[str] = []
+        self.published: List[str] = []
+        # Open elements: (tag, role) where role is "root", "entry", "nested", "name", "published" or None
+        self._stack: List[Tuple[str, str | None]] = []
+        self._roots = 0  # open microformats outside the entry, or nested inside it
+        self._text: List[str] | None = None  # text of the property being read
+        self._entry_text: List[str] = []
+        self._other_properties = False
+
+    def feed(self, data: str) -> bool:
+        if not self.done:
+            super().feed(data)
+        return self.done
+
+    def handle_starttag(self, tag: str, attr_list) -> None:
+        if self.done:
+            return
+        attrs = dict(attr_list)
+        names = classes(attrs)
+        role = None
+        if not self.found:
+            if "h-entry" in names and self._roots == 0:
+                self.found, role = True, "entry"
+            elif is_root(names) and "h-feed" not in names:
+                role = "root"
+        elif self._roots == 0 and self._text is None:
+            if blocks_implied_name(names):
+                self._other_properties = True
+            if is_root(names):
+                role = "nested"
+            elif "p-name" in names:
+                role = "name"
+            elif "dt-published" in names:
+                value = published_value(tag, attrs)
+                if value is not None:
+                    self.published.append(value.strip())
+                else:
+                    role = "published"
+        elif is_root(names):
+            role = "nested"
+
+        if role in ("name", "published"):
+            self._text = []
+        if tag == "img" and attrs.get("alt") and self.found:
+            self.handle_data(attrs["alt"])
+        if role in ("root", "nested"):
+            self._roots += 1
+        if tag not in VOID_ELEMENTS:
+            self._stack.append((tag, role))
+        elif role is not None:
+            self._close(role)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.done or all(open_tag != tag for open_tag, _ in self._stack):
+            return
+        # Elements left open inside this one (<p>, <li>) end with it
+        while self._stack:
+            open_tag, role = self._stack.pop()
+            self._close(role)
+            if open_tag == tag or self.done:
+                return
+
+    def _close(self, role: str | None) -> None:
+        if role in ("root", "nested"):
+            self._roots -= 1
+        elif role in ("name", "published") and self._text is not None:
+            text = "".join(self._text).strip()
+            (self.names if role == "name" else self.published).append(text)
+            self._text = None
+        elif role == "entry":
+            self.done = True
+
+    def handle_data(self, data: str) -> None:
+        if not self.found or self.done:
+            return
+        self._entry_text.append(data)
+        if self._text is not None:
+            self._text.append(data)
+
+    def result(self) -> Dict:
+        # The page's mf2 as far as we need it: one h-entry with its name and published dates
+        if not self.found:
+            return {"items": []}
+        properties = {}
+        names = self.names
+        if not names and not self._other_properties:
+            # No explicit name and nothing else marked up: the name is implied from the entry's text
+            implied = " ".join("".join(self._entry_text).split())
+            names = [implied] if implied else []
+        if names:
+            properties["name"] = names
+        if self.published:
+            properties["published"] = self.published
+        return {"items": [{"type": ["h-entry"], "properties": properties}]}
+
+
+def extract_entry(html: str) -> Dict:
+    extractor = EntryExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.result()
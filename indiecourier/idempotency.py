@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .cache import TTLCache
+from .state import SharedCache, SharedState
+
+
+def token_identity(token_data: Dict) -> str:
+    # Who is asking: the user and the client they are using
+    return f"{token_data.get('me', '')}|{token_data.get('client_id', '')}"
+
+
+def idempotency_key(identity: str, header_key: str | None, body: Dict) -> str:
+    if header_key:
+        material = f"{identity}|key|{header_key}"
+    else:
+        material = f"{identity}|body|{json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    # Remembers the result of each request for `window` seconds; concurrent duplicates share one execution.
+    # With a SharedState, results and in-progress claims are visible to every worker process on the host; its
+    # SQLite calls go through `run` (the shared executor) so a busy database never stalls the event loop.
+    def __init__(
+        self,
+        window: float,
+        maxsize: int = 4096,
+        shared: SharedState | None = None,
+        lease: float = 60.0,
+        run: Callable[..., Awaitable[Any]] = asyncio.to_thread,
+    ):
+        self.window = window
+        self.shared = shared
+        self.lease = lease
+        self._run = run
+        self._results = SharedCache(shared, "idempotency", window, maxsize) if shared else TTLCache(ttl=window, maxsize=maxsize)
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def _state(self, func: Callable, *args, **kwargs) -> Any:
+        if self.shared is None:
+            return func(*args, **kwargs)
+        return await self._run(func, *args, **kwargs)
+
+    async def _claim(self, key: str, owner: str) -> Any:
+        # Wait until this worker may run the request, or another worker has stored its result. The claim is
+        # renewed while the request runs, however long it takes.
+        delay = 0.01
+        while not await self._state(self.shared.acquire, f"idempotency:{key}", owner, self.lease):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+            result = await self._state(self._results.get, key)
+            if result is not None:
+                return result
+        return await self._state(self._results.get, key)
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        # Returns (result, replayed)
+        while True:
+            result = await self._state(self._results.get, key)
+            if result is not None:
+                return result, True
+
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                # The request we were waiting on was cancelled, not this one: claim the key again
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        owner = uuid.uuid4().hex
+        try:
+            if self.shared is not None:
+                result = await self._claim(key, owner)
+                if result is not None:
+                    future.set_result(result)
+                    return result, True
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # Failures are not remembered: waiters see the same error, later retries run again
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            await self._state(self._results.set, key, result, ttl=self.window)
+            return result, False
+        finally:
+            self._pending.pop(key, None)
+            if self.shared is not None:
+                await self._state(self.shared.release, f"idempotency:{key}", owner)
+
+    def clear(self) -> None:
+        self._results.clear()
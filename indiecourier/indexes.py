@@ -0,0 +1,448 @@
+import base64
+import fcntl
+import json
+import mimetypes
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+import yaml
+
+from .profiling import stage
+from .schemas import Config
+
+
+class PathIndex:
+    # Every file path in the site repository: seeded once from the git tree, or from a memory-mapped snapshot of it
+    # (see snapshots.py), then kept current by our own writes
+    def __init__(self):
+        self._paths: Set[str] | None = None  # with a snapshot, only the paths added since
+        self._removed: Set[str] = set()
+        self._snapshot = None
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._paths is not None or self._snapshot is not None
+
+    def load(self, repo, ref: str | None = None):
+        # Returns the tree, so the tag index can be built from the same listing
+        with stage("github"):
+            tree = repo.get_git_tree(ref or repo.default_branch, recursive=True)
+        self.update(item.path for item in tree.tree if item.type == "blob")
+        return tree
+
+    def update(self, paths: Iterable[str]) -> None:
+        paths = set(paths)
+        with self._lock:
+            self._paths = paths | (self._paths or set())
+            self._removed -= paths
+
+    def use_snapshot(self, snapshot) -> None:
+        # Paths are looked up in the snapshot from now on; only our writes since are held in memory. The
+        # snapshot it replaces is closed, so reloads do not leave a mapping behind each.
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+            if self._paths is None:
+                self._paths = set()
+            self._removed = {path for path in self._removed if path in snapshot}
+            if previous is not None and previous is not snapshot:
+                previous.close()
+
+    def ensure_loaded(self, repo) -> None:
+        if not self.loaded:
+            self.load(repo)
+
+    def add(self, path: str) -> None:
+        with self._lock:
+            if self._paths is None:
+                self._paths = set()
+            self._paths.add(path)
+            self._removed.discard(path)
+
+    def discard(self, path: str) -> None:
+        with self._lock:
+            if self._paths is not None:
+                self._paths.discard(path)
+            if self._snapshot is not None:
+                self._removed.add(path)
+
+    def __contains__(self, path: str) -> bool:
+        if path in self._removed:
+            return False
+        if self._paths is not None and path in self._paths:
+            return True
+        with self._lock:
+            # Under the lock: the snapshot may be swapped and closed by a reload
+            return self._snapshot is not None and path in self._snapshot
+
+    def __len__(self) -> int:
+        # Paths added since the snapshot may be in it too
+        return len(self._paths or ()) + (len(self._snapshot) - len(self._removed) if self._snapshot is not None else 0)
+
+
+# Files under the post directories with these suffixes are posts
+POST_SUFFIXES = (".md", ".markdown", ".html")
+
+
+def post_directories(config: Config) -> Tuple[str, ...]:
+    # The fixed leading directories of the note and article filepath templates, e.g. "_notes/"
+    directories = set()
+    for template in (config.note_filepath_template, config.article_filepath_template):
+        static = template.split("{", 1)[0]
+        directories.add(static.rsplit("/", 1)[0] + "/" if "/" in static else "")
+    return tuple(sorted(directories))
+
+
+def post_tags(frontmatter: Dict, config: Config) -> Tuple[str, ...]:
+    # Tags of a post as they count towards q=category: none while it is deleted
+    if not isinstance(frontmatter, dict) or frontmatter.get("published") is False:
+        return ()
+    tags = frontmatter.get(config.mf2_to_replace.get("category", "category"), ())
+    if isinstance(tags, str):
+        tags = [tags]
+    # Categories can also be nested h-cards (person tags); only plain tags are offered for autocompletion
+    return tuple(dict.fromkeys(tag.strip() for tag in tags if isinstance(tag, str) and tag.strip()))
+
+
+def frontmatter_of(text: str) -> Dict:
+    if "---" not in text:
+        return {}
+    try:
+        return yaml.safe_load(text.split("---", 2)[1]) or {}
+    except yaml.YAMLError:
+        return {}
+
+
+class TagIndex:
+    # Tag → number of published posts carrying it, for q=category. Built from the frontmatter of every post and
+    # saved to `path` with the blob sha each post was read from, so a restart only rereads posts that changed.
+    # Our own writes keep it current and are appended to a journal; posts edited outside IndieCourier are picked
+    # up at the next load.
+    def __init__(self, path: Path, max_workers: int = 8):
+        self.path = path
+        self.max_workers = max_workers
+        self._posts: Dict[str, Tuple[str | None, Tuple[str, ...]]] = {}
+        self._counts: Counter = Counter()
+        self._loaded = False
+        self._by_count: List[str] | None = None
+        self._by_name: List[Tuple[str, str]] | None = None
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, repo, config: Config, tree=None) -> None:
+        if tree is None:
+            with stage("github"):
+                tree = repo.get_git_tree(repo.default_branch, recursive=True)
+        directories = post_directories(config)
+        saved = self._read()
+        posts = {}
+        missing = []
+        for item in tree.tree:
+            if item.type != "blob" or not item.path.startswith(directories) or not item.path.endswith(POST_SUFFIXES):
+                continue
+            entry = saved.get(item.path)
+            if entry is not None and entry[0] == item.sha:
+                posts[item.path] = entry
+            else:
+                missing.append(item)
+
+        def read(item) -> Tuple[str, Tuple[str | None, Tuple[str, ...]]]:
+            with stage("github"):
+                blob = repo.get_git_blob(item.sha)
+            try:
+                text = base64.b64decode(blob.content).decode("utf-8")
+            except (ValueError, UnicodeDecodeError):
+                text = ""
+            return item.path, (item.sha, post_tags(frontmatter_of(text), config))
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                posts.update(executor.map(read, missing))
+        with self._lock:
+            # Our writes made while loading are newer than the tree we read
+            if self._loaded:
+                posts.update(self._posts)
+            self._set_posts(posts)
+            self._loaded = True
+            self._save()
+
+    def ensure_loaded(self, repo, config: Config) -> None:
+        if not self._loaded:
+            self.load(repo, config)
+
+    def set(self, path: str, tags: Tuple[str, ...], sha: str | None = None) -> None:
+        # Record a post we wrote; without the new blob sha the post is reread at the next load
+        with self._lock:
+            old = self._posts.get(path, (None, ()))[1]
+            self._posts[path] = (sha, tuple(tags))
+            if old != tuple(tags):
+                self._counts.subtract(old)
+                self._counts.update(tags)
+                for tag in old:
+                    if self._counts[tag] <= 0:
+                        del self._counts[tag]
+                self._by_count = self._by_name = None
+            if self._loaded:
+                self._append(path, sha, tuple(tags))
+
+    def categories(self, search: str | None = None) -> List[str]:
+        # Most used first; `search` keeps tags starting with it (case-insensitive)
+        with self._lock:
+            if self._by_count is None:
+                self._by_count = sorted(self._counts, key=lambda tag: (-self._counts[tag], tag.casefold()))
+                self._by_name = sorted((tag.casefold(), tag) for tag in self._counts)
+            by_count, by_name, counts = self._by_count, self._by_name, self._counts
+        if not search:
+            return list(by_count)
+        prefix = search.casefold()
+        matches = []
+        for i in range(bisect_left(by_name, (prefix,)), len(by_name)):
+            if not by_name[i][0].startswith(prefix):
+                break
+            matches.append(by_name[i][1])
+        return sorted(matches, key=lambda tag: (-counts[tag], tag.casefold()))
+
+    def count(self, tag: str) -> int:
+        return self._counts.get(tag, 0)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _set_posts(self, posts: Dict[str, Tuple[str | None, Tuple[str, ...]]]) -> None:
+        self._posts = posts
+        self._counts = Counter(tag for _, tags in posts.values() for tag in tags)
+        self._by_count = self._by_name = None
+
+    @property
+    def journal_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".log")
+
+    def _read(self) -> Dict[str, Tuple[str | None, Tuple[str, ...]]]:
+        # The snapshot from the last load, then the writes made since
+        posts = {}
+        try:
+            data = json.loads(self.path.read_text())
+            if data.get("version") == 1:
+                posts = {path: (sha, tuple(tags)) for path, (sha, tags) in data.get("posts", {}).items()}
+        except (FileNotFoundError, ValueError):
+            pass
+        try:
+            with open(self.journal_path) as journal:
+                for line in journal:
+                    try:
+                        path, sha, tags = json.loads(line)
+                    except ValueError:
+                        continue  # cut short by a crash
+                    posts[path] = (sha, tuple(tags))
+        except FileNotFoundError:
+            pass
+        return posts
+
+    def _save(self) -> None:
+        # Written to a temporary file and renamed, so a crash or another worker never leaves a torn file
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": 1, "posts": {path: [sha, list(tags)] for path, (sha, tags) in self._posts.items()}}
+        temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporary.write_text(json.dumps(data, separators=(",", ":")))
+        os.replace(temporary, self.path)
+        self.journal_path.unlink(missing_ok=True)
+
+    def _append(self, path: str, sha: str | None, tags: Tuple[str, ...]) -> None:
+        # One line per write instead of rewriting the snapshot; folded into it at the next load
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_path, "a") as journal:
+            journal.write(json.dumps([path, sha, list(tags)], separators=(",", ":")) + "\n")
+
+
+class MediaItem(NamedTuple):
+    path: str
+    size: int | None
+    content_type: str | None
+    uploaded: float
+    sha: str | None = None  # git blob sha, to find files we already have
+
+
+def media_item_from_path(path: str, size: int | None = None, sha: str | None = None) -> MediaItem:
+    # Files we upload are named {unix time}_{uuid}; others sort as oldest
+    stem = path.rsplit("/", 1)[-1].split("_", 1)[0]
+    uploaded = float(stem) if stem.isdigit() else 0.0
+    return MediaItem(path, size, mimetypes.guess_type(path)[0], uploaded, sha)
+
+
+# The media journal is folded into its snapshot at the next load once it is this large
+MEDIA_JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+class MediaIndex:
+    # Files in media_dir, oldest first, for q=last and q=source on the media endpoint. Seeded from the git tree,
+    # then extended by uploads, which are also appended to a journal that every worker on the host tails, so
+    # an upload handled by one worker is listed by all of them. Past `compact_bytes` the journal is folded into
+    # a snapshot and started afresh, so a load does not replay every upload ever made line by line.
+    def __init__(self, journal_path: Path, compact_bytes: int = MEDIA_JOURNAL_COMPACT_BYTES):
+        self.journal_path = journal_path
+        self.compact_bytes = compact_bytes
+        self._items: List[MediaItem] = []
+        self._position: Dict[str, int] = {}
+        self._by_sha: Dict[str, str] = {}
+        self._journal_inode: int | None = None  # which journal file the offset is in; compaction replaces it
+        self._journal_offset = 0
+        self._loaded = False
+        self._lock = Lock()
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.journal_path.with_suffix(".json")
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, repo, config: Config, tree=None) -> None:
+        if tree is None:
+            with stage("github"):
+                tree = repo.get_git_tree(repo.default_branch, recursive=True)
+        directory = config.media_dir.strip("/") + "/"
+        items = sorted(
+            (media_item_from_path(item.path, item.size, item.sha)
+             for item in tree.tree if item.type == "blob" and item.path.startswith(directory)),
+            key=lambda item: (item.uploaded, item.path),
+        )
+        with self._lock:
+            # Uploads this process has already recorded keep their place after the seeded files
+            seeded = {item.path for item in items}
+            recorded = [item for item in self._items if item.path not in seeded]
+            self._items, self._position, self._by_sha = [], {}, {}
+            self._journal_inode, self._journal_offset = None, 0
+            for item in items + recorded:
+                self._insert(item)
+            self._loaded = True
+        self.compact()
+        self.refresh()
+
+    def ensure_loaded(self, repo, config: Config) -> None:
+        if not self._loaded:
+            self.load(repo, config)
+
+    def _open_journal(self, mode: str):
+        # The current journal, locked against other workers: compaction swaps in a new file, and a write to the
+        # one it replaced would be lost
+        while True:
+            journal = open(self.journal_path, mode)
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            try:
+                if os.fstat(journal.fileno()).st_ino == os.stat(self.journal_path).st_ino:
+                    return journal
+            except FileNotFoundError:
+                pass
+            journal.close()
+
+    def add(self, item: MediaItem) -> None:
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with self._open_journal("a") as journal:
+                journal.write(json.dumps(list(item), separators=(",", ":")) + "\n")
+            self._insert(item)
+
+    def _read_snapshot(self) -> List[MediaItem]:
+        try:
+            data = json.loads(self.snapshot_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return []
+        if data.get("version") != 1:
+            return []
+        return [MediaItem(*item) for item in data.get("items", [])]
+
+    def compact(self) -> None:
+        # Folds a journal past compact_bytes into the snapshot and replaces it with an empty one. The snapshot
+        # is written first, so a worker that finds the journal replaced reads what it missed from there.
+        try:
+            if self.journal_path.stat().st_size < self.compact_bytes:
+                return
+        except FileNotFoundError:
+            return
+        with self._open_journal("r+b") as journal:
+            items = {item.path: item for item in self._read_snapshot()}
+            for line in journal.read().splitlines():
+                try:
+                    item = MediaItem(*json.loads(line))
+                except (ValueError, TypeError):
+                    continue  # cut short by a crash
+                items[item.path] = item
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            temporary = self.snapshot_path.with_name(self.snapshot_path.name + suffix)
+            data = {"version": 1, "items": [list(item) for item in items.values()]}
+            temporary.write_text(json.dumps(data, separators=(",", ":")))
+            os.replace(temporary, self.snapshot_path)
+            empty = self.journal_path.with_name(self.journal_path.name + suffix)
+            empty.touch()
+            os.replace(empty, self.journal_path)
+
+    def refresh(self) -> None:
+        # Pick up uploads other workers appended to the journal since we last looked
+        try:
+            stat = self.journal_path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino == self._journal_inode and stat.st_size <= self._journal_offset:
+            return
+        with self._lock:
+            with open(self.journal_path, "rb") as journal:
+                inode = os.fstat(journal.fileno()).st_ino
+                if inode != self._journal_inode:
+                    # First look, or the journal was compacted: what it held is in the snapshot now
+                    for item in self._read_snapshot():
+                        self._insert(item)
+                    self._journal_inode, self._journal_offset = inode, 0
+                journal.seek(self._journal_offset)
+                data = journal.read()
+            complete = data[: data.rfind(b"\n") + 1]  # a line still being written is read next time
+            self._journal_offset += len(complete)
+            for line in complete.splitlines():
+                try:
+                    self._insert(MediaItem(*json.loads(line)))
+                except (ValueError, TypeError):
+                    continue
+
+    def _insert(self, item: MediaItem) -> None:
+        if item.sha:
+            self._by_sha.setdefault(item.sha, item.path)
+        position = self._position.get(item.path)
+        if position is not None:
+            # The journal has the exact metadata, the tree the blob sha
+            self._items[position] = item if item.sha else item._replace(sha=self._items[position].sha)
+        else:
+            self._position[item.path] = len(self._items)
+            self._items.append(item)
+
+    def find(self, sha: str) -> MediaItem | None:
+        # A file with this content, if we have one
+        with self._lock:
+            path = self._by_sha.get(sha)
+            return None if path is None else self._items[self._position[path]]
+
+    def last(self) -> MediaItem | None:
+        return self._items[-1] if self._items else None
+
+    def page(self, limit: int, offset: int = 0, before: str | None = None) -> Tuple[List[MediaItem], bool]:
+        # Newest first. `before` (a listed path) continues after that item, unaffected by newer uploads.
+        # Returns the page and whether older items remain.
+        with self._lock:
+            end = len(self._items) if before is None else self._position[before]
+            end = max(end - offset, 0)
+            start = max(end - limit, 0)
+            return self._items[start:end][::-1], start > 0
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._position
+
+    def __len__(self) -> int:
+        return len(self._items)
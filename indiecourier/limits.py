@@ -0,0 +1,93 @@
+import json
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException, Request
+
+from .schemas import RequestLimits
+
+try:
+    # Several times faster than json for the bodies we get; used when installed
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+@lru_cache
+def load_request_limits() -> RequestLimits:
+    return RequestLimits()
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail={"error": "request_too_large", "error_description": f"Request body is larger than {limit} bytes"},
+    )
+
+
+def invalid_request(description: str) -> HTTPException:
+    return HTTPException(status_code=400, detail={"error": "invalid_request", "error_description": description})
+
+
+def limit_body(request: Request, limit: int) -> None:
+    # Refuse on Content-Length before reading anything; otherwise (chunked, or a lying client) count the bytes
+    # as they arrive and stop at the limit instead of buffering the rest
+    length = request.headers.get("Content-Length")
+    if length is not None:
+        if not length.isdigit():
+            raise invalid_request("Invalid Content-Length")
+        if int(length) > limit:
+            raise too_large(limit)
+
+    receive = request._receive
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise too_large(limit)
+        return message
+
+    request._receive = limited_receive
+
+
+def check_structure(data: Any, limits: RequestLimits) -> None:
+    # Iterative, so hostile nesting cannot exhaust the stack
+    stack = [(data, 1)]
+    fields = 0
+    while stack:
+        value, depth = stack.pop()
+        if depth > limits.max_depth:
+            raise invalid_request(f"Request is nested deeper than {limits.max_depth} levels")
+        if isinstance(value, dict):
+            children = value.values()
+        elif isinstance(value, list):
+            children = value
+        else:
+            continue
+        fields += len(children)
+        if fields > limits.max_fields:
+            raise invalid_request(f"Request has more than {limits.max_fields} fields")
+        stack.extend((child, depth + 1) for child in children)
+
+
+def parse_json(body: bytes, limits: RequestLimits) -> Any:
+    try:
+        data = loads(body)
+    except (ValueError, RecursionError):
+        raise invalid_request("Request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise invalid_request("Request body must be a JSON object")
+    check_structure(data, limits)
+    return data
+
+
+def check_form_fields(body: bytes, limits: RequestLimits) -> None:
+    # Counted on the raw body, before any field is decoded
+    if body and body.count(b"&") + 1 > limits.max_fields:
+        raise invalid_request(f"Request has more than {limits.max_fields} fields")
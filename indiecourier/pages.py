@@ -0,0 +1,89 @@
+from typing import Dict, NamedTuple
+
+import httpx
+from fastapi import HTTPException
+
+from .cache import TTLCache
+from .entries import EntryExtractor
+
+
+class ParsedPage(NamedTuple):
+    mf2: Dict
+    etag: str | None
+    last_modified: str | None
+
+
+class PageCache:
+    # The h-entry of published pages (see entries.py), read only as far as the entry goes. Cached pages are
+    # revalidated with If-None-Match/If-Modified-Since when the server gave us a validator, reused as they are
+    # otherwise, and dropped when we write to the post.
+    def __init__(self, resources, ttl: float, maxsize: int):
+        # resources: the process's SharedResources (connection pool and worker threads)
+        self.resources = resources
+        self._pages = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    @property
+    def ttl(self) -> float:
+        return self._pages.ttl
+
+    @ttl.setter
+    def ttl(self, ttl: float) -> None:
+        self._pages.ttl = ttl
+
+    @property
+    def maxsize(self) -> int:
+        return self._pages.maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize: int) -> None:
+        self._pages.maxsize = maxsize
+
+    async def fetch(self, url: str, headers: Dict[str, str]) -> httpx.Response:
+        # Streamed, so the rest of the page need not be downloaded once the entry has been read
+        client = self.resources.http_client()
+        return await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+    async def extract(self, response: httpx.Response) -> Dict:
+        extractor = EntryExtractor()
+        async for chunk in response.aiter_text():
+            if await self.resources.run(extractor.feed, chunk):
+                break
+        else:
+            extractor.close()
+        return extractor.result()
+
+    async def parse(self, url: str) -> Dict:
+        cached: ParsedPage | None = self._pages.get(url)
+        if cached is not None and not (cached.etag or cached.last_modified):
+            return cached.mf2
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        try:
+            response = await self.fetch(url, headers)
+            try:
+                if response.status_code == 304 and cached is not None:
+                    self._pages.set(url, cached)
+                    return cached.mf2
+                mf2 = await self.extract(response)
+            finally:
+                await response.aclose()
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=502,
+                detail={"error": "fetch_failed", "error_description": f"Could not fetch {url}: {type(e).__name__}"},
+            )
+        if response.status_code == 200:
+            page = ParsedPage(mf2, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            self._pages.set(url, page)
+        return mf2
+
+    def invalidate(self, url: str) -> None:
+        self._pages.pop(url)
+
+    def clear(self) -> None:
+        self._pages.clear()
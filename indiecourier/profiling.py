@@ -0,0 +1,286 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from time import perf_counter, time
+from typing import Callable, Dict, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+
+from .schemas import ProfilingSettings
+
+# Per-request stage durations for Server-Timing, and the profile of the current request if one was asked for
+_timings: ContextVar[Dict[str, float] | None] = ContextVar("timings", default=None)
+_profile: ContextVar["RequestProfile | None"] = ContextVar("profile", default=None)
+
+_continuous: "ContinuousProfiler | None" = None
+_continuous_lock = threading.Lock()
+# Stages can finish on executor threads as well as the event loop, and share the request's timings dict
+_timings_lock = threading.Lock()
+# Held by the one request being profiled with cProfile; only one profiler can be active per process
+_deterministic_lock = threading.Lock()
+
+
+@lru_cache
+def load_profiling_settings() -> ProfilingSettings:
+    return ProfilingSettings()
+
+
+@contextmanager
+def stage(name: str):
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        with _timings_lock:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def profiling_deterministically() -> bool:
+    # cProfile only sees its own thread, and only one can be active at a time, so a request
+    # profiled deterministically runs its blocking work on the event loop thread instead
+    profile = _profile.get()
+    return profile is not None and profile.mode == "deterministic"
+
+
+def fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class Sampler:
+    # Records the stack of every other thread each `interval` seconds as folded stacks (flamegraph.pl, speedscope)
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="indiecourier-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sample(self) -> None:
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident != me:
+                    self.stacks[f"{names.get(ident, ident)};{fold(frame)}"] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def drain(self) -> Counter:
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+        return stacks
+
+    def report(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.drain().most_common())
+
+
+class RequestProfile:
+    def __init__(self, mode: str, interval: float):
+        self.mode = mode
+        self.sampler = Sampler(interval) if mode == "sampling" else None
+        self.profile = cProfile.Profile() if mode == "deterministic" else None
+
+    @property
+    def suffix(self) -> str:
+        return ".folded" if self.mode == "sampling" else ".pstats.txt"
+
+    def start(self) -> None:
+        if self.sampler is not None:
+            self.sampler.start()
+        else:
+            self.profile.enable()
+
+    def stop(self) -> None:
+        if self.sampler is not None:
+            self.sampler.stop()
+        else:
+            self.profile.disable()
+
+    def report(self) -> str:
+        if self.sampler is not None:
+            return self.sampler.report()
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(60)
+        return out.getvalue()
+
+
+class ContinuousProfiler(Sampler):
+    # Low-rate sampler for the whole process, flushed to profile_dir every `flush_interval` seconds
+    def __init__(self, interval: float, flush_interval: float, directory: Path):
+        super().__init__(interval)
+        self.flush_interval = flush_interval
+        self.directory = directory
+
+    def _run(self) -> None:
+        next_flush = time() + self.flush_interval
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time() >= next_flush:
+                self.flush()
+                next_flush = time() + self.flush_interval
+        self.flush()
+
+    def flush(self) -> None:
+        stacks = self.drain()
+        if stacks:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"continuous-{os.getpid()}-{int(time())}.folded"
+            path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+
+
+def ensure_continuous_profiler(settings: ProfilingSettings) -> None:
+    global _continuous
+    if _continuous is not None:
+        return
+    with _continuous_lock:
+        if _continuous is None:
+            _continuous = ContinuousProfiler(
+                settings.continuous_profile_interval, settings.continuous_profile_flush, Path(settings.profile_dir)
+            )
+            _continuous.start()
+
+
+def stop_continuous_profiler() -> None:
+    # At shutdown: the sampler thread is a daemon, so without this the samples since the last flush are lost
+    global _continuous
+    with _continuous_lock:
+        profiler, _continuous = _continuous, None
+    if profiler is not None:
+        profiler.stop()
+
+
+def requested_profile(scope, settings: ProfilingSettings) -> Tuple[str, str] | None:
+    # (mode, output) when the request carries the admin token in X-Profile or ?profile=
+    if not settings.admin_token:
+        return None
+    headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+    query = {key: values[0] for key, values in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+    token = headers.get("x-profile") or query.get("profile")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), settings.admin_token.encode("utf-8")):
+        return None
+    mode = headers.get("x-profile-mode") or query.get("profile_mode") or "sampling"
+    output = headers.get("x-profile-output") or query.get("profile_output") or "file"
+    if mode not in ("sampling", "deterministic") or output not in ("file", "inline"):
+        return None
+    return mode, output
+
+
+class ProfilingMiddleware:
+    # Adds Server-Timing to every response and profiles requests that ask for it with the admin token
+    def __init__(self, app, settings: Callable[[], ProfilingSettings] = load_profiling_settings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        settings = self.settings()
+        if settings.continuous_profile_interval > 0:
+            ensure_continuous_profiler(settings)
+        requested = requested_profile(scope, settings)
+        if requested is None and not settings.server_timing:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        timings_token = _timings.set(timings)
+        mode = requested[0] if requested else None
+        if mode == "deterministic" and not _deterministic_lock.acquire(blocking=False):
+            # Another request holds cProfile: sample this one instead (X-Profile-Mode says which was used)
+            mode = "sampling"
+        profile = RequestProfile(mode, settings.profile_interval) if mode else None
+        inline = requested is not None and requested[1] == "inline"
+        profile_path = None
+        if profile is not None and not inline:
+            name = scope["path"].strip("/").replace("/", "_") or "root"
+            profile_path = Path(settings.profile_dir) / f"{int(time() * 1000)}-{scope['method']}-{name}{profile.suffix}"
+
+        start = perf_counter()
+        held = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = perf_counter() - start
+                headers = MutableHeaders(scope=message)
+                if settings.server_timing:
+                    headers.append("Server-Timing", server_timing(timings))
+                if profile_path is not None:
+                    headers.append("X-Profile-Path", str(profile_path))
+                if profile is not None:
+                    headers.append("X-Profile-Mode", profile.mode)
+            if inline:
+                held.append(message)
+            else:
+                await send(message)
+
+        profile_token = _profile.set(profile) if profile is not None else None
+        try:
+            if profile is not None:
+                profile.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile is not None:
+                profile.stop()
+                _profile.reset(profile_token)
+                if profile.mode == "deterministic":
+                    _deterministic_lock.release()
+            _timings.reset(timings_token)
+
+        if profile is None:
+            return
+        report = profile.report()
+        if profile_path is not None:
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            profile_path.write_text(report)
+        else:
+            # Inline: the profile replaces the response body, the original status is kept in a header
+            status = held[0]["status"] if held else 500
+            body = report.encode("utf-8")
+            headers = [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"x-profile-status", str(status).encode("latin-1")),
+                (b"x-profile-mode", profile.mode.encode("latin-1")),
+            ]
+            if settings.server_timing:
+                headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
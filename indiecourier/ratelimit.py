@@ -0,0 +1,111 @@
+import math
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Literal, Tuple
+
+from fastapi import HTTPException
+
+from .admission import Priority
+from .metrics import Counter, Gauge
+
+RATE_LIMITED = Counter("indiecourier_rate_limited_total", "Requests refused with 429", ["site", "priority", "scope"])
+RATE_LIMIT_KEYS = Gauge("indiecourier_rate_limit_keys", "Token buckets currently tracked", ["site"])
+
+Scope = Literal["token", "client"]
+
+
+def rate_limited(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail={"error": "rate_limited", "error_description": "Too many requests, please slow down"},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class BucketSet:
+    # Token buckets with one rate and capacity, each stored as [tokens, last update], least recently used
+    # first. A bucket idle long enough to refill completely is no different from a new one, so it is dropped.
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self._buckets: OrderedDict[str, List[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def configure(self, rate: float, capacity: float) -> None:
+        self.rate, self.capacity = rate, capacity
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.capacity > 0
+
+    def evict(self, now: float) -> None:
+        refill = self.capacity / self.rate
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < refill:
+                break
+            del self._buckets[key]
+
+    def available(self, key: str, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+
+    def wait(self, key: str, now: float, cost: float = 1) -> float:
+        # Seconds until `cost` tokens are available
+        return max(0.0, (cost - self.available(key, now)) / self.rate)
+
+    def take(self, key: str, now: float, cost: float = 1) -> None:
+        self._buckets[key] = [self.available(key, now) - cost, now]
+        self._buckets.move_to_end(key)
+
+
+class RateLimiter:
+    # Per-site request rates, checked before GitHub-bound work: one bucket per token (user and client) and a
+    # larger one per client_id, so neither one user's client nor a client across all its users can use up
+    # the GitHub quota. Reads and writes are counted separately.
+    def __init__(self, site: str, rates: Dict[Priority, Tuple[float, float]], client_factor: float):
+        self.site = site
+        self._sets: Dict[Tuple[Priority, Scope], BucketSet] = {}
+        self._lock = Lock()
+        self.configure(rates, client_factor)
+
+    def configure(self, rates: Dict[Priority, Tuple[float, float]], client_factor: float) -> None:
+        # rates: priority -> (requests per minute, burst)
+        with self._lock:
+            for priority, (per_minute, burst) in rates.items():
+                for scope, factor in (("token", 1.0), ("client", client_factor)):
+                    rate, capacity = per_minute * factor / 60, burst * factor
+                    if (priority, scope) in self._sets:
+                        self._sets[priority, scope].configure(rate, capacity)
+                    else:
+                        self._sets[priority, scope] = BucketSet(rate, capacity)
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._sets.values())
+
+    def check(self, priority: Priority, token: str, client_id: str | None, cost: int = 1) -> None:
+        # Takes `cost` requests (a batch counts each of its operations) from each bucket, or raises 429 with the
+        # wait until all of them allow it. A cost over a bucket's burst takes the whole burst.
+        keys = [("token", token)] + ([("client", client_id)] if client_id else [])
+        now = monotonic()
+        with self._lock:
+            checks = []
+            for scope, key in keys:
+                buckets = self._sets[priority, scope]
+                if buckets.enabled:
+                    buckets.evict(now)
+                    checks.append((scope, buckets, key, min(cost, buckets.capacity)))
+            waits = [(buckets.wait(key, now, units), scope) for scope, buckets, key, units in checks]
+            wait, scope = max(waits, default=(0.0, None))
+            if wait <= 0:
+                for _, buckets, key, units in checks:
+                    buckets.take(key, now, units)
+            RATE_LIMIT_KEYS.set(len(self), site=self.site)
+        if wait > 0:
+            RATE_LIMITED.inc(site=self.site, priority=priority, scope=scope)
+            raise rate_limited(max(1, math.ceil(wait)))
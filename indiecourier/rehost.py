@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import socket
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Properties whose remote URLs are copied into media_dir, and the content types accepted for each
+REHOST_PROPERTIES = {"photo": "image/", "video": "video/", "audio": "audio/"}
+MAX_REDIRECTS = 5
+
+
+class RehostError(Exception):
+    pass
+
+
+class RemoteMedia(NamedTuple):
+    # A remote file fetched to local disk, waiting to be uploaded
+    property: str
+    url: str
+    file: Path
+    size: int
+    content_type: str
+    sha: str  # git blob sha
+
+    @property
+    def filename(self) -> str:
+        name = PurePosixPath(urlsplit(self.url).path).name
+        if PurePosixPath(name).suffix:
+            return name
+        return f"{name or 'media'}{mimetypes.guess_extension(self.content_type) or ''}"
+
+
+def value_url(value) -> str | None:
+    # Property values are URLs or {"value": url, "alt": ...}
+    url = value.get("value") if isinstance(value, dict) else value
+    return url if isinstance(url, str) else None
+
+
+def remote_urls(properties: Dict[str, List], site_url: str) -> Dict[str, str]:
+    # url -> property, for http(s) URLs outside the site, in order of appearance
+    urls: Dict[str, str] = {}
+    for prop in REHOST_PROPERTIES:
+        for value in properties.get(prop, []):
+            url = value_url(value)
+            if url and url.startswith(("http://", "https://")) and not url.startswith(site_url):
+                urls.setdefault(url, prop)
+    return urls
+
+
+def rewrite_urls(properties: Dict[str, List], rewritten: Dict[str, str]) -> None:
+    for prop in REHOST_PROPERTIES:
+        values = properties.get(prop, [])
+        for i, value in enumerate(values):
+            url = value_url(value)
+            if url in rewritten:
+                values[i] = {**value, "value": rewritten[url]} if isinstance(value, dict) else rewritten[url]
+
+
+def file_blob_sha(path: Path, size: int) -> str:
+    digest = hashlib.sha1(b"blob %d\0" % size)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def resolve(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+async def check_public(url: httpx.URL) -> str:
+    # Whatever we fetch is committed to a public repository, so a post must not be able to point us at
+    # loopback, private or link-local services (cloud metadata endpoints, the admin side of other tenants).
+    # Returns the checked address to connect to: resolving the name again could give another one.
+    if url.scheme not in ("http", "https") or not url.host:
+        raise RehostError(f"unsupported URL {url}")
+    try:
+        addresses = [ipaddress.ip_address(url.host)]
+    except ValueError:
+        try:
+            addresses = [ipaddress.ip_address(address) for address in await resolve(url.host, url.port or (443 if url.scheme == "https" else 80))]
+        except (OSError, ValueError) as e:
+            raise RehostError(f"cannot resolve {url.host}: {e}")
+    for address in addresses:
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise RehostError(f"{url.host} resolves to {address}, which is not a public address")
+    return str(addresses[0])
+
+
+def pinned(url: httpx.URL, address: str) -> httpx.Request:
+    # A GET of `url` sent to `address`, with the original Host header and, for https, the original name for
+    # SNI and certificate verification
+    extensions = {"sni_hostname": url.host} if url.scheme == "https" else {}
+    return httpx.Request("GET", url.copy_with(host=address), headers={"Host": url.netloc.decode("ascii")}, extensions=extensions)
+
+
+def temporary_file(directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+    return Path(name)
+
+
+async def fetch_remote(
+    client: httpx.AsyncClient,
+    prop: str,
+    url: str,
+    directory: Path,
+    max_size: int,
+    timeout: float,
+    run: Callable[..., Awaitable[Any]] = asyncio.to_thread,
+) -> RemoteMedia:
+    # Streams `url` into a temporary file under `directory`, giving up past max_size bytes or timeout seconds.
+    # Redirects are followed here rather than by the client, so every hop's address is checked, and each
+    # request goes to the address that was checked. File I/O goes through `run` (the shared executor).
+    file = await run(temporary_file, directory)
+    try:
+        f = await run(open, file, "wb")
+        try:
+            async with asyncio.timeout(timeout):
+                target = httpx.URL(url)
+                for _ in range(MAX_REDIRECTS + 1):
+                    request = pinned(target, await check_public(target))
+                    request.headers["Accept"] = f"{REHOST_PROPERTIES[prop]}*"
+                    response = await client.send(request, stream=True, follow_redirects=False)
+                    try:
+                        if response.is_redirect:
+                            target = target.join(response.headers["Location"])
+                            continue
+                        if response.status_code != 200:
+                            raise RehostError(f"HTTP {response.status_code}")
+                        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                        if not content_type.startswith(REHOST_PROPERTIES[prop]):
+                            raise RehostError(f"unexpected Content-Type {content_type or 'none'}")
+                        length = response.headers.get("Content-Length")
+                        if length and length.isdigit() and int(length) > max_size:
+                            raise RehostError(f"{length} bytes is over the {max_size} byte limit")
+                        size = 0
+                        async for chunk in response.aiter_bytes():
+                            size += len(chunk)
+                            if size > max_size:
+                                raise RehostError(f"over the {max_size} byte limit")
+                            await run(f.write, chunk)
+                        break
+                    finally:
+                        await response.aclose()
+                else:
+                    raise RehostError(f"more than {MAX_REDIRECTS} redirects")
+        finally:
+            await run(f.close)
+        return RemoteMedia(prop, url, file, size, content_type, await run(file_blob_sha, file, size))
+    except BaseException as e:
+        file.unlink(missing_ok=True)
+        if isinstance(e, (httpx.HTTPError, httpx.InvalidURL, TimeoutError)):
+            raise RehostError(str(e) or type(e).__name__) from e
+        raise
+
+
+async def fetch_all(
+    client: httpx.AsyncClient,
+    urls: Dict[str, str],
+    directory: Path,
+    max_size: int,
+    timeout: float,
+    run: Callable[..., Awaitable[Any]] = asyncio.to_thread,
+) -> List[RemoteMedia]:
+    # Fetches concurrently; a file that cannot be fetched keeps its remote URL in the post
+    results = await asyncio.gather(
+        *(fetch_remote(client, prop, url, directory, max_size, timeout, run) for url, prop in urls.items()),
+        return_exceptions=True,
+    )
+    fetched = [result for result in results if isinstance(result, RemoteMedia)]
+    for url, result in zip(urls, results):
+        if isinstance(result, RehostError):
+            logger.warning("Not rehosting %s: %s", url, result)
+        elif isinstance(result, BaseException):
+            discard(fetched)
+            raise result
+    return fetched
+
+
+def discard(fetched: List[RemoteMedia]) -> None:
+    for item in fetched:
+        item.file.unlink(missing_ok=True)
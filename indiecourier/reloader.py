@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from .schemas import Config
+from .sites import SiteRegistry, shared
+
+logger = logging.getLogger(__name__)
+
+CONFIG_POLL_INTERVAL = float(os.environ.get("INDIECOURIER_CONFIG_POLL_INTERVAL", 2.0))
+
+
+def config_sources(registry: SiteRegistry) -> List[Path]:
+    return [registry.path, Path(Config.model_config["env_file"]), Path(Config.model_config["json_file"])]
+
+
+class ConfigWatcher:
+    # Polls the config files' mtimes and reloads the registry when one of them changes, then calls `on_reload`
+    # on the event loop (app.py warms up any sites the reload added)
+    def __init__(
+        self, registry: SiteRegistry, interval: float = CONFIG_POLL_INTERVAL, on_reload: Callable[[], None] | None = None
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stamps = self._snapshot()
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int] | None]:
+        stamps = {}
+        for path in config_sources(self.registry):
+            try:
+                stat = path.stat()
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stamps[path] = None
+        return stamps
+
+    def check(self) -> bool:
+        stamps = self._snapshot()
+        if stamps == self._stamps:
+            return False
+        self._stamps = stamps
+        try:
+            sites = self.registry.reload()
+        except Exception:
+            logger.exception("Config reload failed, keeping the current config")
+            return False
+        logger.info("Reloaded config for %d site(s)", len(sites))
+        return True
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if await shared.run(self.check) and self.on_reload is not None:
+                self.on_reload()
@@ -0,0 +1,38 @@
+from datetime import date
+from typing import List, NamedTuple
+
+import parse
+
+from .schemas import Config
+
+
+class PostMatch(NamedTuple):
+    kind: str  # "note" or "article"
+    date: date
+    slug: str
+    path: str
+
+
+class PostRouter:
+    # The note and article URL templates compiled once per config (with site_url filled in), so a post URL is
+    # classified and mapped to its file without fetching the page. Only when both templates match the same
+    # URL does the caller need the published page to tell them apart.
+    def __init__(self, config: Config):
+        site_url = str(config.site_url).rstrip("/")
+        self.routes = [
+            (kind, parse.compile(url_template.replace("{site_url}", site_url)), filepath_template)
+            for kind, url_template, filepath_template in (
+                ("note", config.note_url_template, config.note_filepath_template),
+                ("article", config.article_url_template, config.article_filepath_template),
+            )
+        ]
+
+    def match(self, url: str) -> List[PostMatch]:
+        matches = []
+        for kind, pattern, filepath_template in self.routes:
+            result = pattern.parse(url)
+            if result is None or "date" not in result.named or "slug" not in result.named:
+                continue
+            path = filepath_template.format(site_url="", date=result["date"], slug=result["slug"])
+            matches.append(PostMatch(kind, result["date"], result["slug"], path))
+        return matches
@@ -0,0 +1,227 @@
+from typing import Dict, List, Tuple, Type, Literal
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel, Field, HttpUrl
+from pydantic_settings import BaseSettings, JsonConfigSettingsSource, PydanticBaseSettingsSource, SettingsConfigDict
+
+class UserOrService(BaseModel):
+    name: str
+    url: HttpUrl | None = None
+    photo: str | None = None
+
+
+class SyndicationEndpoint(BaseModel):
+    uid: str
+    name: str
+    service: UserOrService | None = None
+    user: UserOrService | None = None
+
+
+class Config(BaseSettings):
+    me: HttpUrl
+    token_endpoint: HttpUrl = Field(..., alias="token-endpoint")
+    site_url: HttpUrl = Field(..., alias="site-url")
+    syndicate_to: List[SyndicationEndpoint] = Field(default_factory=list, alias="syndicate-to")
+    github_repo: str 
+    github_token: str
+    github_user: str
+    # GitHub Enterprise (https://github.example.com/api/v3) or a local stand-in for load tests
+    github_api_url: str = "https://api.github.com"
+    media_dir: str
+    media_endpoint: str
+    # Templates have access to date, slug, and site_url 
+    article_filepath_template: str = "_posts/{date:%Y-%m-%d}-{slug}.md"
+    article_url_template: str = "{site_url}/posts/{date:%Y/%m/%d}/{slug}"
+    note_filepath_template: str = "_notes/{slug}.md"
+    note_url_template: str = "{site_url}/notes/{date:%Y/%m/%d}/{slug}"
+    # Note slugs: unix seconds, unix milliseconds, or YYYYMMDD-N
+    note_slug_scheme: Literal["timestamp", "timestamp_ms", "sequence"] = "timestamp"
+    timezone: ZoneInfo = ZoneInfo("UTC")
+
+    # Local state (slug reservations, indexes, upload sessions) shared by the workers on this host
+    state_dir: str = ".indiecourier"
+    # Keep the token cache, idempotency records and post locks in a SQLite database under state_dir, so all
+    # workers on this host share them (read at startup). Locks expire after lock_lease seconds if a worker dies.
+    shared_state: bool = False
+    lock_lease: float = 30.0
+    lock_timeout: float = 10.0
+
+    # Resumable media uploads (/media/uploads); GitHub refuses files over 100 MiB whatever this says
+    upload_session_ttl: float = 86400.0
+    max_upload_size: int = 100 * 1024 * 1024
+    # Copy remote photo/video/audio URLs of new posts into media_dir and commit them with the post. Files are
+    # fetched concurrently, each within rehost_max_size bytes and rehost_timeout seconds; files already in the
+    # repo are linked instead. A file that cannot be fetched keeps its remote URL.
+    rehost_media: bool = False
+    rehost_max_size: int = 20 * 1024 * 1024
+    rehost_timeout: float = 10.0
+
+    # Backpressure on GitHub-bound writes: at most this many run at once per site, the rest wait in a queue of
+    # this size (reads ahead of writes) for up to the timeout. A full queue is answered with 503 + Retry-After.
+    max_concurrent_writes: int = 4
+    write_queue_size: int = 32
+    write_queue_timeout: float = 30.0
+
+    # Circuit breakers for the token endpoint and GitHub: open when, of the last breaker_window calls (at least
+    # breaker_min_calls), breaker_failure_rate failed or took over breaker_slow_call seconds. While open, requests
+    # get 503 + Retry-After at once; after breaker_open_seconds a single trial call is let through.
+    breaker_failure_rate: float = 0.5
+    breaker_slow_call: float = 10.0
+    breaker_window: int = 20
+    breaker_min_calls: int = 5
+    breaker_open_seconds: float = 30.0
+    # Tokens validated within this many seconds are still accepted while the token endpoint's breaker is open
+    token_stale_ttl: float = 3600.0
+
+    # Rate limits in requests per minute with bursts of up to *_burst, per token (user and client) and, times
+    # client_rate_factor, per client_id across all its users; reads and writes are counted separately. Checked
+    # before any GitHub call; excess requests get 429 + Retry-After. A rate of 0 disables the limit.
+    read_rate_limit: float = 300.0
+    read_burst: int = 60
+    write_rate_limit: float = 30.0
+    write_burst: int = 10
+    client_rate_factor: float = 4.0
+
+    # Multi-site selection (see sites.json): requests are matched on path prefix, `me` or host
+    host: str | None = None
+    path_prefix: str | None = None
+
+    # Verify JWT access tokens locally against the issuer's JWKS or a PEM public key instead of asking
+    # token_endpoint; opaque tokens are still introspected
+    jwks_url: HttpUrl | None = None
+    token_public_key: str | None = None
+    token_algorithms: List[str] = ["RS256", "ES256", "EdDSA"]
+    jwks_refresh_interval: float = 3600.0
+
+    # Parsed mf2 of published posts (used to resolve update/delete URLs), revalidated with ETag/Last-Modified
+    mf2_cache_ttl: float = 300.0
+    mf2_cache_size: int = 256
+
+    token_cache_ttl: float = 300.0
+    token_cache_size: int = 1024
+
+    # Retries with the same Idempotency-Key, or the same body from the same client, within this many seconds
+    # get the original response back. 0 disables idempotency.
+    idempotency_window: float = 600.0
+
+    # Most operations accepted in one {"action": "batch"} request
+    max_batch_operations: int = 100
+
+    mf2_to_replace : Dict = {
+        "name": "title",
+        "category": "tags",
+        "mp-syndicate-to": "syndicate_to",
+        "syndicate-to": "syndicate_to",
+        "value": "url"
+    }
+
+
+    # Load env vars from .env and syndication endpoints from syndicate-to.json
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        json_file="syndicate-to.json",
+        populate_by_name=True,
+    )
+
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls: Type[BaseSettings],
+        init_settings: PydanticBaseSettingsSource,
+        env_settings: PydanticBaseSettingsSource,
+        dotenv_settings: PydanticBaseSettingsSource,
+        file_secret_settings: PydanticBaseSettingsSource,
+    ) -> Tuple[PydanticBaseSettingsSource, ...]:
+        return (
+            init_settings,
+            env_settings,
+            dotenv_settings,
+            file_secret_settings,
+            JsonConfigSettingsSource(settings_cls),
+        )
+    
+class ProfilingSettings(BaseSettings):
+    # Process-wide, read from INDIECOURIER_* environment variables
+    admin_token: str | None = None  # enables on-demand profiling via X-Profile / ?profile=
+    profile_dir: str = ".indiecourier/profiles"
+    profile_interval: float = 0.001  # seconds between samples for on-demand sampling profiles
+    continuous_profile_interval: float = 0.0  # seconds between samples for continuous profiling; 0 disables
+    continuous_profile_flush: float = 60.0
+    server_timing: bool = True
+
+    model_config = SettingsConfigDict(env_prefix="INDIECOURIER_")
+
+
+class RequestLimits(BaseSettings):
+    # Process-wide, read from INDIECOURIER_* environment variables. Micropub bodies are checked against these
+    # while they arrive: too large is 413, too many fields or too deeply nested is 400.
+    max_json_body: int = 1024 * 1024
+    max_form_body: int = 1024 * 1024
+    max_multipart_body: int = 100 * 1024 * 1024
+    max_fields: int = 1000
+    max_files: int = 20
+    max_depth: int = 32
+
+    model_config = SettingsConfigDict(env_prefix="INDIECOURIER_")
+
+
+class MicropubConfigResponse(BaseModel):
+    me: HttpUrl | None = None
+    token_endpoint: HttpUrl | None = Field(None, alias="token-endpoint")
+    media_endpoint: HttpUrl | None = Field(None, alias="media-endpoint")
+    syndicate_to: List[SyndicationEndpoint] | None = Field(None, alias="syndicate-to")
+    categories: List[str] | None = None
+
+    model_config = {
+        "populate_by_name": True,
+    }
+
+
+class GithubFileResponse(BaseModel):
+    class ContentFile(BaseModel):
+        path: str
+    class Commit(BaseModel):
+        sha: str
+
+    content: ContentFile
+    commit: Commit
+
+class Attachment(BaseModel):
+    # A file sent with a multipart/form-data create
+    property: Literal["photo", "video", "audio"]
+    filename: str
+    content_type: str | None = None
+    sha256: str
+    content: bytes = Field(exclude=True, repr=False)
+
+
+class MicropubRequest(BaseModel):
+    type: List[str]
+    properties: Dict[str, List[str | Dict]]
+    attachments: List[Attachment] = Field(default_factory=list)
+
+class MicropubActionRequest(BaseModel):
+    action: Literal["update", "delete", "undelete"]
+    url: HttpUrl
+    add: Dict[str, List[str | Dict]] | None = None
+    replace: Dict[str, List[str | Dict]] | None = None
+    delete: Dict[str, List[str | Dict]] | List[str] | None = None
+
+class MicropubBatchRequest(BaseModel):
+    # Several actions on (possibly) several posts, written as one commit
+    action: Literal["batch"]
+    operations: List[MicropubActionRequest] = Field(..., min_length=1)
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int | None = Field(None, ge=0)
+
+
+class UploadSession(BaseModel):
+    id: str
+    owner: str
+    filename: str
+    length: int | None = None
+    offset: int = 0
+    created: float
+    expires: float
@@ -0,0 +1,396 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from functools import partial
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+from fastapi import HTTPException, Request
+from github import Auth, Github
+
+from .admission import AdmissionController, Priority
+from .breakers import CircuitBreaker, CircuitOpen, github_failure, unavailable
+from .cache import TTLCache
+from .idempotency import IdempotencyStore, token_identity
+from .indexes import MediaIndex, PathIndex, TagIndex, post_directories
+from .pages import PageCache
+from .profiling import profiling_deterministically, stage
+from .ratelimit import RateLimiter
+from .slugs import SlugAllocator
+from .snapshots import Snapshot, Tree, TreeEntry, catch_up, head_commit, write_snapshot
+from .state import PathLocks, SharedCache, SharedState
+from .tokens import KeySet
+from .uploads import UploadStore
+from .schemas import Config
+
+SITES_FILE = Path(os.environ.get("INDIECOURIER_SITES_FILE", "sites.json"))
+
+logger = logging.getLogger(__name__)
+
+
+class SharedResources:
+    # Connection pool and worker threads shared by every site served by this process
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers
+        self._http_client: Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient] | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def http_client(self) -> httpx.AsyncClient:
+        # httpx pools are bound to the loop they were first used on
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_client[0] is not loop or self._http_client[1].is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                follow_redirects=True,
+            )
+            self._http_client = (loop, client)
+        return self._http_client[1]
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="indiecourier")
+            return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        # Run blocking work (PyGithub, YAML) off the event loop, keeping context variables
+        if profiling_deterministically():
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        context = copy_context()
+        return await loop.run_in_executor(self.executor, partial(context.run, func, *args, **kwargs))
+
+    async def aclose(self) -> None:
+        if self._http_client is not None:
+            await self._http_client[1].aclose()
+            self._http_client = None
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+shared = SharedResources(int(os.environ.get("INDIECOURIER_WORKER_THREADS", 0)) or None)
+
+
+def site_key(config: Config) -> Tuple[str, str, str]:
+    return (str(config.me), str(config.site_url), config.github_repo)
+
+
+def site_id(config: Config) -> str:
+    # Opaque name for the site in state_dir, /readyz and metric labels, which do not reveal its URL or repository
+    return hashlib.sha256(repr(site_key(config)).encode("utf-8")).hexdigest()[:16]
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def breaker_settings(config: Config) -> Tuple[float, float, int, int, float]:
+    return (
+        config.breaker_failure_rate,
+        config.breaker_slow_call,
+        config.breaker_window,
+        config.breaker_min_calls,
+        config.breaker_open_seconds,
+    )
+
+
+def rate_settings(config: Config) -> Tuple[Dict[Priority, Tuple[float, float]], float]:
+    rates = {"read": (config.read_rate_limit, config.read_burst), "write": (config.write_rate_limit, config.write_burst)}
+    return rates, config.client_rate_factor
+
+
+class Site:
+    # Per-site state: config, GitHub client and repository handle, token cache, idempotency records, locks, indexes
+    def __init__(self, config: Config):
+        self.config = config
+        self.state = SharedState(self.state_path / "shared.sqlite3") if config.shared_state else None
+        if self.state is not None:
+            self.token_cache = SharedCache(self.state, "tokens", config.token_cache_ttl, config.token_cache_size)
+            self.stale_tokens = SharedCache(self.state, "stale-tokens", config.token_stale_ttl, config.token_cache_size)
+        else:
+            self.token_cache = TTLCache(ttl=config.token_cache_ttl, maxsize=config.token_cache_size)
+            self.stale_tokens = TTLCache(ttl=config.token_stale_ttl, maxsize=config.token_cache_size)
+        self.keys = KeySet(shared, config.jwks_refresh_interval)
+        self.idempotency = IdempotencyStore(window=config.idempotency_window, shared=self.state, run=shared.run)
+        self.locks = PathLocks(self.state, config.lock_lease, config.lock_timeout)
+        self.pages = PageCache(shared, config.mf2_cache_ttl, config.mf2_cache_size)
+        self.paths = PathIndex()
+        self.tags = TagIndex(self.state_path / "tags.json")
+        self.media = MediaIndex(self.state_path / "media.log")
+        self.slugs = SlugAllocator(self.paths, self.state_path / "reservations")
+        self.uploads = UploadStore(self.state_path / "uploads", config.upload_session_ttl, config.max_upload_size)
+        self.admission = AdmissionController(
+            site_id(config), config.max_concurrent_writes, config.write_queue_size, config.write_queue_timeout
+        )
+        self.token_breaker = CircuitBreaker(site_id(config), "token_endpoint", *breaker_settings(config))
+        self.github_breaker = CircuitBreaker(site_id(config), "github", *breaker_settings(config))
+        self.rate_limiter = RateLimiter(site_id(config), *rate_settings(config))
+        self._github: Github | None = None
+        self._repo: Tuple[Github, Any] | None = None
+        self._derived: Dict[str, Tuple[Config, Any]] = {}
+        self._lock = Lock()
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return site_key(self.config)
+
+    @property
+    def id(self) -> str:
+        return site_id(self.config)
+
+    @property
+    def state_path(self) -> Path:
+        return Path(self.config.state_dir) / self.id
+
+    async def run_state(self, func: Callable, *args, **kwargs) -> Any:
+        # Token caches in SQLite can wait up to its busy timeout for other workers, so from async code they are
+        # used on the executor; the in-memory caches are called in place
+        if self.state is None:
+            return func(*args, **kwargs)
+        return await shared.run(func, *args, **kwargs)
+
+    def load_indexes(self, repo) -> str:
+        # Paths, tags and media from the snapshot of the last load and the commits since, or failing that from
+        # the full tree. When the branch has moved, the new listing is saved as the next snapshot. Returns where
+        # the listing came from.
+        head = head_commit(repo)
+        path = self.state_path / "indexes.snapshot"
+        snapshot = Snapshot.open(path)
+        entries = None
+        if snapshot is not None and snapshot.commit == head:
+            source = "snapshot"
+        else:
+            if snapshot is not None:
+                with snapshot:
+                    entries = catch_up(repo, snapshot, head)
+            source = "compare"
+            if entries is None:
+                with stage("github"):
+                    tree = repo.get_git_tree(head, recursive=True)
+                entries = [TreeEntry(item.path, item.sha, item.size) for item in tree.tree if item.type == "blob"]
+                source = "tree"
+            try:
+                write_snapshot(path, head, entries)
+            except OSError as e:
+                logger.warning("Could not save index snapshot %s: %s", path, e)
+            snapshot = Snapshot.open(path)
+
+        if snapshot is not None and snapshot.commit == head:
+            # Paths are looked up in the mapped file; tags and media read only the runs of it under their
+            # directories rather than copying the whole listing
+            self.paths.use_snapshot(snapshot)
+            directories = post_directories(self.config)
+            posts = Tree(list({entry.path: entry for d in directories for entry in snapshot.under(d)}.values()))
+            media = Tree(list(snapshot.under(self.config.media_dir.strip("/") + "/")))
+        else:
+            if snapshot is not None:
+                snapshot.close()
+            self.paths.update(entry.path for entry in entries)
+            posts = media = Tree(entries)
+        self.tags.load(repo, self.config, posts)
+        self.media.load(repo, self.config, media)
+        return source
+
+    def update_config(self, config: Config) -> None:
+        # Swap in a reloaded config. Requests already running keep the Config object they started with.
+        with self._lock:
+            old, self.config = self.config, config
+            if (old.github_token, old.github_api_url) != (config.github_token, config.github_api_url):
+                self._github = None
+                self._repo = None
+            self._derived = {}
+        self.token_cache.ttl = config.token_cache_ttl
+        self.token_cache.maxsize = config.token_cache_size
+        self.keys.refresh_interval = config.jwks_refresh_interval
+        self.idempotency.window = config.idempotency_window
+        self.locks.lease = config.lock_lease
+        self.locks.timeout = config.lock_timeout
+        self.pages.ttl = config.mf2_cache_ttl
+        self.pages.maxsize = config.mf2_cache_size
+        self.uploads.ttl = config.upload_session_ttl
+        self.uploads.max_size = config.max_upload_size
+        self.admission.resize(config.max_concurrent_writes, config.write_queue_size, config.write_queue_timeout)
+        self.stale_tokens.ttl = config.token_stale_ttl
+        self.stale_tokens.maxsize = config.token_cache_size
+        self.token_breaker.configure(*breaker_settings(config))
+        self.github_breaker.configure(*breaker_settings(config))
+        self.rate_limiter.configure(*rate_settings(config))
+
+    def check_rate(self, priority: Priority, token_data: Dict, cost: int = 1) -> None:
+        # 429 when the token (or its client) is over its rate limit
+        self.rate_limiter.check(priority, token_identity(token_data), token_data.get("client_id"), cost)
+
+    @asynccontextmanager
+    async def github_slot(self, priority: Priority = "write", token_data: Dict | None = None):
+        # An admission slot for GitHub-bound work. Refused at once when the token is over its rate limit or
+        # GitHub's breaker is open, before queueing. The breaker times the GitHub calls themselves (run_github),
+        # not the slot.
+        if token_data is not None:
+            self.check_rate(priority, token_data)
+        try:
+            self.github_breaker.reject_if_open()
+        except CircuitOpen as e:
+            raise unavailable(e)
+        async with self.admission.slot(priority):
+            yield
+
+    async def run_github(self, func: Callable, *args, **kwargs) -> Any:
+        # Work that calls the GitHub API, on the executor, timed and classified by GitHub's breaker. Page
+        # fetches, downloads and local parsing around it are run apart, so they never count as slow GitHub calls.
+        try:
+            with self.github_breaker.call(github_failure):
+                return await shared.run(func, *args, **kwargs)
+        except CircuitOpen as e:
+            raise unavailable(e)
+
+    def derived(self, name: str, config: Config, factory: Callable[[Config], Any]) -> Any:
+        # Values computed from a config (responses, compiled templates), rebuilt when the config changes
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] is config:
+            return cached[1]
+        value = factory(config)
+        self._derived[name] = (config, value)
+        return value
+
+    def github(self) -> Github:
+        with self._lock:
+            if self._github is None:
+                self._github = Github(base_url=self.config.github_api_url, auth=Auth.Token(self.config.github_token))
+            return self._github
+
+    def repo(self, github: Github):
+        with self._lock:
+            if self._repo is not None and self._repo[0] is github:
+                return self._repo[1]
+        with stage("github"):
+            repo = github.get_user().get_repo(self.config.github_repo)
+        with self._lock:
+            self._repo = (github, repo)
+        return repo
+
+
+class SiteRegistry:
+    # Sites are listed in sites.json; without it the process serves a single site from .env
+    def __init__(self, path: Path = SITES_FILE):
+        self.path = path
+        self._sites: List[Site] | None = None
+        self._multi_site: bool | None = None
+        self._by_key: Dict[Tuple[str, str, str], Site] = {}
+        self._lock = Lock()
+
+    @property
+    def multi_site(self) -> bool:
+        if self._multi_site is None:
+            self._multi_site = self.path.exists()
+        return self._multi_site
+
+    def _load_configs(self) -> List[Config]:
+        if self.path.exists():
+            entries = json.loads(self.path.read_text()).get("sites", [])
+            return [Config(**entry) for entry in entries]
+        return [Config()]
+
+    def sites(self) -> List[Site]:
+        with self._lock:
+            if self._sites is None:
+                configs = self._load_configs()
+                self._sites = [self._by_key.setdefault(site_key(config), Site(config)) for config in configs]
+            return self._sites
+
+    def reload(self) -> List[Site]:
+        # Validate everything first: a bad edit leaves the running configs untouched
+        configs = self._load_configs()
+        multi_site = self.path.exists()
+        with self._lock:
+            sites = []
+            for config in configs:
+                site = self._by_key.get(site_key(config))
+                if site is None:
+                    site = self._by_key[site_key(config)] = Site(config)
+                else:
+                    site.update_config(config)
+                sites.append(site)
+            self._sites, self._multi_site = sites, multi_site
+        return sites
+
+    def prefixes(self) -> List[str]:
+        if not self.multi_site:
+            return []
+        prefixes = [site.config.path_prefix.rstrip("/") for site in self.sites() if site.config.path_prefix]
+        return sorted(prefixes, key=len, reverse=True)
+
+    def for_config(self, config: Config) -> Site:
+        key = site_key(config)
+        with self._lock:
+            site = self._by_key.get(key)
+            if site is None:
+                # Configs that did not come from the registry (e.g. dependency overrides) get their own state
+                site = self._by_key[key] = Site(config)
+            return site
+
+    def resolve(self, request: Request) -> Site:
+        sites = self.sites()
+        if len(sites) == 1:
+            return sites[0]
+
+        prefix = getattr(request.state, "site_prefix", None)
+        if prefix:
+            for site in sites:
+                if site.config.path_prefix and site.config.path_prefix.rstrip("/") == prefix:
+                    return site
+
+        me = request.query_params.get("me")
+        if me:
+            for site in sites:
+                if str(site.config.me).rstrip("/") == me.rstrip("/"):
+                    return site
+
+        host = request.url.hostname
+        for site in sites:
+            if site.config.host and site.config.host == host:
+                return site
+
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "unknown_site", "error_description": "No site is configured for this request"},
+        )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sites = None
+            self._multi_site = None
+            self._by_key = {}
+
+
+registry = SiteRegistry()
+
+
+class SitePrefixMiddleware:
+    # Route /{prefix}/micropub to /micropub, remembering the prefix for site resolution
+    def __init__(self, app, registry: SiteRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            root_path = scope.get("root_path", "")
+            path = scope["path"][len(root_path):] if scope["path"].startswith(root_path) else scope["path"]
+            for prefix in self.registry.prefixes():
+                if path == prefix or path.startswith(prefix + "/"):
+                    scope = dict(scope)
+                    scope["root_path"] = root_path + prefix
+                    scope["state"] = {**scope.get("state", {}), "site_prefix": prefix}
+                    break
+        await self.app(scope, receive, send)
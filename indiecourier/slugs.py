@@ -0,0 +1,92 @@
+import hashlib
+import os
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from threading import Lock
+from time import monotonic, time
+from typing import Callable, Tuple
+
+from .indexes import PathIndex
+
+
+def note_slug(now: float, dt: datetime, scheme: str) -> str:
+    if scheme == "timestamp_ms":
+        return str(int(now * 1000))
+    elif scheme == "sequence":
+        # Allocated with a numeric suffix: 20260226-1, 20260226-2, ...
+        return f"{dt:%Y%m%d}"
+    return str(int(now))
+
+
+class SlugAllocator:
+    # Picks the first free slug (slug, slug-2, slug-3, ...) according to the local path index.
+    # Chosen paths are reserved with O_EXCL marker files so concurrent threads and worker
+    # processes sharing the state directory never hand out the same path twice. Expired markers are
+    # swept by allocate, at most once per sweep_interval.
+    def __init__(
+        self, paths: PathIndex, reservations_dir: Path, reservation_ttl: float = 86400.0, sweep_interval: float = 3600.0
+    ):
+        self.paths = paths
+        self.reservations_dir = reservations_dir
+        self.reservation_ttl = reservation_ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._lock = Lock()
+
+    def allocate(
+        self, repo, base_slug: str, path_for: Callable[[str], str], always_suffix: bool = False
+    ) -> Tuple[str, str]:
+        self.paths.ensure_loaded(repo)
+        self.reservations_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if monotonic() >= self._next_sweep:
+                self._next_sweep = monotonic() + self.sweep_interval
+                self.sweep()
+            for n in count(1):
+                if n == 1 and not always_suffix:
+                    slug = base_slug
+                elif n == 1:
+                    slug = f"{base_slug}-1"
+                else:
+                    slug = f"{base_slug}-{n}"
+                path = path_for(slug)
+                if path not in self.paths and self._reserve(path):
+                    return slug, path
+
+    def release(self, path: str) -> None:
+        self._marker(path).unlink(missing_ok=True)
+
+    def sweep(self) -> None:
+        if not self.reservations_dir.exists():
+            return
+        cutoff = time() - self.reservation_ttl
+        for marker in self.reservations_dir.iterdir():
+            try:
+                if marker.stat().st_mtime < cutoff:
+                    marker.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+
+    def _marker(self, path: str) -> Path:
+        return self.reservations_dir / hashlib.sha256(path.encode("utf-8")).hexdigest()
+
+    def _reserve(self, path: str) -> bool:
+        marker = self._marker(path)
+        for _ in range(2):
+            try:
+                fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                # Reservations outlive the request so other workers, whose path index has not seen
+                # the new file, keep skipping it; stale ones are reclaimed after reservation_ttl
+                try:
+                    if marker.stat().st_mtime >= time() - self.reservation_ttl:
+                        return False
+                except FileNotFoundError:
+                    continue
+                marker.unlink(missing_ok=True)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(path)
+            return True
+        return False
@@ -0,0 +1,167 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple
+
+from github import GithubException
+
+from .profiling import stage
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, version, entry count, commit sha. Then one record per file, sorted by path: offset and length
+# of the path and of its blob sha in the string heap that follows, and the file size (-1 when unknown).
+MAGIC = b"ICSNAPSH"
+VERSION = 1
+HEADER = struct.Struct("<8sII40s")
+RECORD = struct.Struct("<IIIIq")
+
+# GitHub lists at most this many files in a comparison; with more we cannot tell what changed
+MAX_COMPARE_FILES = 300
+
+
+class TreeEntry(NamedTuple):
+    # The parts of a git tree entry the indexes read
+    path: str
+    sha: str
+    size: int | None
+    type: str = "blob"
+
+
+class Tree(NamedTuple):
+    tree: List[TreeEntry]
+
+
+class Snapshot:
+    # The repository's file listing at one commit, read straight from a memory-mapped file. Every worker on the
+    # host maps the same file, so the pages are shared; lookups are a binary search over the records.
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, commit = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or len(self._map) < HEADER.size + self._count * RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is not an index snapshot")
+        self.commit = commit.decode("ascii")
+        self._heap = HEADER.size + self._count * RECORD.size
+
+    @classmethod
+    def open(cls, path: Path) -> "Snapshot | None":
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Ignoring index snapshot %s: %s", path, e)
+            return None
+
+    def close(self) -> None:
+        # Unmaps the file; a worker reloading its indexes closes the snapshot it replaces
+        self._map.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._heap + offset
+        return self._map[start : start + length]
+
+    def _record(self, i: int) -> Tuple[int, int, int, int, int]:
+        return RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _path(self, i: int) -> bytes:
+        path_offset, path_length, _, _, _ = self._record(i)
+        return self._string(path_offset, path_length)
+
+    def _entry(self, i: int) -> TreeEntry:
+        path_offset, path_length, sha_offset, sha_length, size = self._record(i)
+        return TreeEntry(
+            self._string(path_offset, path_length).decode("utf-8"),
+            self._string(sha_offset, sha_length).decode("ascii"),
+            None if size < 0 else size,
+        )
+
+    def _lower_bound(self, target: bytes) -> int:
+        # The first record whose path is not before `target`
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._path(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, path: str) -> bool:
+        target = path.encode("utf-8")
+        i = self._lower_bound(target)
+        return i < self._count and self._path(i) == target
+
+    def __iter__(self) -> Iterator[TreeEntry]:
+        for i in range(self._count):
+            yield self._entry(i)
+
+    def under(self, prefix: str) -> Iterator[TreeEntry]:
+        # Entries whose path starts with `prefix` (e.g. "_notes/"): one contiguous run of the sorted records,
+        # so only those are read from the map
+        target = prefix.encode("utf-8")
+        for i in range(self._lower_bound(target), self._count):
+            if not self._path(i).startswith(target):
+                return
+            yield self._entry(i)
+
+
+def write_snapshot(path: Path, commit: str, entries: List[TreeEntry]) -> None:
+    # Written to a temporary file and renamed: workers that mapped the old file keep reading it undisturbed
+    entries = sorted(entries, key=lambda entry: entry.path.encode("utf-8"))
+    records, heap, offset = [], [], 0
+    for entry in entries:
+        path_bytes, sha_bytes = entry.path.encode("utf-8"), entry.sha.encode("ascii")
+        size = -1 if entry.size is None else entry.size
+        records.append(RECORD.pack(offset, len(path_bytes), offset + len(path_bytes), len(sha_bytes), size))
+        heap += [path_bytes, sha_bytes]
+        offset += len(path_bytes) + len(sha_bytes)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), commit.encode("ascii")))
+        f.write(b"".join(records))
+        f.write(b"".join(heap))
+    os.replace(temporary, path)
+
+
+def head_commit(repo) -> str:
+    with stage("github"):
+        return repo.get_git_ref(f"heads/{repo.default_branch}").object.sha
+
+
+def catch_up(repo, snapshot: Snapshot, head: str) -> List[TreeEntry] | None:
+    # The listing at `head`: the snapshot's, with the changes of the commits since applied. None when the
+    # comparison cannot tell (history rewritten, or too many files changed).
+    try:
+        with stage("github"):
+            comparison = repo.compare(snapshot.commit, head)
+            files = list(comparison.files)
+    except GithubException as e:
+        logger.info("Cannot compare snapshot commit %s with %s: %s", snapshot.commit, head, e)
+        return None
+    if comparison.status != "ahead" or len(files) >= MAX_COMPARE_FILES:
+        return None
+    entries = {entry.path: entry for entry in snapshot}
+    for file in files:
+        if file.status == "renamed" and file.previous_filename:
+            entries.pop(file.previous_filename, None)
+        if file.status == "removed":
+            entries.pop(file.filename, None)
+        else:
+            # The comparison gives the new blob sha but not the size
+            entries[file.filename] = TreeEntry(file.filename, file.sha, None)
+    return list(entries.values())
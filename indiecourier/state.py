@@ -0,0 +1,233 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Any, Dict, Hashable, Tuple
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (namespace, expires);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SharedState:
+    # A SQLite database in WAL mode that every worker process on this host opens: expiring key/value entries
+    # (token cache, idempotency results) and leases (locks that free themselves if their holder dies).
+    # Times are wall-clock since they are compared across processes. Calls can wait up to busy_timeout for
+    # other workers, so async code makes them from the executor.
+    def __init__(self, path: Path, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        # Leases this process holds: name -> (owner, lease, renew at)
+        self._held: Dict[str, Tuple[str, float, float]] = {}
+        self._held_lock = Lock()
+        self._renewer: threading.Thread | None = None
+        self._wake = threading.Event()
+
+    def connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so check-then-set is atomic across processes
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, namespace: str, key: str) -> Any:
+        row = self.connect().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires > ?", (namespace, key, time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        self.connect().execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time() + ttl),
+        )
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.connect().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str) -> None:
+        self.connect().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def purge(self, namespace: str, maxsize: int) -> None:
+        # Drop expired entries, then the ones closest to expiry beyond maxsize
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND expires <= ?", (namespace, time()))
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN "
+                "(SELECT key FROM entries WHERE namespace = ? ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, maxsize),
+            )
+
+    def acquire(self, name: str, owner: str, lease: float) -> bool:
+        now = time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)", (name, owner, now + lease))
+        if lease > 0:
+            self._renew_while_held(name, owner, lease)
+        return True
+
+    def release(self, name: str, owner: str) -> None:
+        with self._held_lock:
+            if self._held.get(name, ("",))[0] == owner:
+                del self._held[name]
+        self.connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def _renew_while_held(self, name: str, owner: str, lease: float) -> None:
+        # A request may hold a lease longer than the lease itself (a long write queue, slow GitHub calls), so it
+        # is extended every third of its length until released. Only a dead process lets its leases run out.
+        with self._held_lock:
+            self._held[name] = (owner, lease, time() + lease / 3)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew, name="indiecourier-leases", daemon=True)
+                self._renewer.start()
+        self._wake.set()
+
+    def _renew(self) -> None:
+        while True:
+            with self._held_lock:
+                if not self._held:
+                    self._renewer = None
+                    return
+                wait = min(renew_at for _, _, renew_at in self._held.values()) - time()
+            if wait > 0 and self._wake.wait(wait):
+                self._wake.clear()
+                continue
+            now = time()
+            with self._held_lock:
+                due = [(name, owner, lease) for name, (owner, lease, renew_at) in self._held.items() if renew_at <= now]
+                for name, owner, lease in due:
+                    self._held[name] = (owner, lease, now + lease / 3)
+            for name, owner, lease in due:
+                try:
+                    renewed = self.connect().execute(
+                        "UPDATE leases SET expires = ? WHERE name = ? AND owner = ?", (now + lease, name, owner)
+                    ).rowcount
+                except sqlite3.Error as e:
+                    logger.warning("Could not renew lease %s: %s", name, e)
+                    continue
+                if not renewed:
+                    # Released meanwhile, or expired and taken by another worker: nothing left to keep
+                    with self._held_lock:
+                        if self._held.get(name, ("",))[0] == owner:
+                            del self._held[name]
+
+
+class SharedCache:
+    # The TTLCache interface over one namespace of a SharedState
+    PURGE_EVERY = 64
+
+    def __init__(self, state: SharedState, namespace: str, ttl: float, maxsize: int = 1024):
+        self.state = state
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._writes = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.state.get(self.namespace, str(key))
+        return default if value is None else value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        self.state.set(self.namespace, str(key), value, self.ttl if ttl is None else ttl)
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.state.purge(self.namespace, self.maxsize)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self.get(key, default)
+        self.state.delete(self.namespace, str(key))
+        return value
+
+    def clear(self) -> None:
+        self.state.clear(self.namespace)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+
+class PathLocks:
+    # Advisory per-path locks around read-modify-write edits of a post. With a SharedState they are held across
+    # worker processes as leases, renewed while held and expiring after `lease` seconds only if the holder dies;
+    # without one they only cover this process and are held until released, however long the edit takes.
+    # Waiting longer than `timeout` is answered with 503.
+    def __init__(self, state: SharedState | None, lease: float, timeout: float):
+        self.state = state
+        self.lease = lease
+        self.timeout = timeout
+        self._held: Dict[str, str] = {}
+        self._lock = Lock()
+
+    def _acquire(self, path: str, owner: str) -> bool:
+        if self.state is not None:
+            return self.state.acquire(f"path:{path}", owner, self.lease)
+        with self._lock:
+            return self._held.setdefault(path, owner) == owner
+
+    def _release(self, path: str, owner: str) -> None:
+        if self.state is not None:
+            self.state.release(f"path:{path}", owner)
+            return
+        with self._lock:
+            if self._held.get(path) == owner:
+                del self._held[path]
+
+    @contextmanager
+    def hold(self, path: str):
+        owner = uuid.uuid4().hex
+        deadline = monotonic() + self.timeout
+        delay = 0.005
+        while not self._acquire(path, owner):
+            if monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=503,
+                    detail={"error": "temporarily_unavailable", "error_description": f"{path} is being edited, please retry"},
+                    headers={"Retry-After": "1"},
+                )
+            sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self._release(path, owner)
@@ -0,0 +1,103 @@
+import logging
+from time import monotonic, time
+from typing import Any, Dict, Tuple
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from jwt.exceptions import PyJWTError
+
+from .schemas import Config
+
+logger = logging.getLogger(__name__)
+
+# Seconds of clock skew tolerated on exp/nbf/iat
+LEEWAY = 30.0
+
+
+class KeysUnavailable(Exception):
+    # No verification key could be loaded; the token should be introspected instead
+    pass
+
+
+def looks_like_jwt(token: str) -> bool:
+    if token.count(".") != 2:
+        return False
+    try:
+        jwt.get_unverified_header(token)
+        return True
+    except PyJWTError:
+        return False
+
+
+def verification_enabled(config: Config) -> bool:
+    return bool(config.jwks_url or config.token_public_key)
+
+
+def token_expiry(token_data: Dict) -> float | None:
+    # Seconds until the token's exp, if it has one
+    exp = token_data.get("exp")
+    return float(exp) - time() if isinstance(exp, (int, float)) else None
+
+
+class KeySet:
+    # Keys for verifying JWT access tokens locally: a configured PEM key, or the issuer's JWKS, refetched every
+    # refresh_interval seconds and also when a token names a key we have not seen (at most every min_refresh seconds)
+    def __init__(self, resources, refresh_interval: float, min_refresh: float = 60.0):
+        # resources: the process's SharedResources (connection pool)
+        self.resources = resources
+        self.refresh_interval = refresh_interval
+        self.min_refresh = min_refresh
+        self._url: str | None = None
+        self._keys: Dict[str | None, jwt.PyJWK] = {}
+        self._fetched = float("-inf")
+        self._pem: Tuple[str, Any] | None = None
+
+    async def fetch(self, url: str) -> Dict:
+        response = await self.resources.http_client().get(url, headers={"Accept": "application/json"})
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh(self, url: str) -> None:
+        keys = jwt.PyJWKSet.from_dict(await self.fetch(url)).keys
+        self._url, self._keys, self._fetched = url, {key.key_id: key for key in keys}, monotonic()
+
+    async def jwk(self, url: str, kid: str | None) -> jwt.PyJWK | None:
+        age = monotonic() - self._fetched
+        unknown = kid not in self._keys and not (kid is None and len(self._keys) == 1)
+        if url != self._url or age > self.refresh_interval or (unknown and age > self.min_refresh):
+            try:
+                await self.refresh(url)
+            except (httpx.HTTPError, ValueError, PyJWTError) as e:
+                if url != self._url or not self._keys:
+                    raise KeysUnavailable(str(e))
+                # Keep verifying with the keys we have until the JWKS is reachable again
+                logger.warning("Could not refresh JWKS from %s: %s", url, e)
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        return self._keys.get(kid)
+
+    def pem_key(self, pem: str) -> Any:
+        if self._pem is None or self._pem[0] != pem:
+            self._pem = (pem, load_pem_public_key(pem.encode("utf-8")))
+        return self._pem[1]
+
+    async def decode(self, token: str, config: Config) -> Dict | None:
+        # Claims of a token with a valid signature and exp, None otherwise
+        try:
+            if config.token_public_key:
+                key, algorithms = self.pem_key(config.token_public_key), config.token_algorithms
+            else:
+                jwk = await self.jwk(str(config.jwks_url), jwt.get_unverified_header(token).get("kid"))
+                if jwk is None:
+                    return None
+                key, algorithms = jwk.key, [alg for alg in config.token_algorithms if alg == jwk.algorithm_name]
+            return jwt.decode(
+                token,
+                key,
+                algorithms=algorithms,
+                leeway=LEEWAY,
+                options={"require": ["exp", "me", "scope"], "verify_aud": False},
+            )
+        except PyJWTError:
+            return None
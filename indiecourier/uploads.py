@@ -0,0 +1,132 @@
+import fcntl
+import json
+import os
+import re
+import uuid
+from pathlib import Path
+from time import time
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from .schemas import UploadSession
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# GitHub rejects larger files, so no session may grow past this whatever max_upload_size says
+GITHUB_MAX_FILE_SIZE = 100 * 1024 * 1024
+
+
+def upload_error(status_code: int, error: str, description: str) -> HTTPException:
+    return HTTPException(status_code=status_code, detail={"error": error, "error_description": description})
+
+
+class UploadStore:
+    # Resumable upload sessions kept on local disk: {id}.json holds the metadata, {id}.part the bytes so far.
+    # The size of the .part file is the session offset, so a dropped connection leaves a resumable prefix.
+    # While a session is being finalized its metadata is renamed to {id}.claimed, so it is committed once.
+    def __init__(self, directory: Path, ttl: float, max_size: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @property
+    def limit(self) -> int:
+        return min(self.max_size, GITHUB_MAX_FILE_SIZE)
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.json"
+
+    def _claimed_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.claimed"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.part"
+
+    def create(self, owner: str, filename: str, length: int | None) -> UploadSession:
+        if length is not None and length > self.limit:
+            raise upload_error(413, "too_large", f"Uploads are limited to {self.limit} bytes")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+        now = time()
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            owner=owner,
+            filename=Path(filename).name,
+            length=length,
+            created=now,
+            expires=now + self.ttl,
+        )
+        self.part_path(session.id).touch()
+        self._meta_path(session.id).write_text(session.model_dump_json())
+        return session
+
+    def get(self, upload_id: str, owner: str) -> UploadSession:
+        if not UPLOAD_ID.match(upload_id):
+            raise upload_error(404, "upload_not_found", "No such upload session")
+        try:
+            session = UploadSession.model_validate_json(self._meta_path(upload_id).read_text())
+            session.offset = self.part_path(upload_id).stat().st_size
+        except (FileNotFoundError, ValueError):
+            raise upload_error(404, "upload_not_found", "No such upload session")
+        if session.owner != owner or session.expires < time():
+            raise upload_error(404, "upload_not_found", "No such upload session")
+        return session
+
+    async def append(self, session: UploadSession, offset: int, chunks: AsyncIterator[bytes]) -> UploadSession:
+        limit = min(session.length, self.limit) if session.length is not None else self.limit
+        with open(self.part_path(session.id), "r+b") as f:
+            # One writer per session, across workers
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise upload_error(409, "upload_busy", "Another request is writing to this upload")
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise upload_error(409, "offset_mismatch", f"Upload-Offset must be {current}")
+            written = current
+            async for chunk in chunks:
+                if written + len(chunk) > limit:
+                    f.truncate(current)
+                    raise upload_error(413, "too_large", f"Upload would exceed {limit} bytes")
+                f.write(chunk)
+                written += len(chunk)
+        session.offset = written
+        # Activity extends the session
+        session.expires = time() + self.ttl
+        self._meta_path(session.id).write_text(session.model_dump_json(exclude={"offset"}))
+        return session
+
+    def read(self, session: UploadSession) -> bytes:
+        if session.length is not None and session.offset != session.length:
+            raise upload_error(400, "upload_incomplete", f"Received {session.offset} of {session.length} bytes")
+        return self.part_path(session.id).read_bytes()
+
+    def claim(self, session: UploadSession) -> None:
+        # Only one finalize commits the file: the others, in any worker, find the session gone
+        try:
+            os.rename(self._meta_path(session.id), self._claimed_path(session.id))
+        except FileNotFoundError:
+            raise upload_error(409, "upload_busy", "This upload is already being finalized")
+
+    def unclaim(self, session: UploadSession) -> None:
+        # Finalizing failed: the session can be resumed or finalized again
+        try:
+            os.rename(self._claimed_path(session.id), self._meta_path(session.id))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, upload_id: str) -> None:
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self._claimed_path(upload_id).unlink(missing_ok=True)
+        self.part_path(upload_id).unlink(missing_ok=True)
+
+    def sweep(self) -> None:
+        now = time()
+        for meta_path in [*self.directory.glob("*.json"), *self.directory.glob("*.claimed")]:
+            try:
+                expires = json.loads(meta_path.read_text())["expires"]
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if expires < now:
+                self.delete(meta_path.stem)
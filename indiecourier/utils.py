@@ -4,10 +4,12 @@ from urllib.parse import urlsplit
 import httpx
 from datetime import datetime
 import mf2py 
-from functools import lru_cache
 from typing import Dict, Tuple
 
-from schemas import Config
+from fastapi import Request
+
+from .schemas import Config
+from .sites import registry
 
 def is_url_equal(url1: str, url2: str) -> bool:
     components1 = urlsplit(url1)
@@ -18,9 +20,8 @@ def is_url_equal(url1: str, url2: str) -> bool:
         and components1.path.rstrip("/") == components2.path.rstrip("/")
     )
 
-@lru_cache
-def load_config():
-    return Config()
+def load_config(request: Request) -> Config:
+    return registry.resolve(request).config
 
 def replace_keys(obj, key_map: Dict[str, str]):
     # Recursively replace keys in a nested dictionary or list
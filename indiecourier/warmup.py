@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from time import perf_counter
+from typing import Dict
+
+import httpx
+
+from .sites import Site, SiteRegistry, shared
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    # Readiness of the process: every site has its connections, repository handle and indexes loaded
+    def __init__(self):
+        self.status = "pending"
+        self.error: str | None = None
+        self.sites: Dict[str, Dict] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def report(self) -> Dict:
+        return {"status": self.status, "error": self.error, "sites": self.sites}
+
+
+async def warm_up_site(site: Site) -> Dict[str, float]:
+    timings = {}
+
+    # Open pooled connections: TLS to the token endpoint now rather than on the first request
+    start = perf_counter()
+    try:
+        await shared.http_client().head(str(site.config.token_endpoint))
+    except httpx.HTTPError:
+        pass
+    timings["token_endpoint"] = perf_counter() - start
+
+    start = perf_counter()
+    repo = await shared.run(site.repo, site.github())
+    timings["repository"] = perf_counter() - start
+
+    start = perf_counter()
+    source = await shared.run(site.load_indexes, repo)
+    timings[f"indexes_from_{source}"] = perf_counter() - start
+    return timings
+
+
+async def warm_up(registry: SiteRegistry, state: WarmupState, retry_delay: float = 5.0, max_delay: float = 60.0) -> None:
+    # Sites are reported by their opaque id, so /readyz does not list every site's URL. Once the process is
+    # ready, warming up a site added by a config reload does not take it out of rotation.
+    delay = retry_delay
+    while True:
+        try:
+            sites = await shared.run(registry.sites)
+            state.sites = {site.id: state.sites[site.id] for site in sites if site.id in state.sites}
+            if not state.ready:
+                state.status = "warming"
+            for site in sites:
+                if state.sites.get(site.id, {}).get("status") == "ready":
+                    continue
+                state.sites[site.id] = {"status": "warming"}
+                timings = await warm_up_site(site)
+                state.sites[site.id] = {"status": "ready", "seconds": {stage: round(t, 3) for stage, t in timings.items()}}
+            state.status = "ready"
+            state.error = None
+            return
+        except Exception as e:
+            # Keep serving /healthz; readiness stays false until a retry succeeds
+            logger.exception("Warm-up failed, retrying in %.0fs", delay)
+            if not state.ready:
+                state.status = "failed"
+            state.error = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+class Warmer:
+    # Runs warm_up in the background. Starting it again while it runs queues one more pass, so the sites a
+    # config reload adds are warmed up as well; sites that are already ready are skipped.
+    def __init__(self, registry: SiteRegistry, state: WarmupState):
+        self.registry = registry
+        self.state = state
+        self._again = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._again = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._again:
+            self._again = False
+            await warm_up(self.registry, self.state)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
@@ -1,12 +1,19 @@
-from unittest.mock import AsyncMock, patch
+import base64
+import os
+import shutil
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from pydantic_settings import SettingsConfigDict
 
-from app import app
-from utils import load_config
-from schemas import Config
+from indiecourier.app import app, github_login
+from indiecourier.commits import blob_sha
+from indiecourier.utils import load_config
+from indiecourier.schemas import Config
+from indiecourier.sites import registry
 
 class FakeConfig(Config):
     model_config = SettingsConfigDict(
@@ -34,26 +41,71 @@ FAKE_CONFIG = FakeConfig(
     note_filepath_template="_notes/{slug}.md",
     note_url_template="{site_url}/notes/{date:%Y/%m/%d}/{slug}",
     timezone="UTC",
+    # Fixed per test run: this module is imported both as conftest and as tests.conftest, and each test's
+    # state must be removed whichever FAKE_CONFIG it used
+    state_dir=os.path.join(tempfile.gettempdir(), f"indiecourier-test-{os.getpid()}"),
 )
 
-FAKE_TOKEN_RESPONSE = """
-{
+FAKE_TOKEN_RESPONSE = {
     "me": "https://example.com",
-    "issued_by":"https://tokens.indieauth.com/token",
-    "client_id":"https://example.com/micropub/",
+    "issued_by": "https://tokens.indieauth.com/token",
+    "client_id": "https://example.com/micropub/",
     "issued_at": 173679503,
-    "scope":"create update delete",
-    "nonce": 173679503
+    "scope": "create update delete",
+    "nonce": 173679503,
 }
-"""
 
 @pytest.fixture
 def client():
     return TestClient(app)
 
+
+@pytest.fixture
+def mock_repo(request):
+    # The repository github_login hands out. A module that needs more of it parametrizes this fixture
+    # indirectly with the attributes to set, e.g. {"get_git_tree.return_value.tree": [...]}.
+    mock_repo = MagicMock()
+    mock_repo.create_file.return_value = {
+        "content": MagicMock(path="assets/images/notes/1234567890_abcd1234.jpg"),
+        "commit": MagicMock(sha="fake-sha"),
+    }
+    mock_repo.create_git_blob.side_effect = lambda content, encoding: MagicMock(sha=blob_sha(base64.b64decode(content)))
+    mock_repo.configure_mock(**getattr(request, "param", {}))
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+    return mock_repo
+
+
+def branch_files(mock_repo, files):
+    # Serve `files` (path -> blob sha) as the branch head, listed one directory at a time the way commits are
+    # checked before they are made. The recursive listing the indexes load stays empty: the files were
+    # committed elsewhere, after the indexes were built. Changes to `files` show in later listings.
+    mock_repo.get_git_commit.return_value.tree.sha = ""
+
+    def get_git_tree(sha, recursive=False):
+        if recursive:
+            return MagicMock(tree=[])
+        children = {}
+        for path, blob in files.items():
+            if not path.startswith(f"{sha}/" if sha else ""):
+                continue
+            name, slash, _ = path[len(sha) + bool(sha) :].partition("/")
+            children[name] = ("tree", f"{sha}/{name}".lstrip("/")) if slash else ("blob", blob)
+        return MagicMock(tree=[MagicMock(path=name, type=kind, sha=ref) for name, (kind, ref) in children.items()])
+
+    mock_repo.get_git_tree.side_effect = get_git_tree
+
+async def fake_page(self, url, headers):
+    # Published pages are never fetched in tests; those that need one patch fetch with their own page
+    return httpx.Response(200, html="<html></html>", request=httpx.Request("GET", url))
+
+
 @pytest.fixture(autouse=True)
 def mock_token():
-    with patch("auth.introspect_token", new=AsyncMock(return_value=FAKE_TOKEN_RESPONSE)):
+    with patch("indiecourier.auth.introspect_token", new=AsyncMock(return_value=FAKE_TOKEN_RESPONSE)), patch("indiecourier.pages.PageCache.fetch", new=fake_page):
         app.dependency_overrides[load_config] = lambda: FAKE_CONFIG
         yield  # tests run here
-        app.dependency_overrides.clear()  # teardown after each test
\ No newline at end of file
+        app.dependency_overrides.clear()  # teardown after each test
+        registry.reset()  # drop per-site caches (tokens, repository handles)
+        shutil.rmtree(FAKE_CONFIG.state_dir, ignore_errors=True)  # and local state such as slug reservations
\ No newline at end of file
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from indiecourier.admission import ADMISSION_REJECTED, AdmissionController
+from indiecourier.sites import registry
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub import FAKE_JSON
+
+
+def test_limit_bounds_concurrency():
+    admission = AdmissionController("test", limit=2, queue_size=10, queue_timeout=5)
+    running = peak = 0
+
+    async def work():
+        nonlocal running, peak
+        async with admission.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert admission.active == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    admission = AdmissionController("test", limit=1, queue_size=1, queue_timeout=5)
+
+    async def main():
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as e:
+            await admission.acquire()
+        admission.release()
+        await waiter
+        admission.release()
+        return e.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 503
+    assert error.detail["error"] == "temporarily_unavailable"
+    assert int(error.headers["Retry-After"]) >= 1
+    assert ADMISSION_REJECTED.value(site="test", priority="write", reason="queue_full") >= 1
+
+
+def test_queue_timeout():
+    admission = AdmissionController("test", limit=1, queue_size=5, queue_timeout=0.01)
+
+    async def main():
+        await admission.acquire()
+        with pytest.raises(HTTPException) as e:
+            await admission.acquire()
+        admission.release()
+        return e.value
+
+    assert asyncio.run(main()).status_code == 503
+    assert admission.queued == 0
+    assert admission.active == 0
+
+
+def test_reads_are_admitted_before_writes():
+    admission = AdmissionController("test", limit=1, queue_size=10, queue_timeout=5)
+    order = []
+
+    async def work(priority, name):
+        async with admission.slot(priority):
+            order.append(name)
+
+    async def main():
+        await admission.acquire()
+        tasks = [asyncio.create_task(work("write", "write")), asyncio.create_task(work("read", "read"))]
+        await asyncio.sleep(0)
+        admission.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["read", "write"]
+
+
+def test_raised_limit_admits_waiters():
+    admission = AdmissionController("test", limit=1, queue_size=10, queue_timeout=5)
+
+    async def main():
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        admission.resize(2, 10, 5)
+        await asyncio.wait_for(waiter, 1)
+        return admission.active
+
+    assert asyncio.run(main()) == 2
+
+
+def test_busy_site_returns_503(client, mock_repo):
+    registry.for_config(FAKE_CONFIG).admission.resize(0, 0, 5)
+
+    response = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert mock_repo.create_file.call_count == 0
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE indiecourier_admission_queue_depth gauge" in response.text
+    assert "indiecourier_admission_wait_seconds" in response.text
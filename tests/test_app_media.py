@@ -1,7 +1,7 @@
 from urllib.parse import urljoin
 from unittest.mock import MagicMock, patch
 
-from app import github_login, app
+from indiecourier.app import github_login, app
 from tests.conftest import FAKE_CONFIG
 
 FAKE_PATH = "assets/images/notes/1234567890_abcd1234.jpg"
@@ -20,7 +20,7 @@ def test_media_endpoint(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         response = client.post(
             "/media",
             files={"file": ("test.jpg", b"fake image data", "image/jpeg")},
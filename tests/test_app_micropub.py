@@ -5,9 +5,9 @@ from urllib.parse import urljoin
 from fastapi import Depends, FastAPI
 from fastapi.testclient import TestClient
 
-from app import parse_micropub_request, github_login, app
-from schemas import Config, MicropubRequest
-from schemas import MicropubRequest
+from indiecourier.app import parse_micropub_request, github_login, app
+from indiecourier.schemas import Config, MicropubRequest
+from indiecourier.schemas import MicropubRequest
 from tests.conftest import FAKE_CONFIG
 
 FAKE_FORM = {
@@ -67,7 +67,7 @@ def test_media_endpoint_form(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         response = client.post(
             "/micropub",
             data=FAKE_FORM,
@@ -87,7 +87,7 @@ def test_media_endpoint_json(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         response = client.post(
             "/micropub",
             json=FAKE_JSON,
@@ -7,9 +7,9 @@ from fastapi import Depends, FastAPI
 from fastapi.testclient import TestClient
 import mf2py
 
-from app import parse_micropub_request, github_login, app
-from schemas import Config, MicropubRequest
-from schemas import MicropubRequest
+from indiecourier.app import parse_micropub_request, github_login, app
+from indiecourier.schemas import Config, MicropubRequest
+from indiecourier.schemas import MicropubRequest
 from tests.conftest import FAKE_CONFIG
 
 FAKE_CONTENT = """---
@@ -61,7 +61,7 @@ def test_micropub_delete(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_article.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -74,7 +74,7 @@ def test_micropub_delete(client):
             )
         assert response.status_code == 204
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_note.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -99,7 +99,7 @@ def test_micropub_undelete(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_article.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -112,7 +112,7 @@ def test_micropub_undelete(client):
             )
         assert response.status_code == 204
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_note.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -149,7 +149,7 @@ def test_micropub_update_remove(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_article.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -162,7 +162,7 @@ def test_micropub_update_remove(client):
             )
         assert response.status_code == 204
     
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_note.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -202,7 +202,7 @@ def test_micropub_update_add(client):
 
     app.dependency_overrides[github_login] = lambda: mock_github
 
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_article.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -215,7 +215,7 @@ def test_micropub_update_add(client):
             )
         assert response.status_code == 204
     
-    with patch("app.github_login", return_value=mock_github):
+    with patch("indiecourier.app.github_login", return_value=mock_github):
         with open("tests/test_note.html") as f:
             mf2_parser = mf2py.parse(doc=f)
         with patch("mf2py.parse", return_value=mf2_parser):
@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock, patch
+
+import yaml
+
+from tests.conftest import FAKE_CONFIG, branch_files
+
+FAKE_FORM = {
+    "h": "entry",
+    "content": "Two photos",
+}
+
+
+def test_multipart_create_commits_once(client, mock_repo):
+    response = client.post(
+        "/micropub",
+        data=FAKE_FORM,
+        files=[
+            ("photo", ("one.jpg", b"first image", "image/jpeg")),
+            ("photo[]", ("two.png", b"second image data", "image/png")),
+        ],
+        headers={"Authorization": "Bearer fake_token"},
+    )
+    assert response.status_code == 202
+
+    assert mock_repo.create_git_blob.call_count == 2
+    mock_repo.create_file.assert_not_called()
+    mock_repo.create_git_tree.assert_called_once()
+    mock_repo.get_git_ref.return_value.edit.assert_called_once()
+
+    elements = mock_repo.create_git_tree.call_args.args[0]
+    paths = [element._InputGitTreeElement__path for element in elements]
+    assert paths[0].startswith("_notes/")
+    assert sorted(path.rsplit(".", 1)[1] for path in paths[1:]) == ["jpg", "png"]
+    assert all(path.startswith(f"{FAKE_CONFIG.media_dir}/") for path in paths[1:])
+
+    # The post references the uploaded files
+    post = elements[0]._InputGitTreeElement__content
+    frontmatter = yaml.safe_load(post.split("---")[1])
+    assert sorted(frontmatter["photo"]) == sorted(f"{str(FAKE_CONFIG.site_url)}{path}" for path in paths[1:])
+
+
+def test_multipart_create_does_not_overwrite_an_unseen_post(client, mock_repo):
+    # _notes/1772160815.md was committed elsewhere: the path index has not seen it, the branch has
+    branch_files(mock_repo, {"_notes/1772160815.md": "theirs"})
+    with patch("indiecourier.app.time", return_value=1772160815.5):
+        response = client.post(
+            "/micropub",
+            data=FAKE_FORM,
+            files=[("photo", ("one.jpg", b"first image", "image/jpeg"))],
+            headers={"Authorization": "Bearer fake_token"},
+        )
+    assert response.status_code == 202
+    assert response.headers["Location"].endswith("/1772160815-2")
+    mock_repo.create_git_tree.assert_called_once()
+    assert mock_repo.create_git_tree.call_args.args[0][0]._InputGitTreeElement__path == "_notes/1772160815-2.md"
+
+
+def test_multipart_rejects_other_files(client, mock_repo):
+    response = client.post(
+        "/micropub",
+        data=FAKE_FORM,
+        files=[("content", ("notes.txt", b"text", "text/plain"))],
+        headers={"Authorization": "Bearer fake_token"},
+    )
+    assert response.status_code == 400
+    mock_repo.create_git_blob.assert_not_called()
+
+
+def test_multipart_without_files(client, mock_repo):
+    mock_repo.create_file.return_value = {"content": MagicMock(path="_notes/1.md"), "commit": MagicMock(sha="sha")}
+    response = client.post(
+        "/micropub",
+        headers={"Authorization": "Bearer fake_token", "Content-Type": "multipart/form-data; boundary=x"},
+        content=b'--x\r\nContent-Disposition: form-data; name="content"\r\n\r\nJust text\r\n--x--\r\n',
+    )
+    assert response.status_code == 202
+    mock_repo.create_file.assert_called_once()
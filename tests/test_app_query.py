@@ -1,6 +1,6 @@
 from urllib.parse import urljoin
 
-from schemas import MicropubConfigResponse
+from indiecourier.schemas import MicropubConfigResponse
 from tests.conftest import FAKE_CONFIG
 
 FAKE_CONFIG_RESPONSE = MicropubConfigResponse(
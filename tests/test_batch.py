@@ -0,0 +1,149 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import yaml
+from github import GithubException
+
+from indiecourier.app import app
+from indiecourier.sites import registry
+from tests.conftest import FAKE_CONFIG, branch_files
+from tests.test_app_micropub_action import FAKE_CONTENT, FAKE_CONTENT_DELETED
+from indiecourier.utils import load_config
+
+HEADERS = {"Authorization": "Bearer fake_token"}
+SITE_URL = str(FAKE_CONFIG.site_url).rstrip("/")
+
+
+def note_url(slug: str) -> str:
+    return f"{SITE_URL}/notes/2024/06/01/{slug}"
+
+
+FILES = {"_notes/1.md": FAKE_CONTENT, "_notes/2.md": FAKE_CONTENT, "_notes/3.md": FAKE_CONTENT_DELETED}
+
+
+def get_contents(path):
+    if path not in FILES:
+        raise GithubException(404, {"message": "Not Found"}, None)
+    return MagicMock(decoded_content=FILES[path].encode("utf-8"), sha=f"sha-{path}")
+
+
+@pytest.fixture
+def head():
+    # The branch head, which still has every post at the blob it was read from
+    return {path: f"sha-{path}" for path in FILES}
+
+
+@pytest.fixture
+def mock_repo(mock_repo, head):
+    mock_repo.get_contents.side_effect = get_contents
+    branch_files(mock_repo, head)
+    return mock_repo
+
+
+def committed(mock_repo):
+    elements = mock_repo.create_git_tree.call_args.args[0]
+    return {
+        element._InputGitTreeElement__path: yaml.safe_load(element._InputGitTreeElement__content.split("---")[1])
+        for element in elements
+    }
+
+
+def test_batch_is_one_commit_with_per_url_status(client, mock_repo):
+    operations = [
+        {"action": "delete", "url": note_url("1")},
+        {"action": "update", "url": note_url("1"), "add": {"category": ["archived"]}},
+        {"action": "update", "url": note_url("2"), "replace": {"category": ["retagged"]}},
+        {"action": "undelete", "url": note_url("3")},
+        {"action": "undelete", "url": note_url("2")},  # not deleted
+        {"action": "delete", "url": note_url("404")},  # no such file
+        {"action": "delete", "url": "https://elsewhere.example/notes/1"},
+    ]
+    response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    assert response.status_code == 200
+    assert [(result["url"], result["status"]) for result in response.json()["results"]] == [
+        (note_url("1"), 204),
+        (note_url("1"), 204),
+        (note_url("2"), 204),
+        (note_url("3"), 204),
+        (note_url("2"), 400),
+        (note_url("404"), 404),
+        ("https://elsewhere.example/notes/1", 400),
+    ]
+    assert response.json()["results"][4]["error"] == "not_deleted"
+
+    # Every post read once, all changes in a single commit
+    assert mock_repo.get_contents.call_count == 4
+    mock_repo.update_file.assert_not_called()
+    mock_repo.create_git_tree.assert_called_once()
+    mock_repo.get_git_ref.return_value.edit.assert_called_once()
+    assert mock_repo.create_git_commit.call_args.args[0].startswith("Update 3 posts")
+
+    posts = committed(mock_repo)
+    assert posts["_notes/1.md"]["published"] is False
+    assert posts["_notes/1.md"]["tags"] == ["foo", "bar", "archived"]
+    assert posts["_notes/2.md"]["tags"] == ["retagged"]
+    assert "published" not in posts["_notes/3.md"]
+
+
+def test_failed_commit_fails_the_changed_posts(client, mock_repo):
+    mock_repo.create_git_tree.side_effect = GithubException(500, {"message": "Server Error"}, None)
+    operations = [{"action": "delete", "url": note_url("1")}, {"action": "delete", "url": note_url("3")}]
+    response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    assert [result["status"] for result in response.json()["results"]] == [500, 400]
+
+
+def test_posts_changed_since_they_were_read_are_not_overwritten(client, mock_repo, head):
+    # _notes/2.md is edited elsewhere between our read and the commit
+    head["_notes/2.md"] = "sha-edited-elsewhere"
+    operations = [{"action": "delete", "url": note_url("1")}, {"action": "delete", "url": note_url("2")}]
+    response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [204, 409]
+    assert results[1]["error"] == "conflict"
+    assert list(committed(mock_repo)) == ["_notes/1.md"]
+    assert mock_repo.create_git_commit.call_args.args[0] == "Update _notes/1.md"
+
+
+def test_retry_after_the_branch_moved_checks_again(client, mock_repo, head):
+    # The first ref update loses a race with an edit of _notes/1.md; the rebuilt commit must not undo it
+    def moved(sha):
+        head["_notes/1.md"] = "sha-edited-elsewhere"
+        mock_repo.get_git_ref.return_value.edit.side_effect = None
+        raise GithubException(422, {"message": "Update is not a fast forward"}, None)
+
+    mock_repo.get_git_ref.return_value.edit.side_effect = moved
+    operations = [{"action": "delete", "url": note_url("1")}, {"action": "delete", "url": note_url("2")}]
+    response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    assert [result["status"] for result in response.json()["results"]] == [409, 204]
+    assert list(committed(mock_repo)) == ["_notes/2.md"]
+
+
+def test_batch_size_is_limited(client, mock_repo):
+    app.dependency_overrides[load_config] = lambda: FAKE_CONFIG.model_copy(update={"max_batch_operations": 2})
+    operations = [{"action": "delete", "url": note_url(str(i))} for i in range(3)]
+    response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    assert response.status_code == 400
+    mock_repo.get_contents.assert_not_called()
+
+
+def test_batch_takes_a_slot_per_github_round_trip(client, mock_repo):
+    config = FAKE_CONFIG.model_copy(update={"write_burst": 4})
+    app.dependency_overrides[load_config] = lambda: config
+    admission = registry.for_config(config).admission
+    acquired = []
+    acquire = admission.acquire
+
+    async def counting(priority="write"):
+        acquired.append(priority)
+        await acquire(priority)
+
+    operations = [{"action": "delete", "url": note_url(str(i))} for i in (1, 2)] + [{"action": "undelete", "url": note_url("3")}]
+    with patch.object(admission, "acquire", new=counting):
+        response = client.post("/micropub", json={"action": "batch", "operations": operations}, headers=HEADERS)
+    assert [result["status"] for result in response.json()["results"]] == [204, 204, 204]
+    # One slot per post read and one for the commit, each released before the next is needed
+    assert acquired == ["write"] * 4
+
+    # The batch counted as three writes against the burst of four
+    assert client.post("/micropub", json={"action": "batch", "operations": operations[:1]}, headers=HEADERS).status_code == 200
+    assert client.post("/micropub", json={"action": "batch", "operations": operations[:1]}, headers=HEADERS).status_code == 429
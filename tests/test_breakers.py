@@ -0,0 +1,152 @@
+import asyncio
+from time import sleep
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import requests
+from fastapi import HTTPException
+from github import GithubException
+
+from indiecourier.app import app, github_login
+from indiecourier.auth import TokenEndpointUnavailable
+from indiecourier.breakers import CircuitBreaker, CircuitOpen, github_failure
+from indiecourier.sites import Site, registry
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub import FAKE_JSON
+from indiecourier.utils import load_config
+
+HEADERS = {"Authorization": "Bearer fake_token"}
+
+
+def breaker(**kwargs):
+    return CircuitBreaker("https://example.com/", "github", **{"window": 4, "min_calls": 2, "open_seconds": 0.05, **kwargs})
+
+
+def test_opens_on_failure_rate_and_fails_fast():
+    b = breaker()
+    b.record(False, 0.1)
+    b.record(True, 0.1)
+    assert b.state == "open"
+    with pytest.raises(CircuitOpen) as e:
+        b.allow()
+    assert e.value.retry_after >= 1
+
+
+def test_slow_calls_count_as_failures():
+    b = breaker(slow_call=1.0)
+    b.record(False, 2.0)
+    b.record(False, 2.0)
+    assert b.state == "open"
+
+
+def test_unclassified_outcomes_are_ignored():
+    b = breaker()
+    for _ in range(5):
+        b.record(None, 0.1)
+    assert b.state == "closed"
+
+
+def test_half_open_trial():
+    b = breaker()
+    b.record(True, 0.1)
+    b.record(True, 0.1)
+    sleep(0.06)
+
+    # One trial call at a time; a failed trial reopens for longer
+    b.allow()
+    assert b.state == "half_open"
+    with pytest.raises(CircuitOpen):
+        b.allow()
+    b.record(True, 0.1)
+    assert b.state == "open"
+    sleep(0.06)
+    with pytest.raises(CircuitOpen):
+        b.allow()
+    sleep(0.06)
+
+    # A successful trial closes it
+    b.allow()
+    b.record(False, 0.1)
+    assert b.state == "closed"
+    b.allow()
+
+
+def test_github_failure_classification():
+    assert github_failure(GithubException(502, "Bad Gateway")) is True
+    assert github_failure(requests.ConnectionError()) is True
+    assert github_failure(GithubException(404, "Not Found")) is False
+    assert github_failure(ValueError()) is None
+
+    # Our handlers turn GithubExceptions into HTTPExceptions; the cause is still found
+    try:
+        try:
+            raise GithubException(503, "Unavailable")
+        except GithubException:
+            raise HTTPException(status_code=500)
+    except HTTPException as e:
+        assert github_failure(e) is True
+
+
+@pytest.fixture
+def fragile_config():
+    config = FAKE_CONFIG.model_copy(update={"breaker_window": 4, "breaker_min_calls": 2, "breaker_open_seconds": 60})
+    app.dependency_overrides[load_config] = lambda: config
+    return config
+
+
+def test_github_breaker_fails_fast(client, fragile_config):
+    mock_repo = MagicMock()
+    mock_repo.create_file.side_effect = GithubException(502, "Bad Gateway")
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+
+    for _ in range(2):
+        response = client.post("/micropub", json=FAKE_JSON, headers={**HEADERS, "Idempotency-Key": str(_)})
+        assert response.status_code == 500
+    response = client.post("/micropub", json=FAKE_JSON, headers={**HEADERS, "Idempotency-Key": "2"})
+    assert response.status_code == 503
+    assert response.json()["detail"]["error"] == "temporarily_unavailable"
+    assert int(response.headers["Retry-After"]) > 1
+    assert mock_repo.create_file.call_count == 2
+
+    # Requests that need no GitHub are unaffected
+    assert client.get("/micropub?q=config", headers=HEADERS).status_code == 200
+
+
+def test_only_github_calls_are_timed():
+    config = FAKE_CONFIG.model_copy(update={"breaker_slow_call": 0.05, "breaker_window": 1, "breaker_min_calls": 1})
+    site = Site(config)
+
+    async def slow_request(github_seconds):
+        async with site.github_slot("write"):
+            await asyncio.sleep(0.1)  # page fetches, downloads, parsing
+            await site.run_github(sleep, github_seconds)
+
+    asyncio.run(slow_request(0))
+    assert site.github_breaker.state == "closed"
+    asyncio.run(slow_request(0.1))
+    assert site.github_breaker.state == "open"
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(slow_request(0))
+    assert e.value.status_code == 503
+
+
+def test_token_breaker_serves_recent_tokens(client, fragile_config):
+    mock_github = MagicMock()
+    app.dependency_overrides[github_login] = lambda: mock_github
+    assert client.get("/micropub?q=config", headers=HEADERS).status_code == 200
+
+    registry.for_config(fragile_config).token_cache.clear()
+    down = AsyncMock(side_effect=TokenEndpointUnavailable("ConnectError"))
+    with patch("indiecourier.auth.introspect_token", new=down):
+        # A token validated before the outage is still accepted; an unknown one is told to retry
+        assert client.get("/micropub?q=config", headers=HEADERS).status_code == 200
+        response = client.get("/micropub?q=config", headers={"Authorization": "Bearer other"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        client.get("/micropub?q=config", headers={"Authorization": "Bearer other"})
+        assert registry.for_config(fragile_config).token_breaker.state == "open"
+        calls = down.call_count
+        assert client.get("/micropub?q=config", headers={"Authorization": "Bearer other"}).status_code == 503
+        assert down.call_count == calls
@@ -0,0 +1,27 @@
+from unittest.mock import patch
+
+from indiecourier import cli
+
+
+def test_serve_passes_server_options():
+    with patch("uvicorn.run") as run:
+        cli.main(["serve", "--workers", "4", "--loop", "uvloop", "--http", "httptools", "--keep-alive", "15", "--graceful-timeout", "10"])
+    args, kwargs = run.call_args
+    assert args == ("indiecourier.app:app",)
+    assert kwargs["workers"] == 4
+    assert (kwargs["loop"], kwargs["http"]) == ("uvloop", "httptools")
+    assert kwargs["timeout_keep_alive"] == 15
+    assert kwargs["timeout_graceful_shutdown"] == 10
+
+
+def test_workers_default_to_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    with patch("uvicorn.run") as run:
+        cli.main(["serve"])
+    assert run.call_args.kwargs["workers"] == 3
+
+
+def test_assets_do_not_depend_on_working_directory(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert client.get("/").status_code == 200
+    assert client.get("/static/modest.css").status_code == 200
@@ -0,0 +1,86 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import mf2py
+
+from indiecourier.entries import EntryExtractor, extract_entry
+from indiecourier.pages import PageCache
+from indiecourier.sites import shared
+from indiecourier.utils import get_datetime, is_note
+
+PAGE = """<html><body>
+<header class="h-card"><a class="p-name u-url" href="/">Site Owner</a></header>
+<main class="h-feed">
+  <article class="h-entry">
+    <div class="p-author h-card"><span class="p-name">Bob</span><img src="bob.png" alt="Bob"></div>
+    <time class="dt-published" datetime="2024-06-01T12:00:00+00:00">June 1</time>
+    <div class="e-content"><p>Hello<p>World<br></div>
+    <section>
+      <div class="p-comment h-cite"><span class="p-name">A reply</span><time class="dt-published">2024-06-02</time></div>
+    </section>
+  </article>
+  <div class="h-entry"><span class="p-name">Another post</span></div>
+</main>
+</body></html>"""
+
+
+def test_only_the_entry_own_properties():
+    entry = extract_entry(PAGE)
+    assert entry == {"items": [{"type": ["h-entry"], "properties": {"published": ["2024-06-01T12:00:00+00:00"]}}]}
+    assert is_note(entry)
+    assert get_datetime(entry).isoformat() == "2024-06-01T12:00:00+00:00"
+    # A full parse finds the site owner's name first and takes the note for an article
+    assert not is_note(mf2py.parse(doc=PAGE))
+
+
+def test_names():
+    assert extract_entry('<div class="h-entry"><h1 class="p-name"> Title <em>here</em></h1></div>')["items"][0]["properties"] == {
+        "name": ["Title here"]
+    }
+    assert extract_entry('<div class="h-entry"><img class="p-name" alt="A photo"></div>')["items"][0]["properties"] == {
+        "name": ["A photo"]
+    }
+    # No markup inside the entry at all: the name is implied from its text, as mf2 does
+    assert extract_entry('<div class="h-entry">Just <b>text</b></div>')["items"][0]["properties"] == {"name": ["Just text"]}
+    assert extract_entry("<p>No entry here</p>") == {"items": []}
+
+
+def test_url_and_dates_do_not_block_the_implied_name():
+    page = (
+        '<div class="h-entry"><a class="u-url" href="/x">Hello there world</a>'
+        '<time class="dt-published" datetime="2024-06-01T12:00:00+00:00">June 1</time></div>'
+    )
+    entry = extract_entry(page)
+    assert entry["items"][0]["properties"]["name"] == ["Hello there worldJune 1"]
+    assert not is_note(entry) and not is_note(mf2py.parse(doc=page))
+    # Any other p-* or e-* property does
+    page = page.replace("</div>", '<p class="e-content">Hello there world</p></div>')
+    assert "name" not in extract_entry(page)["items"][0]["properties"]
+    assert is_note(extract_entry(page)) and is_note(mf2py.parse(doc=page))
+
+
+def test_stops_when_the_entry_ends():
+    extractor = EntryExtractor()
+    chunks = [PAGE[i : i + 7] for i in range(0, len(PAGE), 7)]
+    read = next(i for i, chunk in enumerate(chunks) if extractor.feed(chunk))
+    assert read < len(chunks) - 5
+    assert extractor.result() == extract_entry(PAGE)
+
+
+def test_page_is_read_only_up_to_the_entry():
+    sent = []
+
+    async def body():
+        for chunk in [PAGE.encode(), *(b'<div class="h-cite">comment</div>' for _ in range(1000))]:
+            sent.append(chunk)
+            yield chunk
+
+    async def fetch(url, headers):
+        return httpx.Response(200, content=body(), request=httpx.Request("GET", url))
+
+    pages = PageCache(shared, ttl=60, maxsize=10)
+    with patch.object(pages, "fetch", new=fetch):
+        mf2 = asyncio.run(pages.parse("http://localhost:8000/notes/1"))
+    assert mf2 == extract_entry(PAGE)
+    assert len(sent) == 1
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from indiecourier.idempotency import IdempotencyStore, idempotency_key
+from tests.test_app_micropub import FAKE_JSON
+
+
+def test_retried_create_is_replayed(client, mock_repo):
+    first = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    second = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+
+    assert first.status_code == second.status_code == 202
+    assert first.headers["Location"] == second.headers["Location"]
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert mock_repo.create_file.call_count == 1
+
+
+def test_idempotency_key_header(client, mock_repo):
+    headers = {"Authorization": "Bearer fake_token", "Idempotency-Key": "abc123"}
+    first = client.post("/micropub", json=FAKE_JSON, headers=headers)
+    # Same key, different body: still the original result
+    other = {**FAKE_JSON, "properties": {**FAKE_JSON["properties"], "name": ["Other Post"]}}
+    second = client.post("/micropub", json=other, headers=headers)
+
+    assert second.headers["Location"] == first.headers["Location"]
+    assert mock_repo.create_file.call_count == 1
+
+
+def test_different_bodies_are_not_deduplicated(client, mock_repo):
+    other = {**FAKE_JSON, "properties": {**FAKE_JSON["properties"], "name": ["Other Post"]}}
+    client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    client.post("/micropub", json=other, headers={"Authorization": "Bearer fake_token"})
+    assert mock_repo.create_file.call_count == 2
+
+
+def test_key_depends_on_identity():
+    body = {"type": ["h-entry"]}
+    assert idempotency_key("alice|app", None, body) != idempotency_key("bob|app", None, body)
+    assert idempotency_key("alice|app", None, body) == idempotency_key("alice|app", None, dict(body))
+
+
+def test_concurrent_duplicates_share_execution():
+    store = IdempotencyStore(window=60)
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"status_code": 202, "url": "https://example.com/notes/1"}
+
+    async def main():
+        return await asyncio.gather(*(store.run("key", create) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(result == results[0][0] for result, _ in results)
+
+
+def test_failures_are_not_remembered():
+    store = IdempotencyStore(window=60)
+
+    async def fail():
+        raise RuntimeError("GitHub is down")
+
+    async def succeed():
+        return {"status_code": 202, "url": "https://example.com/notes/1"}
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await store.run("key", fail)
+        return await store.run("key", succeed)
+
+    assert asyncio.run(main()) == ({"status_code": 202, "url": "https://example.com/notes/1"}, False)
+
+
+def test_waiters_outlive_a_cancelled_first_request():
+    store = IdempotencyStore(window=60)
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"status_code": 202, "url": f"https://example.com/notes/{calls}"}
+
+    async def main():
+        first = asyncio.create_task(store.run("key", create))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(store.run("key", create))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await waiter
+
+    # The duplicate runs the request itself rather than failing with the first one's cancellation
+    assert asyncio.run(main()) == ({"status_code": 202, "url": "https://example.com/notes/2"}, False)
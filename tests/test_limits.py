@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from indiecourier.app import app, parse_micropub_request
+from indiecourier.limits import load_request_limits
+from indiecourier.schemas import RequestLimits
+from tests.test_app_micropub import FAKE_JSON
+
+HEADERS = {"Authorization": "Bearer fake_token"}
+
+
+@pytest.fixture(autouse=True)
+def small_limits():
+    app.dependency_overrides[load_request_limits] = lambda: RequestLimits(
+        max_json_body=2048, max_form_body=2048, max_multipart_body=4096, max_fields=20, max_files=2, max_depth=6
+    )
+
+
+def test_declared_length_over_limit(client):
+    body = json.dumps({"type": ["h-entry"], "properties": {"content": ["x" * 4096]}})
+    response = client.post("/micropub", content=body, headers={**HEADERS, "Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert response.json()["detail"]["error"] == "request_too_large"
+
+
+def test_streamed_body_over_limit(client):
+    # No Content-Length: counted as the chunks arrive
+    chunks = iter([b'{"type": ["h-entry"], "properties": {"content": ["'] + [b"x" * 512] * 8 + [b'"]}}'])
+    response = client.post("/micropub", content=chunks, headers={**HEADERS, "Content-Type": "application/json"})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"type": ["h-entry"], "properties": {"content": [[[[[["deep"]]]]]]}}',
+        json.dumps({"type": ["h-entry"], "properties": {f"p{i}": ["x"] for i in range(30)}}).encode(),
+        b'{"type": ["h-entry"], "properties": ',
+        b'["h-entry"]',
+    ],
+    ids=["depth", "fields", "malformed", "not-an-object"],
+)
+def test_invalid_json(client, body):
+    response = client.post("/micropub", content=body, headers={**HEADERS, "Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "invalid_request"
+
+
+def test_too_many_form_fields(client):
+    response = client.post("/micropub", data={"h": "entry", "category": [f"t{i}" for i in range(30)]}, headers=HEADERS)
+    assert response.status_code == 400
+
+
+def test_multipart_over_limit(client):
+    response = client.post(
+        "/micropub",
+        data={"h": "entry", "content": "Hello"},
+        files={"photo": ("big.jpg", b"x" * 8192, "image/jpeg")},
+        headers=HEADERS,
+    )
+    assert response.status_code == 413
+
+
+def test_within_default_limits():
+    echo = FastAPI()
+
+    @echo.post("/echo")
+    async def endpoint(parsed=Depends(parse_micropub_request)):
+        return parsed.model_dump()
+
+    response = TestClient(echo).post("/echo", json=FAKE_JSON)
+    assert response.status_code == 200
+    assert response.json()["properties"] == FAKE_JSON["properties"]
@@ -0,0 +1,60 @@
+import base64
+
+import httpx
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import Faults, github_app
+from benchmarks.loadtest import Result, Traffic, parse_mix, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_summarize_counts_errors_and_statuses():
+    results = [Result("create", 202, 0.1, None), Result("create", 503, 0.3, "busy"), Result("create", 0, 1.0, "ReadTimeout")]
+    summary = summarize(results, elapsed=1.0)
+    assert summary["requests"] == 3
+    assert summary["errors"] == 2
+    assert summary["status"] == {"0": 1, "202": 1, "503": 1}
+    assert summary["latency_ms"]["p50"] == 300.0
+
+
+def test_actions_target_created_posts():
+    traffic = Traffic("https://example.com", seed=1)
+    assert traffic.request("update")["name"] == "create"
+    traffic.record({"name": "create"}, httpx.Response(202, headers={"Location": "https://example.com/notes/1"}))
+
+    delete = traffic.request("delete")
+    assert delete["json"] == {"action": "delete", "url": "https://example.com/notes/1"}
+    traffic.record(delete, httpx.Response(204))
+    assert traffic.deleted == ["https://example.com/notes/1"]
+    assert parse_mix("create=3,config") == {"create": 3.0, "config": 1.0}
+
+
+def test_fake_github_contents_and_commits():
+    client = TestClient(github_app("owner", "site"))
+    content = base64.b64encode(b"hello").decode()
+
+    created = client.put("/repos/owner/site/contents/a.md", json={"message": "Create", "content": content})
+    assert created.status_code == 201
+    assert client.put("/repos/owner/site/contents/a.md", json={"message": "Again", "content": content}).status_code == 422
+    assert client.get("/repos/owner/site/contents/a.md").json()["content"] == content
+
+    # A commit built on a stale parent is refused, like a non-fast-forward ref update
+    head = client.get("/repos/owner/site/git/ref/heads/main").json()["object"]["sha"]
+    tree = client.post("/repos/owner/site/git/trees", json={"tree": [{"path": "b.md", "mode": "100644", "type": "blob", "content": "b"}]}).json()
+    stale = client.post("/repos/owner/site/git/commits", json={"message": "Stale", "tree": tree["sha"], "parents": []}).json()
+    assert client.patch("/repos/owner/site/git/refs/heads/main", json={"sha": stale["sha"]}).status_code == 422
+    fresh = client.post("/repos/owner/site/git/commits", json={"message": "Fresh", "tree": tree["sha"], "parents": [head]}).json()
+    assert client.patch("/repos/owner/site/git/refs/heads/main", json={"sha": fresh["sha"]}).status_code == 200
+
+
+def test_faults_inject_errors():
+    faults = Faults(github_app(), error_rate=1.0, error_status=502)
+    response = TestClient(faults).get("/user")
+    assert response.status_code == 502
+    assert faults.stats() == {"requests": 1, "injected_errors": 1}
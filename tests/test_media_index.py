@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock
+from urllib.parse import urljoin
+
+from indiecourier.app import app, github_login
+from indiecourier.indexes import MediaIndex, MediaItem
+from tests.conftest import FAKE_CONFIG
+
+MEDIA_DIR = FAKE_CONFIG.media_dir
+
+
+def make_repo(*paths):
+    repo = MagicMock()
+    repo.get_git_tree.return_value.tree = [MagicMock(path=path, type="blob", size=100, sha=f"sha-{path}") for path in paths]
+    return repo
+
+
+def paths(items):
+    return [item.path.rsplit("/", 1)[-1] for item in items]
+
+
+def test_seeded_newest_first(tmp_path):
+    index = MediaIndex(tmp_path / "media.log")
+    index.load(make_repo(f"{MEDIA_DIR}/200_b.png", f"{MEDIA_DIR}/100_a.jpg", "_notes/1.md", f"{MEDIA_DIR}/logo.svg"), FAKE_CONFIG)
+
+    items, more = index.page(10)
+    assert paths(items) == ["200_b.png", "100_a.jpg", "logo.svg"]
+    assert not more
+    assert items[0] == MediaItem(f"{MEDIA_DIR}/200_b.png", 100, "image/png", 200.0, f"sha-{MEDIA_DIR}/200_b.png")
+    assert index.find(f"sha-{MEDIA_DIR}/100_a.jpg").path == f"{MEDIA_DIR}/100_a.jpg"
+    assert index.find("unknown") is None
+
+
+def test_paging_is_stable_across_uploads(tmp_path):
+    index = MediaIndex(tmp_path / "media.log")
+    index.load(make_repo(*(f"{MEDIA_DIR}/{i}_x.jpg" for i in range(1, 8))), FAKE_CONFIG)
+
+    first, more = index.page(3)
+    assert paths(first) == ["7_x.jpg", "6_x.jpg", "5_x.jpg"] and more
+    index.add(MediaItem(f"{MEDIA_DIR}/8_x.jpg", 10, "image/jpeg", 8.0))
+    second, more = index.page(3, before=first[-1].path)
+    assert paths(second) == ["4_x.jpg", "3_x.jpg", "2_x.jpg"] and more
+    third, more = index.page(3, before=second[-1].path)
+    assert paths(third) == ["1_x.jpg"] and not more
+    assert paths(index.page(2, offset=1)[0]) == ["7_x.jpg", "6_x.jpg"]
+
+
+def test_uploads_are_shared_through_the_journal(tmp_path):
+    # Two indexes on one journal stand in for two worker processes
+    first, second = MediaIndex(tmp_path / "media.log"), MediaIndex(tmp_path / "media.log")
+    first.load(make_repo(f"{MEDIA_DIR}/1_a.jpg"), FAKE_CONFIG)
+    second.load(make_repo(f"{MEDIA_DIR}/1_a.jpg"), FAKE_CONFIG)
+
+    first.add(MediaItem(f"{MEDIA_DIR}/2_b.gif", 5, "image/gif", 2.0))
+    second.refresh()
+    assert second.last().path == f"{MEDIA_DIR}/2_b.gif"
+
+    # After a restart the upload is in the tree too; the journal keeps its exact metadata
+    restarted = MediaIndex(tmp_path / "media.log")
+    restarted.load(make_repo(f"{MEDIA_DIR}/1_a.jpg", f"{MEDIA_DIR}/2_b.gif"), FAKE_CONFIG)
+    assert len(restarted) == 2
+    assert restarted.last() == MediaItem(f"{MEDIA_DIR}/2_b.gif", 5, "image/gif", 2.0, f"sha-{MEDIA_DIR}/2_b.gif")
+
+
+def test_journal_is_compacted_into_a_snapshot(tmp_path):
+    first, second = MediaIndex(tmp_path / "media.log"), MediaIndex(tmp_path / "media.log")
+    first.load(make_repo(f"{MEDIA_DIR}/1_a.jpg"), FAKE_CONFIG)
+    second.load(make_repo(f"{MEDIA_DIR}/1_a.jpg"), FAKE_CONFIG)
+    uploaded = MediaItem(f"{MEDIA_DIR}/2_b.gif", 5, "image/gif", 2.0)
+    first.add(uploaded)
+
+    # A restart past the threshold folds the journal into the snapshot and starts an empty one
+    restarted = MediaIndex(tmp_path / "media.log", compact_bytes=1)
+    restarted.load(make_repo(f"{MEDIA_DIR}/1_a.jpg", f"{MEDIA_DIR}/2_b.gif"), FAKE_CONFIG)
+    assert (tmp_path / "media.log").stat().st_size == 0
+    assert restarted.last() == uploaded._replace(sha=f"sha-{MEDIA_DIR}/2_b.gif")
+
+    # Workers still tailing the old journal move to the new one, missing nothing written before or after
+    first.add(MediaItem(f"{MEDIA_DIR}/3_c.png", 7, "image/png", 3.0))
+    second.refresh()
+    assert paths(second.page(10)[0]) == ["3_c.png", "2_b.gif", "1_a.jpg"]
+    restarted.refresh()
+    assert restarted.last().path == f"{MEDIA_DIR}/3_c.png"
+
+
+def test_media_queries(client):
+    mock_repo = make_repo(f"{MEDIA_DIR}/100_a.jpg")
+    mock_repo.create_file.side_effect = lambda path, message, content: {
+        "content": MagicMock(path=path),
+        "commit": MagicMock(sha="fake-sha"),
+    }
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+    headers = {"Authorization": "Bearer fake_token"}
+
+    response = client.get("/media?q=last", headers=headers)
+    assert response.json() == {"url": urljoin(str(FAKE_CONFIG.site_url), f"{MEDIA_DIR}/100_a.jpg")}
+
+    uploaded = client.post("/media", files={"file": ("cat.png", b"fake png", "image/png")}, headers=headers)
+    assert uploaded.status_code == 201
+    assert client.get("/media?q=last", headers=headers).json() == {"url": uploaded.headers["Location"]}
+
+    response = client.get("/media?q=source&limit=1", headers=headers).json()
+    assert response["items"] == [
+        {"url": uploaded.headers["Location"], "mime_type": "image/png", "size": 8, "published": response["items"][0]["published"]}
+    ]
+    before = response["paging"]["before"]
+    response = client.get(f"/media?q=source&limit=1&before={before}", headers=headers).json()
+    assert [item["url"] for item in response["items"]] == [urljoin(str(FAKE_CONFIG.site_url), f"{MEDIA_DIR}/100_a.jpg")]
+    assert "paging" not in response
+
+    assert client.get("/media?q=source&before=nope", headers=headers).status_code == 400
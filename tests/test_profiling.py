@@ -0,0 +1,112 @@
+import contextvars
+import threading
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from indiecourier import profiling
+from indiecourier.app import app
+from indiecourier.profiling import load_profiling_settings
+from indiecourier.sites import shared
+from tests.test_app_micropub import FAKE_JSON
+
+
+@pytest.fixture
+def profiling_settings(tmp_path, monkeypatch):
+    monkeypatch.setenv("INDIECOURIER_ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setenv("INDIECOURIER_PROFILE_DIR", str(tmp_path))
+    load_profiling_settings.cache_clear()
+    yield tmp_path
+    load_profiling_settings.cache_clear()
+
+
+def server_timing_stages(response):
+    return {entry.split(";")[0].strip() for entry in response.headers["Server-Timing"].split(",")}
+
+
+def test_server_timing(client, mock_repo):
+    response = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 202
+    assert {"parse", "github", "yaml", "total"} <= server_timing_stages(response)
+
+
+def test_profile_requires_admin_token(client, mock_repo, profiling_settings):
+    response = client.post(
+        "/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token", "X-Profile": "wrong"}
+    )
+    assert response.status_code == 202
+    assert "X-Profile-Path" not in response.headers
+    assert list(profiling_settings.iterdir()) == []
+
+
+def test_profile_written_to_directory(client, mock_repo, profiling_settings):
+    response = client.post(
+        "/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token", "X-Profile": "admin-secret"}
+    )
+    assert response.status_code == 202
+    path = Path(response.headers["X-Profile-Path"])
+    assert path.parent == profiling_settings
+    assert path.suffix == ".folded"
+    assert path.exists()
+
+
+def test_deterministic_profile_inline(client, mock_repo, profiling_settings):
+    response = client.post(
+        "/micropub?profile=admin-secret&profile_mode=deterministic&profile_output=inline",
+        json=FAKE_JSON,
+        headers={"Authorization": "Bearer fake_token"},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Status"] == "202"
+    # create_post normally runs in an executor thread and is still included
+    assert "create_post" in response.text
+
+
+def test_overlapping_deterministic_profiles_fall_back_to_sampling(client, mock_repo, profiling_settings):
+    headers = {"Authorization": "Bearer fake_token", "X-Profile": "admin-secret", "X-Profile-Mode": "deterministic"}
+    # As if another request were being profiled with cProfile right now
+    with profiling._deterministic_lock:
+        response = client.post("/micropub", json=FAKE_JSON, headers=headers)
+    assert response.status_code == 202
+    assert response.headers["X-Profile-Mode"] == "sampling"
+    assert response.headers["X-Profile-Path"].endswith(".folded")
+
+    response = client.post("/micropub", json=FAKE_JSON, headers=headers)
+    assert response.headers["X-Profile-Mode"] == "deterministic"
+    assert not profiling._deterministic_lock.locked()
+
+
+def test_continuous_profile_dumped_at_shutdown(mock_repo, profiling_settings, monkeypatch):
+    # A flush interval longer than the test: only the shutdown writes the samples out
+    monkeypatch.setenv("INDIECOURIER_CONTINUOUS_PROFILE_INTERVAL", "0.001")
+    monkeypatch.setenv("INDIECOURIER_CONTINUOUS_PROFILE_FLUSH", "3600")
+    load_profiling_settings.cache_clear()
+    with patch("indiecourier.warmup.warm_up", AsyncMock()), patch.object(shared, "aclose", AsyncMock()):
+        with TestClient(app) as client:
+            client.get("/healthz")
+            assert profiling._continuous is not None
+            profiling._continuous.sample()
+    assert profiling._continuous is None
+    assert [path.name.startswith("continuous-") for path in profiling_settings.iterdir()] == [True]
+
+
+def test_stage_timings_are_added_under_the_lock():
+    # Stages also finish on executor threads; the read-modify-write of the shared dict must not interleave
+    timings = {"github": 1.0}
+    token = profiling._timings.set(timings)
+    try:
+        def work():
+            with profiling.stage("github"):
+                pass
+
+        with profiling._timings_lock:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            thread.start()
+            thread.join(0.1)
+            assert thread.is_alive() and timings == {"github": 1.0}
+        thread.join()
+    finally:
+        profiling._timings.reset(token)
+    assert timings["github"] > 1.0
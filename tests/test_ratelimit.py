@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from indiecourier.app import app
+from indiecourier.ratelimit import RateLimiter
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub import FAKE_JSON
+from indiecourier.utils import load_config
+
+RATES = {"read": (60.0, 3), "write": (6.0, 2)}
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    with patch("indiecourier.ratelimit.monotonic", side_effect=lambda: now[0]):
+        yield now
+
+
+def retry_after(limiter, *args) -> int:
+    with pytest.raises(HTTPException) as e:
+        limiter.check(*args)
+    assert e.value.status_code == 429
+    return int(e.value.headers["Retry-After"])
+
+
+def test_bursts_then_refills(clock):
+    limiter = RateLimiter("site", RATES, client_factor=1.0)
+    limiter.check("write", "alice|app", None)
+    limiter.check("write", "alice|app", None)
+    assert retry_after(limiter, "write", "alice|app", None) == 10  # 6 per minute
+
+    # Reads and other tokens have buckets of their own
+    limiter.check("read", "alice|app", None)
+    limiter.check("write", "bob|app", None)
+
+    clock[0] += 10
+    limiter.check("write", "alice|app", None)
+    assert retry_after(limiter, "write", "alice|app", None) == 10
+
+
+def test_client_bucket_spans_tokens(clock):
+    limiter = RateLimiter("site", RATES, client_factor=2.0)
+    for user in ("alice", "bob", "carol", "dave"):
+        limiter.check("write", f"{user}|sync", "https://sync.example/")
+    # Every token still has room, but the client has used its 2 x 2 burst
+    assert retry_after(limiter, "write", "erin|sync", "https://sync.example/") == 5
+    limiter.check("write", "erin|other", "https://other.example/")
+
+
+def test_idle_buckets_are_evicted(clock):
+    limiter = RateLimiter("site", RATES, client_factor=1.0)
+    for i in range(100):
+        limiter.check("read", f"user{i}|app", None)
+    assert len(limiter) == 100
+
+    # A read bucket is full again after 3 seconds; anything idle that long is forgotten
+    clock[0] += 3
+    limiter.check("read", "late|app", None)
+    assert len(limiter) == 1
+
+
+def test_disabled(clock):
+    limiter = RateLimiter("site", {"read": (0.0, 0), "write": (0.0, 0)}, client_factor=1.0)
+    for _ in range(100):
+        limiter.check("write", "alice|app", "https://app.example/")
+    assert len(limiter) == 0
+
+
+def test_throttled_before_github(client, mock_repo):
+    config = FAKE_CONFIG.model_copy(update={"write_burst": 2, "idempotency_window": 0})
+    app.dependency_overrides[load_config] = lambda: config
+    headers = {"Authorization": "Bearer fake_token"}
+
+    assert [client.post("/micropub", json=FAKE_JSON, headers=headers).status_code for _ in range(2)] == [202, 202]
+    response = client.post("/micropub", json=FAKE_JSON, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert response.json()["detail"]["error"] == "rate_limited"
+    assert mock_repo.create_file.call_count == 2
+
+    # Reads are counted separately
+    assert client.get("/media?q=last", headers=headers).status_code == 200
+
+
+def test_throttled_before_remote_media_is_fetched(client, mock_repo):
+    config = FAKE_CONFIG.model_copy(update={"write_burst": 1, "idempotency_window": 0, "rehost_media": True})
+    app.dependency_overrides[load_config] = lambda: config
+    headers = {"Authorization": "Bearer fake_token"}
+    body = {"type": ["h-entry"], "properties": {"content": ["Photo"], "photo": ["https://cdn.example.net/a.jpg"]}}
+
+    with patch("indiecourier.app.fetch_remote_media", new=AsyncMock(return_value=[])) as fetch:
+        assert client.post("/micropub", json=body, headers=headers).status_code == 202
+        assert client.post("/micropub", json=body, headers=headers).status_code == 429
+    assert fetch.await_count == 1
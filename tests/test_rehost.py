@@ -0,0 +1,177 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+import yaml
+
+from indiecourier.app import app
+from indiecourier.commits import blob_sha
+from indiecourier.indexes import MediaItem
+from indiecourier.sites import registry
+from tests.conftest import FAKE_CONFIG
+from indiecourier.utils import load_config
+
+HEADERS = {"Authorization": "Bearer fake_token"}
+MEDIA_DIR = FAKE_CONFIG.media_dir
+SITE_URL = str(FAKE_CONFIG.site_url)
+
+REMOTE = {
+    "https://cdn.example.net/a.jpg": (b"first image", "image/jpeg"),
+    "https://cdn.example.net/b": (b"second image", "image/png"),
+    "https://cdn.example.net/copy-of-a.jpg": (b"first image", "image/jpeg"),
+    "https://cdn.example.net/known.gif": (b"already uploaded", "image/gif"),
+    "https://cdn.example.net/huge.jpg": (b"x" * 4096, "image/jpeg"),
+    "https://cdn.example.net/page.html": (b"<html></html>", "text/html"),
+}
+REDIRECTS = {
+    "https://cdn.example.net/moved.jpg": "/a.jpg",
+    "https://cdn.example.net/metadata.jpg": "http://169.254.169.254/latest/meta-data/",
+}
+
+
+@pytest.fixture
+def remote():
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.05)
+        state["active"] -= 1
+        # Requests go to the checked address; the URL they were for is in the Host header
+        url = str(request.url.copy_with(netloc=request.headers["Host"].encode("ascii")))
+        state.setdefault("requested", []).append(url)
+        state.setdefault("connected", []).append((request.url.host, request.extensions.get("sni_hostname")))
+        if url in REDIRECTS:
+            return httpx.Response(302, headers={"Location": REDIRECTS[url]})
+        content, content_type = REMOTE.get(url, (b"", "text/plain"))
+        return httpx.Response(200 if content else 404, content=content, headers={"Content-Type": content_type})
+
+    async def resolve(host, port):
+        state["resolved"] = state.get("resolved", 0) + 1
+        if host == "rebind.example" and state["resolved"] > 1:
+            return ["127.0.0.1"]
+        return ["10.0.0.5"] if host == "intranet.example" else ["93.184.216.34"]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with patch("indiecourier.app.shared.http_client", return_value=client), patch("indiecourier.rehost.resolve", new=resolve):
+        yield state
+
+
+@pytest.fixture
+def rehosting():
+    config = FAKE_CONFIG.model_copy(update={"rehost_media": True, "rehost_max_size": 1024})
+    app.dependency_overrides[load_config] = lambda: config
+
+
+# One file is already in the media directory
+pytestmark = pytest.mark.parametrize(
+    "mock_repo",
+    [{"get_git_tree.return_value.tree": [MagicMock(path=f"{MEDIA_DIR}/100_known.gif", type="blob", size=16, sha=blob_sha(b"already uploaded"))]}],
+    ids=["known-media"],
+    indirect=True,
+)
+
+
+def committed(mock_repo):
+    elements = mock_repo.create_git_tree.call_args.args[0]
+    paths = [element._InputGitTreeElement__path for element in elements]
+    frontmatter = yaml.safe_load(elements[0]._InputGitTreeElement__content.split("---")[1])
+    return paths, frontmatter
+
+
+def test_remote_photos_are_committed_with_the_post(client, remote, rehosting, mock_repo):
+    photos = list(REMOTE) + [{"value": "https://cdn.example.net/missing.jpg", "alt": "gone"}, f"{SITE_URL}{MEDIA_DIR}/1_own.jpg"]
+    response = client.post(
+        "/micropub", json={"type": ["h-entry"], "properties": {"content": ["Photos"], "photo": photos}}, headers=HEADERS
+    )
+    assert response.status_code == 202
+
+    # Every remote file is fetched at once; a and its copy are one blob, the known file is not uploaded again
+    assert remote["peak"] == 7
+    assert mock_repo.create_git_blob.call_count == 2
+    mock_repo.create_file.assert_not_called()
+    mock_repo.create_git_tree.assert_called_once()
+
+    paths, frontmatter = committed(mock_repo)
+    assert paths[0].startswith("_notes/")
+    assert sorted(path.rsplit(".", 1)[1] for path in paths[1:]) == ["jpg", "png"]
+    new_urls = {path.rsplit(".", 1)[1]: f"{SITE_URL}{path}" for path in paths[1:]}
+    assert frontmatter["photo"] == [
+        new_urls["jpg"],
+        new_urls["png"],
+        new_urls["jpg"],
+        f"{SITE_URL}{MEDIA_DIR}/100_known.gif",
+        "https://cdn.example.net/huge.jpg",
+        "https://cdn.example.net/page.html",
+        {"url": "https://cdn.example.net/missing.jpg", "alt": "gone"},
+        f"{SITE_URL}{MEDIA_DIR}/1_own.jpg",
+    ]
+
+    # Rehosted files are known media now, and nothing is left behind on disk
+    site = registry.for_config(FAKE_CONFIG)
+    assert site.media.find(blob_sha(b"second image")).path in paths
+    assert not list((site.state_path / "rehost").iterdir())
+
+
+def test_only_public_addresses_are_fetched(client, remote, rehosting, mock_repo):
+    photos = [
+        "https://cdn.example.net/moved.jpg",
+        "https://cdn.example.net/metadata.jpg",
+        "http://127.0.0.1:8080/admin.jpg",
+        "http://[::ffff:10.0.0.1]/photo.jpg",
+        "https://intranet.example/photo.jpg",
+    ]
+    response = client.post(
+        "/micropub", json={"type": ["h-entry"], "properties": {"content": ["Photos"], "photo": photos}}, headers=HEADERS
+    )
+    assert response.status_code == 202
+
+    # Redirects to public hosts are followed; nothing on a private address is ever requested
+    assert sorted(remote["requested"]) == [
+        "https://cdn.example.net/a.jpg",
+        "https://cdn.example.net/metadata.jpg",
+        "https://cdn.example.net/moved.jpg",
+    ]
+    paths, frontmatter = committed(mock_repo)
+    assert frontmatter["photo"][0] == f"{SITE_URL}{paths[1]}"
+    assert frontmatter["photo"][1:] == photos[1:]
+
+
+def test_requests_go_to_the_checked_address(client, remote, rehosting, mock_repo):
+    # rebind.example answers with a public address once, then with loopback: the fetch must not resolve it again
+    REMOTE["https://rebind.example/photo.jpg"] = (b"rebound image", "image/jpeg")
+    try:
+        response = client.post(
+            "/micropub",
+            json={"type": ["h-entry"], "properties": {"content": ["Photo"], "photo": ["https://rebind.example/photo.jpg"]}},
+            headers=HEADERS,
+        )
+    finally:
+        del REMOTE["https://rebind.example/photo.jpg"]
+    assert response.status_code == 202
+    assert remote["requested"] == ["https://rebind.example/photo.jpg"]
+    assert remote["connected"] == [("93.184.216.34", "rebind.example")]
+    assert remote["resolved"] == 1
+    assert committed(mock_repo)[1]["photo"][0].startswith(f"{SITE_URL}{MEDIA_DIR}/")
+
+
+def test_disabled_by_default(client, remote, mock_repo):
+    mock_repo.create_file.return_value = {"content": MagicMock(path="_notes/1.md"), "commit": MagicMock(sha="fake-sha")}
+    response = client.post(
+        "/micropub",
+        json={"type": ["h-entry"], "properties": {"content": ["Photo"], "photo": ["https://cdn.example.net/a.jpg"]}},
+        headers=HEADERS,
+    )
+    assert response.status_code == 202
+    assert remote["peak"] == 0
+    mock_repo.create_git_blob.assert_not_called()
+
+
+def test_uploads_record_their_content_hash(client, mock_repo):
+    mock_repo.create_file.side_effect = lambda path, message, content: {"content": MagicMock(path=path), "commit": MagicMock(sha="fake-sha")}
+    uploaded = client.post("/media", files={"file": ("cat.png", b"fake png", "image/png")}, headers=HEADERS)
+    assert uploaded.status_code == 201
+    item = registry.for_config(FAKE_CONFIG).media.find(blob_sha(b"fake png"))
+    assert isinstance(item, MediaItem) and uploaded.headers["Location"].endswith(item.path)
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from indiecourier.reloader import ConfigWatcher
+from indiecourier.sites import SiteRegistry
+from tests.test_sites import SITES
+
+
+def write_sites(path, sites, mtime):
+    path.write_text(json.dumps(sites))
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "sites.json"
+    write_sites(path, SITES, 1_000_000_000)
+    return SiteRegistry(path)
+
+
+def test_unchanged_files_are_not_reloaded(registry):
+    registry.sites()
+    assert not ConfigWatcher(registry).check()
+
+
+def test_changes_are_swapped_in(registry):
+    alice = registry.sites()[0]
+    old_config = alice.config
+    old_response = alice.derived("q=config", old_config, lambda config: config.media_endpoint)
+    github = alice.github()
+    watcher = ConfigWatcher(registry)
+
+    sites = json.loads(json.dumps(SITES))
+    sites["sites"][0]["media_endpoint"] = "https://media.example.com/alice"
+    sites["sites"][0]["syndicate-to"] = [{"uid": "bluesky", "name": "Bluesky"}]
+    write_sites(registry.path, sites, 2_000_000_000)
+    assert watcher.check()
+
+    # Same site and caches, new config
+    assert registry.sites()[0] is alice
+    assert alice.config.media_endpoint == "https://media.example.com/alice"
+    assert alice.config.syndicate_to[0].uid == "bluesky"
+    assert alice.github() is github
+    assert alice.derived("q=config", alice.config, lambda config: config.media_endpoint) != old_response
+    # A request that started before the reload still sees the old config
+    assert old_config.media_endpoint == "https://micropub.example.com/alice/media"
+
+
+def test_token_rotation_drops_github_client(registry):
+    alice = registry.sites()[0]
+    github = alice.github()
+    watcher = ConfigWatcher(registry)
+
+    sites = json.loads(json.dumps(SITES))
+    sites["sites"][0]["github_token"] = "rotated-token"
+    write_sites(registry.path, sites, 2_000_000_000)
+    assert watcher.check()
+    assert alice.github() is not github
+
+
+def test_invalid_config_is_ignored(registry):
+    alice = registry.sites()[0]
+    config = alice.config
+    watcher = ConfigWatcher(registry)
+
+    sites = json.loads(json.dumps(SITES))
+    del sites["sites"][0]["media_endpoint"]
+    sites["sites"][0]["me"] = "not a url"
+    write_sites(registry.path, sites, 2_000_000_000)
+    assert not watcher.check()
+    assert alice.config is config
+
+
+def test_new_sites_are_added(registry):
+    registry.sites()
+    watcher = ConfigWatcher(registry)
+
+    sites = json.loads(json.dumps(SITES))
+    sites["sites"].append({**SITES["sites"][1], "me": "https://carol.example.com", "github_repo": "carol-site"})
+    write_sites(registry.path, sites, 2_000_000_000)
+    assert watcher.check()
+    assert [site.config.github_repo for site in registry.sites()] == ["alice-site", "bob-site", "carol-site"]
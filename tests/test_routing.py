@@ -0,0 +1,48 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+from urllib.parse import urljoin
+
+from indiecourier.app import app, github_login
+from indiecourier.routing import PostMatch, PostRouter
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub_action import FAKE_CONTENT
+
+HEADERS = {"Authorization": "Bearer fake_token"}
+
+
+def test_classifies_from_templates():
+    router = PostRouter(FAKE_CONFIG)
+    assert router.match("http://localhost:8000/notes/2024/06/01/1772160815") == [
+        PostMatch("note", date(2024, 6, 1), "1772160815", "_notes/1772160815.md")
+    ]
+    assert router.match("http://localhost:8000/posts/2024/06/01/test-post") == [
+        PostMatch("article", date(2024, 6, 1), "test-post", "_posts/2024-06-01-test-post.md")
+    ]
+    assert router.match("http://localhost:8000/about") == []
+    assert router.match("http://elsewhere.example/notes/2024/06/01/1") == []
+
+
+def test_ambiguous_templates_match_both():
+    template = "{site_url}/{date:%Y/%m/%d}/{slug}"
+    config = FAKE_CONFIG.model_copy(update={"article_url_template": template, "note_url_template": template})
+    matches = PostRouter(config).match("http://localhost:8000/2024/06/01/hello")
+    assert [match.kind for match in matches] == ["note", "article"]
+
+
+def test_actions_do_not_fetch_the_page(client):
+    mock_repo = MagicMock()
+    mock_repo.get_contents.return_value.decoded_content = FAKE_CONTENT.encode("utf-8")
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+
+    fetch = MagicMock(side_effect=AssertionError("the page should not be fetched"))
+    with patch("indiecourier.pages.PageCache.fetch", new=fetch):
+        url = urljoin(str(FAKE_CONFIG.site_url), "/posts/2024/06/01/test-post")
+        response = client.post("/micropub", json={"action": "delete", "url": url}, headers=HEADERS)
+        assert response.status_code == 204
+        assert mock_repo.get_contents.call_args.args[0] == "_posts/2024-06-01-test-post.md"
+
+        response = client.post("/micropub", json={"action": "delete", "url": urljoin(url, "/about")}, headers=HEADERS)
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "invalid_url"
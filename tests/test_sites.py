@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from indiecourier.app import app
+from indiecourier.sites import SiteRegistry, registry
+from indiecourier.utils import load_config
+
+SITE_DEFAULTS = {
+    "token-endpoint": "https://tokens.indieauth.com/token",
+    "github_token": "fake-github-token",
+    "github_user": "fake-github-user",
+    "media_dir": "assets/images/notes",
+}
+
+SITES = {
+    "sites": [
+        {
+            **SITE_DEFAULTS,
+            "me": "https://alice.example.com",
+            "site-url": "https://alice.example.com",
+            "github_repo": "alice-site",
+            "media_endpoint": "https://micropub.example.com/alice/media",
+            "path_prefix": "/alice",
+        },
+        {
+            **SITE_DEFAULTS,
+            "me": "https://bob.example.com",
+            "site-url": "https://bob.example.com",
+            "github_repo": "bob-site",
+            "media_endpoint": "https://micropub.bob.example.com/media",
+            "host": "micropub.bob.example.com",
+        },
+    ]
+}
+
+
+@pytest.fixture
+def sites_file(tmp_path, monkeypatch):
+    path = tmp_path / "sites.json"
+    path.write_text(json.dumps(SITES))
+    monkeypatch.setattr(registry, "path", path)
+    registry.reset()
+    app.dependency_overrides.pop(load_config, None)
+    return path
+
+
+def test_registry_loads_sites(sites_file):
+    sites = SiteRegistry(sites_file).sites()
+    assert [site.config.github_repo for site in sites] == ["alice-site", "bob-site"]
+
+
+def test_resolve_by_path_prefix(client, sites_file):
+    response = client.get("/alice/micropub?q=config", headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 200
+    assert response.json()["media-endpoint"] == "https://micropub.example.com/alice/media"
+
+
+def test_resolve_by_host(client, sites_file):
+    response = client.get(
+        "/micropub?q=config",
+        headers={"Authorization": "Bearer fake_token", "Host": "micropub.bob.example.com"},
+    )
+    assert response.status_code == 200
+    assert response.json()["me"] == "https://bob.example.com/"
+
+
+def test_resolve_by_me(client, sites_file):
+    response = client.get("/micropub?q=config&me=https://bob.example.com/", headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 200
+    assert response.json()["me"] == "https://bob.example.com/"
+
+
+def test_unknown_site(client, sites_file):
+    response = client.get("/micropub?q=config", headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 404
+    assert response.json()["detail"]["error"] == "unknown_site"
+
+
+def test_sites_have_separate_state(sites_file):
+    alice, bob = registry.sites()
+    assert registry.for_config(alice.config) is alice
+    alice.token_cache.set("token", {"me": "https://alice.example.com"})
+    assert bob.token_cache.get("token") is None
+
+
+def test_sites_are_labelled_by_an_opaque_id(client, sites_file):
+    alice, bob = registry.sites()
+    client.get("/alice/micropub?q=config", headers={"Authorization": "Bearer fake_token"})
+    alice.rate_limiter.check("write", "fake_token", "client")
+    assert alice.id != bob.id and alice.state_path.name == alice.id
+
+    metrics = client.get("/metrics").text
+    assert f'site="{alice.id}"' in metrics
+    assert "alice.example.com" not in metrics and "alice-site" not in metrics
@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import time
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+
+from github import GithubException
+
+from indiecourier.app import app, github_login
+from indiecourier.indexes import PathIndex
+from indiecourier.slugs import SlugAllocator, note_slug
+from tests.test_app_micropub import FAKE_GITHUB_RESPONSE
+
+NOTE_JSON = {"type": ["h-entry"], "properties": {"content": ["Hello world!"]}}
+
+
+def note_path(slug):
+    return f"_notes/{slug}.md"
+
+
+def make_repo(*paths):
+    repo = MagicMock()
+    repo.get_git_tree.return_value.tree = [MagicMock(path=path, type="blob") for path in paths]
+    return repo
+
+
+def test_existing_paths_get_suffix(tmp_path):
+    allocator = SlugAllocator(PathIndex(), tmp_path)
+    repo = make_repo("_notes/hello.md", "_notes/hello-2.md")
+    assert allocator.allocate(repo, "hello", note_path) == ("hello-3", "_notes/hello-3.md")
+
+
+def test_concurrent_allocations_are_unique(tmp_path):
+    allocator = SlugAllocator(PathIndex(), tmp_path)
+    repo = make_repo()
+    with ThreadPoolExecutor(8) as executor:
+        slugs = list(executor.map(lambda _: allocator.allocate(repo, "1772160815", note_path)[0], range(20)))
+    assert len(set(slugs)) == 20
+    assert "1772160815" in slugs and "1772160815-20" in slugs
+
+
+def test_allocators_sharing_a_directory_are_unique(tmp_path):
+    # Two workers with independent path indexes, same reservations directory
+    first = SlugAllocator(PathIndex(), tmp_path)
+    second = SlugAllocator(PathIndex(), tmp_path)
+    repo = make_repo()
+    assert first.allocate(repo, "hello", note_path)[0] == "hello"
+    assert second.allocate(repo, "hello", note_path)[0] == "hello-2"
+
+
+def test_released_paths_are_reused(tmp_path):
+    allocator = SlugAllocator(PathIndex(), tmp_path)
+    repo = make_repo()
+    _, path = allocator.allocate(repo, "hello", note_path)
+    allocator.release(path)
+    assert allocator.allocate(repo, "hello", note_path)[0] == "hello"
+
+
+def test_note_slug_schemes():
+    dt = datetime(2026, 2, 26, 20, 53, 35, 250000, tzinfo=ZoneInfo("UTC"))
+    now = dt.timestamp()
+    assert note_slug(now, dt, "timestamp") == str(int(now))
+    assert note_slug(now, dt, "timestamp_ms") == str(int(now * 1000))
+    assert note_slug(now, dt, "sequence") == "20260226"
+
+
+def test_same_second_notes_do_not_collide(client):
+    mock_repo = make_repo()
+    mock_repo.create_file.return_value = FAKE_GITHUB_RESPONSE
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+
+    with patch("indiecourier.app.time", return_value=1772160815.5):
+        first = client.post("/micropub", json=NOTE_JSON, headers={"Authorization": "Bearer fake_token", "Idempotency-Key": "1"})
+        second = client.post("/micropub", json=NOTE_JSON, headers={"Authorization": "Bearer fake_token", "Idempotency-Key": "2"})
+
+    assert first.headers["Location"].endswith("/1772160815")
+    assert second.headers["Location"].endswith("/1772160815-2")
+    paths = [call.kwargs["path"] for call in mock_repo.create_file.call_args_list]
+    assert paths == ["_notes/1772160815.md", "_notes/1772160815-2.md"]
+
+
+def test_unknown_existing_path_is_retried(client):
+    mock_repo = make_repo()
+    mock_repo.create_file.side_effect = [GithubException(422, {"message": "sha wasn't supplied"}), FAKE_GITHUB_RESPONSE]
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+
+    with patch("indiecourier.app.time", return_value=1772160815.5):
+        response = client.post("/micropub", json=NOTE_JSON, headers={"Authorization": "Bearer fake_token"})
+
+    assert response.status_code == 202
+    assert response.headers["Location"].endswith("/1772160815-2")
+
+
+def test_other_validation_errors_are_not_retried(client):
+    mock_repo = make_repo()
+    mock_repo.create_file.side_effect = GithubException(422, {"message": "path contains a malformed path component"})
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+
+    response = client.post("/micropub", json=NOTE_JSON, headers={"Authorization": "Bearer fake_token"})
+    assert response.status_code == 500
+    assert mock_repo.create_file.call_count == 1
+
+
+def test_expired_reservations_are_swept(tmp_path):
+    allocator = SlugAllocator(PathIndex(), tmp_path, reservation_ttl=60)
+    repo = make_repo()
+    _, old = allocator.allocate(repo, "old", note_path)
+    _, recent = allocator.allocate(repo, "recent", note_path)
+    os.utime(allocator._marker(old), (time() - 120, time() - 120))
+
+    # Within the sweep interval the expired marker stays; a later allocation clears it
+    allocator.allocate(repo, "new", note_path)
+    assert allocator._marker(old).exists()
+    allocator._next_sweep = 0.0
+    allocator.allocate(repo, "newer", note_path)
+    assert not allocator._marker(old).exists() and allocator._marker(recent).exists()
@@ -0,0 +1,162 @@
+import base64
+from unittest.mock import MagicMock
+
+import httpx
+
+from benchmarks.fakes import github_app
+from benchmarks.loadtest import BackgroundServer, free_port
+from indiecourier.indexes import PathIndex
+from indiecourier.sites import Site
+from indiecourier.snapshots import Snapshot, TreeEntry, write_snapshot
+from tests.conftest import FAKE_CONFIG
+
+MEDIA_DIR = FAKE_CONFIG.media_dir
+OLD, NEW = "a" * 40, "b" * 40
+
+
+def post(*tags):
+    return base64.b64encode("\n".join(["---", "tags:"] + [f"- {tag}" for tag in tags] + ["---", "Hello"]).encode()).decode()
+
+
+def make_repo(head, files):
+    # files: path -> (blob sha, size)
+    repo = MagicMock()
+    repo.get_git_ref.return_value.object.sha = head
+    repo.get_git_tree.return_value.tree = [
+        MagicMock(path=path, type="blob", sha=sha, size=size) for path, (sha, size) in files.items()
+    ]
+    blobs = {"s1": post("a"), "s2": post("b"), "s3": post("c")}
+    repo.get_git_blob.side_effect = lambda sha: MagicMock(content=blobs[sha])
+    return repo
+
+
+FILES = {"_notes/1.md": ("s1", 40), "_notes/2.md": ("s2", 40), f"{MEDIA_DIR}/100_a.jpg": ("m1", 1000), "README.md": ("r", 5)}
+
+
+def test_snapshot_round_trip(tmp_path):
+    entries = [TreeEntry("b/ü.md", "s2", None), TreeEntry("a.md", "s1", 10), TreeEntry("b/c.md", "s3", 0)]
+    write_snapshot(tmp_path / "snap", OLD, entries)
+    snapshot = Snapshot.open(tmp_path / "snap")
+    assert snapshot.commit == OLD
+    assert list(snapshot) == sorted(entries)
+    assert all(entry.path in snapshot for entry in entries)
+    assert "b" not in snapshot and "b/d.md" not in snapshot and "0" not in snapshot
+
+    (tmp_path / "bad").write_bytes(b"not a snapshot")
+    assert Snapshot.open(tmp_path / "bad") is None
+    assert Snapshot.open(tmp_path / "missing") is None
+
+
+def test_paths_over_a_snapshot(tmp_path):
+    write_snapshot(tmp_path / "snap", OLD, [TreeEntry("a.md", "s1", 1), TreeEntry("b.md", "s2", 1)])
+    paths = PathIndex()
+    paths.add("c.md")  # written while loading
+    paths.use_snapshot(Snapshot.open(tmp_path / "snap"))
+    paths.discard("a.md")
+    assert [path in paths for path in ("a.md", "b.md", "c.md", "d.md")] == [False, True, True, False]
+    paths.add("a.md")
+    assert "a.md" in paths
+
+
+def test_restart_loads_the_snapshot_and_catches_up():
+    repo = make_repo(OLD, FILES)
+    assert Site(FAKE_CONFIG).load_indexes(repo) == "tree"
+
+    # Another worker at the same commit: no tree listing and no blob reads
+    repo = make_repo(OLD, FILES)
+    site = Site(FAKE_CONFIG)
+    assert site.load_indexes(repo) == "snapshot"
+    repo.get_git_tree.assert_not_called()
+    repo.get_git_blob.assert_not_called()
+    assert "_notes/1.md" in site.paths and "README.md" in site.paths
+    assert site.tags.categories() == ["a", "b"]
+    assert site.media.find("m1").path == f"{MEDIA_DIR}/100_a.jpg"
+
+    # Two commits later: only the changes are fetched
+    repo = make_repo(NEW, FILES)
+    repo.compare.return_value = MagicMock(
+        status="ahead",
+        files=[
+            MagicMock(filename="_notes/3.md", status="added", sha="s3"),
+            MagicMock(filename="_notes/1.md", status="removed", sha=None),
+            MagicMock(filename=f"{MEDIA_DIR}/200_b.png", status="renamed", sha="m1", previous_filename=f"{MEDIA_DIR}/100_a.jpg"),
+        ],
+    )
+    site = Site(FAKE_CONFIG)
+    assert site.load_indexes(repo) == "compare"
+    repo.compare.assert_called_once_with(OLD, NEW)
+    repo.get_git_tree.assert_not_called()
+    assert [call.args[0] for call in repo.get_git_blob.call_args_list] == ["s3"]
+    assert "_notes/1.md" not in site.paths and "_notes/3.md" in site.paths
+    assert site.tags.categories() == ["b", "c"]
+    assert site.media.last().path == f"{MEDIA_DIR}/200_b.png" and len(site.media) == 1
+    assert Snapshot.open(site.state_path / "indexes.snapshot").commit == NEW
+
+
+def test_reload_closes_the_replaced_snapshot():
+    site = Site(FAKE_CONFIG)
+    site.load_indexes(make_repo(OLD, FILES))
+    first = site.paths._snapshot
+    site.load_indexes(make_repo(OLD, FILES))
+    assert site.paths._snapshot is not first and first._map.closed
+    assert "_notes/1.md" in site.paths
+
+    # Caught up from a stale snapshot: that one is closed once the new listing is written
+    repo = make_repo(NEW, FILES)
+    repo.compare.return_value = MagicMock(status="ahead", files=[])
+    second = site.paths._snapshot
+    site.load_indexes(repo)
+    assert second._map.closed and site.paths._snapshot.commit == NEW
+
+
+def test_rewritten_history_reloads_the_tree():
+    Site(FAKE_CONFIG).load_indexes(make_repo(OLD, FILES))
+    repo = make_repo(NEW, FILES)
+    repo.compare.return_value = MagicMock(status="diverged", files=[])
+    assert Site(FAKE_CONFIG).load_indexes(repo) == "tree"
+    repo.get_git_tree.assert_called_once_with(NEW, recursive=True)
+
+
+def test_catch_up_against_the_fake_github():
+    # The load test's fake: real commit shas, nested tree listings and comparisons between commits
+    server = BackgroundServer(github_app("loadtest", "site"), free_port()).start()
+    try:
+        config = FAKE_CONFIG.model_copy(
+            update={"github_api_url": server.url, "github_repo": "site", "github_user": "loadtest", "github_token": "t"}
+        )
+
+        def put(path, content):
+            body = {"message": f"Create {path}", "content": content}
+            assert httpx.put(f"{server.url}/repos/loadtest/site/contents/{path}", json=body).status_code == 201
+
+        def load():
+            site = Site(config)
+            return site, site.load_indexes(site.repo(site.github()))
+
+        put("_notes/1.md", post("a"))
+        put("README.md", post())
+        site, source = load()
+        assert source == "tree"
+
+        put("_notes/2.md", post("b"))
+        put(f"{MEDIA_DIR}/100_a.jpg", base64.b64encode(b"jpeg").decode())
+        site, source = load()
+        assert source == "compare"
+        assert "_notes/2.md" in site.paths and "README.md" in site.paths
+        assert site.tags.categories() == ["a", "b"]
+        assert site.media.last().path == f"{MEDIA_DIR}/100_a.jpg"
+
+        site, source = load()
+        assert source == "snapshot"
+        assert site.tags.categories() == ["a", "b"] and len(site.media) == 1
+    finally:
+        server.stop()
+
+
+def test_entries_under_a_directory(tmp_path):
+    paths = ["_notes/1.md", "_notes/sub/2.md", "_notesx.md", "_note.md", "assets/a.jpg", "index.md"]
+    write_snapshot(tmp_path / "snap", OLD, [TreeEntry(path, "s", 1) for path in paths])
+    snapshot = Snapshot.open(tmp_path / "snap")
+    assert [entry.path for entry in snapshot.under("_notes/")] == ["_notes/1.md", "_notes/sub/2.md"]
+    assert [entry.path for entry in snapshot.under("assets/")] == ["assets/a.jpg"]
+    assert list(snapshot.under("missing/")) == []
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from indiecourier.app import app
+from indiecourier.idempotency import IdempotencyStore
+from indiecourier.sites import registry
+from indiecourier.state import PathLocks, SharedCache, SharedState
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub import FAKE_JSON
+from indiecourier.utils import load_config
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "shared.sqlite3"
+
+
+def test_cache_is_shared_between_workers(db):
+    # Two SharedState objects on one file stand in for two worker processes
+    first = SharedCache(SharedState(db), "tokens", ttl=60)
+    second = SharedCache(SharedState(db), "tokens", ttl=60)
+    first.set("token", {"me": "https://example.com"})
+    assert second.get("token") == {"me": "https://example.com"}
+    assert "missing" not in second
+
+    first.set("short", {"me": "x"}, ttl=-1)
+    assert second.get("short") is None
+
+
+def test_purge_bounds_size(db):
+    state = SharedState(db)
+    cache = SharedCache(state, "tokens", ttl=60, maxsize=3)
+    for i in range(10):
+        cache.set(f"k{i}", i)
+    state.purge("tokens", 3)
+    assert [cache.get(f"k{i}") for i in range(10)] == [None] * 7 + [7, 8, 9]
+
+
+def test_leases_exclude_other_owners_until_expiry(db):
+    a, b = SharedState(db), SharedState(db)
+    assert a.acquire("path:_notes/1.md", "a", lease=60)
+    assert not b.acquire("path:_notes/1.md", "b", lease=60)
+    a.release("path:_notes/1.md", "a")
+    assert b.acquire("path:_notes/1.md", "b", lease=-1)
+    # An expired lease (its holder died) can be taken over
+    assert a.acquire("path:_notes/1.md", "a", lease=60)
+
+
+def test_leases_are_renewed_until_released(db):
+    a, b = SharedState(db), SharedState(db)
+    assert a.acquire("path:_notes/1.md", "a", lease=0.3)
+    # Held for twice its lease: still not free for another worker
+    time.sleep(0.6)
+    assert not b.acquire("path:_notes/1.md", "b", lease=60)
+    a.release("path:_notes/1.md", "a")
+    assert b.acquire("path:_notes/1.md", "b", lease=60)
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_path_locks_serialize_edits(db, shared):
+    locks = PathLocks(SharedState(db) if shared else None, lease=30, timeout=5)
+    inside, overlaps = 0, 0
+
+    def edit():
+        nonlocal inside, overlaps
+        with locks.hold("_notes/1.md"):
+            inside += 1
+            overlaps += inside > 1
+            time.sleep(0.01)
+            inside -= 1
+
+    threads = [threading.Thread(target=edit) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == 0
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_path_locks_outlast_their_lease(db, shared):
+    # A slow edit keeps its lock past the lease; a concurrent edit of the same post waits for it
+    locks = PathLocks(SharedState(db) if shared else None, lease=0.05, timeout=0.05)
+    with locks.hold("_notes/1.md"):
+        time.sleep(0.15)
+        with pytest.raises(HTTPException):
+            with locks.hold("_notes/1.md"):
+                pass
+    with locks.hold("_notes/1.md"):
+        pass
+
+
+def test_lock_timeout_is_503(db):
+    state = SharedState(db)
+    state.acquire("path:_notes/1.md", "other-worker", lease=60)
+    with pytest.raises(HTTPException) as e:
+        with PathLocks(state, lease=30, timeout=0.05).hold("_notes/1.md"):
+            pass
+    assert e.value.status_code == 503
+
+
+def test_idempotency_across_workers(db):
+    first = IdempotencyStore(window=60, shared=SharedState(db))
+    second = IdempotencyStore(window=60, shared=SharedState(db))
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"status_code": 202, "url": "https://example.com/notes/1"}
+
+    async def main():
+        # The second worker waits for the first one's result instead of creating the post again
+        return await asyncio.gather(first.run("key", create), second.run("key", create))
+
+    (a, replayed_a), (b, replayed_b) = asyncio.run(main())
+    assert a == b
+    assert sorted([replayed_a, replayed_b]) == [False, True]
+    assert calls == 1
+
+
+def test_shared_idempotency_stays_off_the_event_loop(db):
+    offloaded = []
+
+    async def run(func, *args, **kwargs):
+        offloaded.append(func.__name__)
+        return func(*args, **kwargs)
+
+    async def create():
+        return {"status_code": 202}
+
+    store = IdempotencyStore(window=60, shared=SharedState(db), run=run)
+    asyncio.run(store.run("key", create))
+    assert {"get", "acquire", "set", "release"} <= set(offloaded)
+
+
+def test_app_with_shared_state(client, mock_repo):
+    config = FAKE_CONFIG.model_copy(update={"shared_state": True})
+    app.dependency_overrides[load_config] = lambda: config
+
+    first = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    second = client.post("/micropub", json=FAKE_JSON, headers={"Authorization": "Bearer fake_token"})
+    assert first.status_code == second.status_code == 202
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert mock_repo.create_file.call_count == 1
+    assert registry.for_config(config).state.path.exists()
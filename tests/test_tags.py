@@ -0,0 +1,128 @@
+import base64
+from time import perf_counter
+from unittest.mock import MagicMock, patch
+from urllib.parse import urljoin
+
+import mf2py
+
+from indiecourier.app import app, github_login
+from indiecourier.indexes import TagIndex, post_directories, post_tags
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_micropub import FAKE_GITHUB_RESPONSE, FAKE_JSON
+
+
+def post(*tags, published=True):
+    lines = ["---", "type: entry", "tags:"] + [f"- {tag}" for tag in tags]
+    if not published:
+        lines.append("published: false")
+    return "\n".join(lines + ["---", "Hello"])
+
+
+def make_repo(files):
+    # files: path -> (blob sha, content)
+    repo = MagicMock()
+    repo.get_git_tree.return_value.tree = [MagicMock(path=path, type="blob", sha=sha) for path, (sha, _) in files.items()]
+    blobs = {sha: content for sha, content in files.values()}
+    repo.get_git_blob.side_effect = lambda sha: MagicMock(content=base64.b64encode(blobs[sha].encode()).decode())
+    return repo
+
+
+def test_post_directories_and_tags():
+    assert post_directories(FAKE_CONFIG) == ("_notes/", "_posts/")
+    assert post_tags({"tags": ["a", " b ", "a", {"type": ["h-card"]}]}, FAKE_CONFIG) == ("a", "b")
+    assert post_tags({"tags": "solo"}, FAKE_CONFIG) == ("solo",)
+    assert post_tags({"tags": ["a"], "published": False}, FAKE_CONFIG) == ()
+
+
+def test_load_counts_published_posts(tmp_path):
+    repo = make_repo({
+        "_notes/1.md": ("s1", post("IndieWeb", "micropub")),
+        "_notes/2.md": ("s2", post("indieweb-camp", "IndieWeb")),
+        "_posts/2024-01-01-hidden.md": ("s3", post("secret", published=False)),
+        "assets/images/notes/1.jpg": ("s4", "not a post"),
+        "README.md": ("s5", post("readme")),
+    })
+    index = TagIndex(tmp_path / "tags.json")
+    index.load(repo, FAKE_CONFIG)
+
+    assert index.categories() == ["IndieWeb", "indieweb-camp", "micropub"]
+    assert index.categories("indie") == ["IndieWeb", "indieweb-camp"]
+    assert index.categories("INDIEWEB-") == ["indieweb-camp"]
+    assert index.categories("zzz") == []
+    assert repo.get_git_blob.call_count == 3
+
+
+def test_restart_only_rereads_changed_posts(tmp_path):
+    files = {"_notes/1.md": ("s1", post("a")), "_notes/2.md": ("s2", post("b"))}
+    TagIndex(tmp_path / "tags.json").load(make_repo(files), FAKE_CONFIG)
+
+    files["_notes/2.md"] = ("s2b", post("c"))
+    files["_notes/3.md"] = ("s3", post("a"))
+    repo = make_repo(files)
+    index = TagIndex(tmp_path / "tags.json")
+    index.load(repo, FAKE_CONFIG)
+
+    assert sorted(call.args[0] for call in repo.get_git_blob.call_args_list) == ["s2b", "s3"]
+    assert index.categories() == ["a", "c"]
+    assert index.count("a") == 2
+
+
+def test_incremental_updates(tmp_path):
+    index = TagIndex(tmp_path / "tags.json")
+    index.load(make_repo({"_notes/1.md": ("s1", post("a", "b"))}), FAKE_CONFIG)
+
+    index.set("_notes/2.md", ("b", "c"))
+    assert index.categories() == ["b", "a", "c"]
+    index.set("_notes/1.md", ())  # deleted
+    assert index.categories() == ["b", "c"]
+    index.set("_notes/2.md", ("c",))  # updated
+    assert index.categories() == ["c"]
+
+    # Saved for the next process, with written posts marked to be reread
+    restarted = TagIndex(tmp_path / "tags.json")
+    repo = make_repo({"_notes/1.md": ("s1", post("a", "b", published=False)), "_notes/2.md": ("s2", post("c"))})
+    restarted.load(repo, FAKE_CONFIG)
+    assert restarted.categories() == ["c"]
+
+
+def test_search_is_fast(tmp_path):
+    index = TagIndex(tmp_path / "tags.json")
+    index.load(make_repo({}), FAKE_CONFIG)
+    for i in range(5000):
+        index.set(f"_notes/{i}.md", (f"tag-{i % 2000}", "common"))
+    index.categories()
+
+    start = perf_counter()
+    for _ in range(100):
+        index.categories("tag-19")
+    assert (perf_counter() - start) / 100 < 0.001
+
+
+def test_category_query_follows_writes(client):
+    mock_repo = MagicMock()
+    mock_repo.get_git_tree.return_value.tree = [MagicMock(path="_notes/1.md", type="blob", sha="s1")]
+    mock_repo.get_git_blob.return_value.content = base64.b64encode(post("indieweb", "test").encode()).decode()
+    mock_repo.create_file.return_value = FAKE_GITHUB_RESPONSE
+    mock_contents = mock_repo.get_contents.return_value
+    mock_contents.decoded_content = post("indieweb", "test").encode()
+    mock_github = MagicMock()
+    mock_github.get_user.return_value.get_repo.return_value = mock_repo
+    app.dependency_overrides[github_login] = lambda: mock_github
+    headers = {"Authorization": "Bearer fake_token"}
+
+    response = client.get("/micropub?q=category", headers=headers)
+    assert response.json() == {"categories": ["indieweb", "test"]}
+
+    # FAKE_JSON is tagged test and micropub
+    assert client.post("/micropub", json=FAKE_JSON, headers=headers).status_code == 202
+    assert client.get("/micropub?q=category", headers=headers).json() == {"categories": ["test", "indieweb", "micropub"]}
+    assert client.get("/micropub?q=category&search=MICRO", headers=headers).json() == {"categories": ["micropub"]}
+
+    with open("tests/test_note.html") as f:
+        mf2_parser = mf2py.parse(doc=f)
+    with patch("mf2py.parse", return_value=mf2_parser):
+        url = urljoin(str(FAKE_CONFIG.site_url), "/notes/2024/06/01/1")
+        response = client.post("/micropub", json={"action": "delete", "url": url}, headers=headers)
+    assert response.status_code == 204
+    assert client.get("/micropub?q=category", headers=headers).json() == {"categories": ["micropub", "test"]}
+    assert mock_repo.get_git_blob.call_count == 1
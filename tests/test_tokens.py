@@ -0,0 +1,103 @@
+from time import time
+from unittest.mock import AsyncMock, patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jwt.algorithms import ECAlgorithm
+
+from indiecourier.app import app
+from indiecourier.sites import registry
+from tests.conftest import FAKE_CONFIG
+from indiecourier.utils import load_config
+
+JWKS_CONFIG = FAKE_CONFIG.model_copy(update={"jwks_url": "https://tokens.example.com/jwks"})
+
+
+def make_key(kid):
+    key = ec.generate_private_key(ec.SECP256R1())
+    jwk = {**ECAlgorithm.to_jwk(key.public_key(), as_dict=True), "kid": kid, "alg": "ES256"}
+    return key, jwk
+
+
+def sign(key, kid="a", **claims):
+    claims = {"me": "https://example.com/", "scope": "create update", "client_id": "https://app.example/", "exp": time() + 600, **claims}
+    return jwt.encode(claims, key, algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.fixture
+def keys():
+    key, jwk = make_key("a")
+    fetch = AsyncMock(return_value={"keys": [jwk]})
+    app.dependency_overrides[load_config] = lambda: JWKS_CONFIG
+    with patch("indiecourier.tokens.KeySet.fetch", new=fetch), patch("indiecourier.auth.introspect_token", new=AsyncMock(return_value=None)) as introspect:
+        yield key, fetch, introspect
+
+
+def query(client, token):
+    return client.get("/micropub?q=config", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_jwt_is_verified_locally(client, keys):
+    key, fetch, introspect = keys
+    assert query(client, sign(key)).status_code == 200
+    assert query(client, sign(key, client_id="https://other.example/")).status_code == 200
+    assert introspect.call_count == 0
+    assert fetch.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"me": "https://someone-else.example.com/"},
+        {"exp": time() - 3600},
+        {"scope": ""},
+    ],
+)
+def test_invalid_claims_are_rejected(client, keys, claims):
+    key, _, introspect = keys
+    assert query(client, sign(key, **claims)).status_code == 403
+    assert introspect.call_count == 0
+
+
+def test_wrong_signature_is_rejected(client, keys):
+    other, _ = make_key("a")
+    assert query(client, sign(other)).status_code == 403
+
+
+def test_rotated_key_refreshes_jwks(client, keys):
+    key, fetch, _ = keys
+    assert query(client, sign(key)).status_code == 200
+
+    new_key, new_jwk = make_key("b")
+    fetch.return_value = {"keys": [new_jwk]}
+    # An unknown kid triggers a refetch once min_refresh has passed
+    registry.for_config(JWKS_CONFIG).keys.min_refresh = 0.0
+    assert query(client, sign(new_key, kid="b")).status_code == 200
+    assert fetch.call_count == 2
+
+
+def test_opaque_tokens_are_introspected(client, keys):
+    _, fetch, introspect = keys
+    introspect.return_value = {"me": "https://example.com", "client_id": "https://app.example/", "scope": "create"}
+    assert query(client, "opaque-token").status_code == 200
+    assert introspect.call_count == 1
+    assert fetch.call_count == 0
+
+
+def test_unreachable_jwks_falls_back_to_introspection(client, keys):
+    key, fetch, introspect = keys
+    fetch.side_effect = ValueError("not JSON")
+    introspect.return_value = {"me": "https://example.com", "scope": "create"}
+    assert query(client, sign(key)).status_code == 200
+    assert introspect.call_count == 1
+
+
+def test_configured_public_key(client):
+    key, _ = make_key("a")
+    pem = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    app.dependency_overrides[load_config] = lambda: FAKE_CONFIG.model_copy(update={"token_public_key": pem})
+    with patch("indiecourier.auth.introspect_token", new=AsyncMock(return_value=None)):
+        assert query(client, sign(key)).status_code == 200
+        assert query(client, sign(make_key("a")[0])).status_code == 403
@@ -0,0 +1,104 @@
+from unittest.mock import AsyncMock, patch
+from urllib.parse import urljoin
+
+from github import GithubException
+
+from indiecourier.sites import registry
+from tests.conftest import FAKE_CONFIG
+from tests.test_app_media import FAKE_PATH
+
+AUTH = {"Authorization": "Bearer fake_token"}
+
+
+def create_session(client, size=None):
+    response = client.post("/media/uploads", json={"filename": "video.mp4", "size": size}, headers=AUTH)
+    assert response.status_code == 201
+    return response.headers["Location"]
+
+
+def test_resumable_upload(client, mock_repo):
+    location = create_session(client, size=10)
+
+    response = client.patch(location, content=b"hello", headers={**AUTH, "Upload-Offset": "0"})
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "5"
+
+    # Resume: ask the server where to continue from
+    response = client.head(location, headers=AUTH)
+    assert response.headers["Upload-Offset"] == "5"
+
+    response = client.patch(location, content=b"world", headers={**AUTH, "Upload-Offset": "5"})
+    assert response.headers["Upload-Offset"] == "10"
+
+    response = client.post(f"{location}/finalize", headers=AUTH)
+    assert response.status_code == 201
+    assert response.headers["Location"] == urljoin(str(FAKE_CONFIG.site_url), FAKE_PATH)
+    path = mock_repo.create_file.call_args.kwargs["path"]
+    assert path.startswith(f"{FAKE_CONFIG.media_dir}/") and path.endswith(".mp4")
+    assert mock_repo.create_file.call_args.kwargs["content"] == b"helloworld"
+
+    # The session is gone once committed
+    assert client.head(location, headers=AUTH).status_code == 404
+
+
+def test_offset_mismatch(client, mock_repo):
+    location = create_session(client)
+    client.patch(location, content=b"hello", headers={**AUTH, "Upload-Offset": "0"})
+    response = client.patch(location, content=b"again", headers={**AUTH, "Upload-Offset": "0"})
+    assert response.status_code == 409
+    assert response.json()["detail"]["error"] == "offset_mismatch"
+
+
+def test_incomplete_upload_cannot_be_finalized(client, mock_repo):
+    location = create_session(client, size=10)
+    client.patch(location, content=b"hello", headers={**AUTH, "Upload-Offset": "0"})
+    response = client.post(f"{location}/finalize", headers=AUTH)
+    assert response.status_code == 400
+    mock_repo.create_file.assert_not_called()
+
+
+def test_chunks_beyond_declared_size_are_rejected(client, mock_repo):
+    location = create_session(client, size=4)
+    response = client.patch(location, content=b"hello", headers={**AUTH, "Upload-Offset": "0"})
+    assert response.status_code == 413
+    assert client.head(location, headers=AUTH).headers["Upload-Offset"] == "0"
+
+
+def test_sessions_belong_to_their_client(client, mock_repo):
+    location = create_session(client)
+    other = {"me": "https://example.com", "client_id": "https://other.example.com/"}
+    with patch("indiecourier.auth.introspect_token", new=AsyncMock(return_value=other)):
+        response = client.patch(location, content=b"hello", headers={"Authorization": "Bearer other", "Upload-Offset": "0"})
+    assert response.status_code == 404
+
+
+def test_expired_sessions(client, mock_repo):
+    location = create_session(client)
+    with patch("indiecourier.uploads.time", return_value=2**40):
+        assert client.head(location, headers=AUTH).status_code == 404
+
+
+def test_declared_size_over_githubs_limit_is_refused(client, mock_repo):
+    response = client.post("/media/uploads", json={"filename": "video.mp4", "size": 150 * 1024 * 1024}, headers=AUTH)
+    assert response.status_code == 413
+
+
+def test_session_is_committed_once(client, mock_repo):
+    location = create_session(client, size=5)
+    client.patch(location, content=b"hello", headers={**AUTH, "Upload-Offset": "0"})
+    site = registry.for_config(FAKE_CONFIG)
+    session = site.uploads.get(location.rsplit("/", 1)[1], "https://example.com|https://example.com/micropub/")
+
+    # Another finalize of the same session is under way
+    site.uploads.claim(session)
+    response = client.post(f"{location}/finalize", headers=AUTH)
+    assert response.status_code == 404
+    mock_repo.create_file.assert_not_called()
+
+    # A failed finalize hands the session back
+    site.uploads.unclaim(session)
+    mock_repo.create_file.side_effect = GithubException(500, {"message": "Server Error"}, None)
+    assert client.post(f"{location}/finalize", headers=AUTH).status_code == 500
+    mock_repo.create_file.side_effect = None
+    assert client.post(f"{location}/finalize", headers=AUTH).status_code == 201
+    assert mock_repo.create_file.call_count == 2
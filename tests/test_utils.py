@@ -4,7 +4,7 @@ from zoneinfo import ZoneInfo
 import mf2py
 
 def test_is_url_equal():
-    from utils import is_url_equal
+    from indiecourier.utils import is_url_equal
 
     assert is_url_equal("https://example.com/path", "https://example.com/path/")
     assert is_url_equal("https://example.com/path#fragment", "https://example.com/path")
@@ -12,7 +12,7 @@ def test_is_url_equal():
     assert not is_url_equal("http://example.com/path", "https://example.com/path")
 
 def test_get_datetime():
-    from utils import get_datetime
+    from indiecourier.utils import get_datetime
 
 
     with open("tests/test_article.html") as f:
@@ -24,7 +24,7 @@ def test_get_datetime():
 
 
 def test_is_note():
-    from utils import is_note
+    from indiecourier.utils import is_note
 
     with open("tests/test_article.html") as f:
         mf2_parser = mf2py.parse(doc=f)
@@ -35,7 +35,7 @@ def test_is_note():
     assert is_note(mf2_parser)
 
 def test_apply_patch():
-    from utils import apply_patch
+    from indiecourier.utils import apply_patch
 
     data = {
         "name": ["Test Post"],
@@ -77,7 +77,7 @@ def test_apply_patch():
     }
 
 def test_replace_keys():
-    from utils import replace_keys
+    from indiecourier.utils import replace_keys
 
     data = {
         "name": ["Test Post"],
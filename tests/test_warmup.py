@@ -0,0 +1,103 @@
+import base64
+import asyncio
+import json
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from indiecourier.app import warmup_state
+from indiecourier.reloader import ConfigWatcher
+from indiecourier.sites import Site, SiteRegistry
+from tests.conftest import FAKE_CONFIG
+from tests.test_sites import SITES
+from indiecourier.warmup import Warmer, WarmupState, warm_up
+
+
+def make_registry(github):
+    site = Site(FAKE_CONFIG)
+    site.github = lambda: github
+    registry = SiteRegistry()
+    registry.sites = lambda: [site]
+    return registry, site
+
+
+def test_healthz(client):
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+
+def test_readyz_before_warmup(client):
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "pending"
+
+
+def test_warm_up_loads_repository_and_indexes(client):
+    mock_github = MagicMock()
+    mock_repo = mock_github.get_user.return_value.get_repo.return_value
+    mock_repo.get_git_ref.return_value.object.sha = "c" * 40
+    mock_repo.get_git_tree.return_value.tree = [MagicMock(path="_notes/1.md", type="blob", sha="b1", size=30)]
+    mock_repo.get_git_blob.return_value.content = base64.b64encode(b"---\ntags:\n- indieweb\n---\nHello").decode()
+    registry, site = make_registry(mock_github)
+    state = WarmupState()
+
+    with patch("indiecourier.warmup.shared.http_client", return_value=AsyncMock()):
+        asyncio.run(warm_up(registry, state))
+
+    assert state.ready
+    assert "_notes/1.md" in site.paths
+    assert site.tags.categories() == ["indieweb"]
+    assert mock_repo.get_git_tree.call_count == 1
+    assert site.repo(mock_github) is mock_repo
+    assert state.report()["sites"][site.id]["status"] == "ready"
+
+    with patch.object(warmup_state, "status", "ready"):
+        assert client.get("/readyz").status_code == 200
+
+
+def test_warm_up_retries_failures():
+    mock_github = MagicMock()
+    mock_repo = mock_github.get_user.return_value.get_repo.return_value
+    mock_repo.get_git_ref.return_value.object.sha = "c" * 40
+    mock_repo.get_git_tree.side_effect = [RuntimeError("GitHub is down"), MagicMock(tree=[])]
+    registry, _ = make_registry(mock_github)
+    state = WarmupState()
+
+    with patch("indiecourier.warmup.shared.http_client", return_value=AsyncMock()):
+        asyncio.run(warm_up(registry, state, retry_delay=0.01))
+
+    assert state.ready
+    assert mock_repo.get_git_tree.call_count == 2
+
+
+def test_sites_added_by_a_reload_are_warmed_up(tmp_path):
+    path = tmp_path / "sites.json"
+    path.write_text(json.dumps({"sites": SITES["sites"][:1]}))
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    registry = SiteRegistry(path)
+    state = WarmupState()
+    warmed = []
+
+    async def warm_up_site(site):
+        warmed.append((site.id, state.status))
+        return {}
+
+    async def main():
+        warmer = Warmer(registry, state)
+        watcher = ConfigWatcher(registry, interval=0.01, on_reload=warmer.start)
+        warmer.start()
+        watching = asyncio.create_task(watcher.run())
+        while not state.ready:
+            await asyncio.sleep(0.01)
+        path.write_text(json.dumps(SITES))
+        while len(warmed) < 2:
+            await asyncio.sleep(0.01)
+        watching.cancel()
+        warmer.stop()
+
+    with patch("indiecourier.warmup.warm_up_site", warm_up_site):
+        asyncio.run(main())
+
+    alice, bob = registry.sites()
+    # The new site is warmed up while the process stays in rotation
+    assert warmed == [(alice.id, "warming"), (bob.id, "ready")]
+    assert list(state.report()["sites"]) == [alice.id, bob.id]
+    assert "bob.example.com" not in json.dumps(state.report())